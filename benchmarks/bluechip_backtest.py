@@ -0,0 +1,158 @@
+"""
+Benchmark of the vectorized bluechip options selling backtest (engine.simulate) against the previous
+day by day loop of BackTester.run, on synthetic option panels. Positions of both are checked to match
+for random configs before timing them.
+
+Usage (from the root folder of the repo):
+    python -m benchmarks.bluechip_backtest
+"""
+import math
+import random
+import timeit
+from collections import defaultdict
+from dataclasses import replace
+
+import pandas as pd
+
+from src.strategies.bluechip_options_selling.engine import PANEL_COLUMNS, simulate
+from src.strategies.bluechip_options_selling.models import BackTestConfigModel
+
+# Trading days x stocks of the panels
+PANEL_SIZES = {
+    '7 months': (7, 25),
+    '5 years': (60, 25),
+    '5 years, 200 stocks': (60, 200)
+}
+NUMBER_OF_PARITY_CONFIGS = 20
+
+
+def simulate_loop(panel: pd.DataFrame, config: BackTestConfigModel) -> list:
+    """Previous implementation (the loop of BackTester.run) over the panel, returns the
+    (trade_day, symbol, strike, expected_pnl, pnl) of the positions"""
+    positions = []
+
+    for trade_day, day_panel in panel.groupby('trade_day', sort=True):
+        # Following is divided by 1.4 to accomodate for 40% margin needed on expiry date
+        available_margin = config.available_margin / 1.4
+        options = []
+
+        for option in day_panel.itertuples():
+            if config.filter_stocks_by_technicals and not option.percentage_up_from_support <= config.entry_point_from_last_support:
+                continue
+
+            percentage_dip = (option.underlying_close - option.strike) / option.underlying_close * 100
+            profit = option.close * option.lot_size
+
+            if not (
+                config.filter_options_min_percentage_dip < percentage_dip < config.filter_options_max_percentage_dip \
+                    and config.filter_options_min_profit < profit < config.filter_options_max_profit
+            ):
+                continue
+
+            if config.filter_options_by_open_int and not option.open_int > config.filter_options_min_open_int:
+                continue
+
+            options.append((option, profit))
+
+        grouped_options = defaultdict(list)
+
+        for option, profit in sorted(options, key=lambda x: x[1], reverse=True):
+            grouped_options[option.symbol].append((option, profit))
+
+        for option_list in grouped_options.values():
+            if available_margin < 50000:
+                break
+
+            selected_option, expected_pnl = option_list[0]
+            available_margin -= selected_option.margin
+
+            if selected_option.underlying_expiry_close >= selected_option.strike:
+                pnl = expected_pnl
+            elif math.isnan(selected_option.expiry_close):
+                continue
+            else:
+                pnl = (selected_option.close - selected_option.expiry_close) * selected_option.lot_size
+
+            positions.append((trade_day, selected_option.symbol, selected_option.strike, expected_pnl, pnl))
+
+    return positions
+
+
+def get_panel(number_of_days: int, number_of_stocks: int, seed: int = 42) -> pd.DataFrame:
+    """Random option chains of PE options below the underlying price, some of the options miss the
+    expiry close and some of the stocks miss the technicals"""
+    random_state = random.Random(seed)
+    rows = []
+
+    for trade_day in range(number_of_days):
+        for stock in range(number_of_stocks):
+            underlying_close = random_state.uniform(500, 3000)
+            underlying_expiry_close = underlying_close * random_state.uniform(0.8, 1.2)
+            lot_size = random_state.choice([100, 250, 500, 1000])
+            percentage_up_from_support = random_state.choice([math.nan, random_state.uniform(0, 100)])
+
+            for _ in range(random_state.randrange(0, 15)):
+                strike = round(underlying_close * random_state.uniform(0.7, 0.99))
+
+                rows.append((
+                    trade_day, 'D%d' % trade_day, 'E%d' % trade_day, 'STOCK%d' % stock, strike,
+                    round(random_state.uniform(0.5, 30), 1), random_state.choice([0, 10, 1000]), lot_size,
+                    0.3 * strike * lot_size, underlying_close, underlying_expiry_close,
+                    random_state.choice([math.nan, random_state.uniform(0, 100)]), percentage_up_from_support
+                ))
+
+    return pd.DataFrame(rows, columns=PANEL_COLUMNS)
+
+
+def get_random_config(seed: int) -> BackTestConfigModel:
+    random_state = random.Random(seed)
+
+    return replace(
+        BackTestConfigModel(),
+        filter_stocks_by_technicals=random_state.random() < 0.5,
+        filter_options_by_open_int=random_state.random() < 0.5,
+        filter_options_min_open_int=random_state.choice([0, 100]),
+        filter_options_min_percentage_dip=random_state.choice([1, 5, 10]),
+        filter_options_min_profit=random_state.choice([0, 500, 1000]),
+        filter_options_max_profit=random_state.choice([5000, 15000]),
+        available_margin=random_state.choice([300000, 1000000, 5000000])
+    )
+
+
+def get_positions(panel: pd.DataFrame, config: BackTestConfigModel) -> list:
+    positions = simulate(panel=panel, config=config)
+
+    return list(zip(
+        positions['trade_day'].tolist(), positions['symbol'].tolist(), positions['strike'].tolist(),
+        positions['expected_pnl'].tolist(), positions['pnl'].tolist()
+    ))
+
+
+def main():
+    parity_panel = get_panel(number_of_days=20, number_of_stocks=12)
+
+    for seed in range(NUMBER_OF_PARITY_CONFIGS):
+        config = get_random_config(seed=seed)
+
+        if get_positions(panel=parity_panel, config=config) != simulate_loop(panel=parity_panel, config=config):
+            raise ValueError('Positions mismatch for the config: %s' % config)
+
+    print('Positions match for %d configs\n' % NUMBER_OF_PARITY_CONFIGS)
+    print('{:<22} {:>8} {:>10} {:>12} {:>12} {:>8}'.format('panel', 'options', 'positions', 'loop (ms)', 'vector (ms)', 'speedup'))
+
+    config = BackTestConfigModel()
+
+    for name, (number_of_days, number_of_stocks) in PANEL_SIZES.items():
+        panel = get_panel(number_of_days=number_of_days, number_of_stocks=number_of_stocks)
+        number_of_positions = len(simulate_loop(panel=panel, config=config))
+
+        loop_time = timeit.timeit(lambda: simulate_loop(panel=panel, config=config), number=1)
+        vector_time = min(timeit.repeat(lambda: simulate(panel=panel, config=config), number=1, repeat=5))
+
+        print('{:<22} {:>8} {:>10} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(
+            name, len(panel), number_of_positions, loop_time * 1000, vector_time * 1000, loop_time / vector_time
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark of extracting and parsing the NSE historical option data pages, the previous approach of
+building the BeautifulSoup tree and a dict per row against the regex extraction along with the
+pandas CSV parse (as done by OptionsController), per 1000 rows. Pages are read from the folder of
+saved responses (`.html` files) in-case provided, otherwise synthetic pages similar to the NSE ones
+are used.
+
+Usage (from the root folder of the repo):
+    python -m benchmarks.nse_parser [folder of saved responses]
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from src.apps.nse.controllers.options import FLOAT_FIELDS, extract_csv_content, parse_csv_content
+
+PAGE_SIZES = [100, 1000, 5000]
+NUMBER_OF_RUNS = 5
+
+CSV_HEADERS = [
+    'Symbol', 'Date', 'Expiry', 'Option Type', 'Strike Price', 'Open', 'High', 'Low', 'Close', 'LTP',
+    'Settle Price', 'No. of contracts', 'Turnover in Lacs', 'Premium Turnover in Lacs', 'Open Int',
+    'Change in OI', 'Underlying Value'
+]
+
+
+def parse_soup(html: str) -> list:
+    """Previous implementation, the CSV content is found in the parsed tree and split per row"""
+    soup = BeautifulSoup(html, 'html.parser')
+    csv_content = soup.find('div', {'id': 'csvContentDiv'})
+
+    if not csv_content:
+        return []
+
+    lines = csv_content.get_text().split(':')
+    headers = lines[0].lower().strip().replace('"', '').replace(' ', '_').replace('.', '').split(',')
+    data = []
+
+    for line in lines[1:]:
+        if not line:
+            continue
+
+        content = dict(zip(headers, line.strip().replace('"', '').split(',')))
+
+        data.append(dict((k, float(v) if k in FLOAT_FIELDS else v) for k, v in content.items()))
+
+    return data
+
+
+def parse_regex(html: str) -> pd.DataFrame:
+    csv_content = extract_csv_content(html=html)
+
+    return pd.DataFrame() if csv_content is None else parse_csv_content(csv_content=csv_content)
+
+
+def get_page(size: int, seed: int = 42) -> str:
+    """Returns a page with the rows in a table as well as in the CSV content div, as sent by NSE"""
+    random_state = random.Random(seed)
+    expiry = date(2021, 10, 28)
+    rows = []
+
+    for index in range(size):
+        strike_price = 15000 + 50 * (index % 100)
+        prices = sorted(round(random_state.uniform(1, 500), 2) for _ in range(4))
+
+        rows.append([
+            'NIFTY', (expiry - timedelta(days=index // 100)).strftime('%d-%b-%Y'), expiry.strftime('%d-%b-%Y'),
+            'CE', '%.2f' % strike_price, '%.2f' % prices[1], '%.2f' % prices[3], '%.2f' % prices[0], '%.2f' % prices[2],
+            '%.2f' % prices[2], '%.2f' % prices[2], str(random_state.randrange(1, 100000)), '%.2f' % random_state.uniform(1, 1e5),
+            '%.2f' % random_state.uniform(1, 1e3), '%.2f' % random_state.randrange(0, 1 << 20),
+            str(random_state.randrange(-1000, 1000)), '%.2f' % random_state.uniform(15000, 20000)
+        ])
+
+    table = ''.join('<tr>%s</tr>' % ''.join('<td>%s</td>' % value for value in row) for row in rows)
+    csv_content = ':'.join(
+        [','.join('"%s"' % header for header in CSV_HEADERS)] + [','.join('"%s"' % value for value in row) for row in rows]
+    )
+
+    return (
+        '<html><head><title>Historical Contract-wise Price Volume Data</title></head><body>'
+        '<table><tr>%s</tr>%s</table>'
+        '<div id="csvContentDiv" style="display:none">%s:</div>'
+        '</body></html>'
+    ) % (''.join('<th>%s</th>' % header for header in CSV_HEADERS), table, csv_content)
+
+
+def get_saved_pages(folder: str) -> list:
+    pages = []
+
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html'):
+            with open(os.path.join(folder, name), 'r', encoding='utf-8') as fileop:
+                pages.append(fileop.read())
+
+    return pages
+
+
+def main():
+    if len(sys.argv) > 1:
+        cases = [('saved', get_saved_pages(folder=sys.argv[1]))]
+    else:
+        cases = [(str(size), [get_page(size=size)]) for size in PAGE_SIZES]
+
+    print('{:<8} {:>8} {:<12} {:>14} {:>8}'.format('page', 'rows', 'parser', 'ms/1000 rows', 'speedup'))
+
+    for name, pages in cases:
+        number_of_rows = 0
+
+        for page in pages:
+            rows = parse_soup(html=page)
+
+            if rows != parse_regex(html=page).to_dict('records'):
+                raise ValueError('Values mismatch for the %s page(s)' % name)
+
+            number_of_rows += len(rows)
+
+        timings = {}
+
+        for parser_name, parser in [('soup', parse_soup), ('regex', parse_regex)]:
+            timings[parser_name] = timeit.timeit(
+                lambda: [parser(html=page) for page in pages], number=NUMBER_OF_RUNS
+            ) / NUMBER_OF_RUNS / number_of_rows
+
+            print('{:<8} {:>8} {:<12} {:>14.2f} {:>7.1f}x'.format(
+                name, number_of_rows, parser_name, timings[parser_name] * 1000 * 1000, timings['soup'] / timings[parser_name]
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of TechnicalIndicatorsController.get_support_and_resistance against the previous
+loop based implementation on synthetic 1 year, 5 years and intraday series.
+
+Usage (from the root folder of the repo):
+    python -m benchmarks.support_resistance
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from src.apps.kite.controllers.technicals import TechnicalIndicatorsController
+
+SERIES_SIZES = {
+    '1y daily': 250,
+    '5y daily': 5 * 250,
+    '1m minute': 22 * 375
+}
+
+
+def get_support_and_resistance_loop(df: pd.DataFrame, low_column_name: str = 'low', high_column_name: str = 'high'):
+    """Previous implementation, kept as is for reference"""
+    average_candle_size = np.mean(df[high_column_name] - df[low_column_name])
+    levels = []
+
+    def is_support(df, i):
+        support = df[low_column_name][i] < df[low_column_name][i - 1] and \
+            df[low_column_name][i] < df[low_column_name][i + 1] and \
+            df[low_column_name][i + 1] < df[low_column_name][i + 2] and \
+            df[low_column_name][i - 1] < df[low_column_name][i - 2]
+
+        return support
+
+    def is_resistance(df, i):
+        resistance = df[high_column_name][i] > df[high_column_name][i - 1] and \
+            df[high_column_name][i] > df[high_column_name][i + 1] and \
+            df[high_column_name][i + 1] > df[high_column_name][i + 2] and \
+            df[high_column_name][i - 1] > df[high_column_name][i - 2]
+
+        return resistance
+
+    def is_far_from_level(l):
+        return np.sum([abs(l - x) < average_candle_size for x in levels]) == 0
+
+    for i in range(2, df.shape[0] - 2):
+        if is_support(df, i):
+            l = df[low_column_name][i]
+
+            if is_far_from_level(l):
+                levels.append((i, -1, l))
+        elif is_resistance(df, i):
+            l = df[high_column_name][i]
+
+            if is_far_from_level(l):
+                levels.append((i, 1, l))
+
+    return levels
+
+
+def get_candles_df(size: int, seed: int = 42) -> pd.DataFrame:
+    """Random walk candles, rounded to the tick size so that equal prices also show up"""
+    random = np.random.default_rng(seed)
+
+    close = np.round(1000 + np.cumsum(random.normal(0, 5, size)), 1)
+    wicks = np.round(np.abs(random.normal(0, 4, (2, size))), 1)
+
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2020-01-01', periods=size, freq='min').strftime('%Y-%m-%dT%H:%M:%S+0530'),
+        'open': close,
+        'high': close + wicks[0],
+        'low': close - wicks[1],
+        'close': close,
+        'volume': random.integers(1000, 10000, size)
+    })
+
+
+def main():
+    print('{:<12} {:>8} {:>8} {:>12} {:>12} {:>8}'.format('series', 'candles', 'levels', 'loop (ms)', 'vector (ms)', 'speedup'))
+
+    for name, size in SERIES_SIZES.items():
+        df = get_candles_df(size=size)
+
+        expected_levels = get_support_and_resistance_loop(df=df)
+        levels = TechnicalIndicatorsController.get_support_and_resistance(df=df)
+
+        if levels != expected_levels:
+            raise ValueError('Levels mismatch for %s series' % name)
+
+        number = 3
+        loop_time = timeit.timeit(lambda: get_support_and_resistance_loop(df=df), number=number) / number * 1000
+        vector_time = timeit.timeit(lambda: TechnicalIndicatorsController.get_support_and_resistance(df=df), number=number) / number * 1000
+
+        print('{:<12} {:>8} {:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            name, size, len(levels), loop_time, vector_time, loop_time / vector_time
+        ))
+
+
+if __name__ == '__main__':
+    main()
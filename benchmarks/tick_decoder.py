@@ -0,0 +1,139 @@
+"""
+Benchmark of splitting and unpacking the ticker frames from a memoryview (as done by TickDecoder)
+against the previous approach of slicing a copy of every packet out of the frame, along with the
+decoding time per tick format. Frames are read from a tick recording (refer TickRecorder) in-case
+provided, otherwise synthetic full mode frames similar to the ones sent by the Kite ticker are used.
+
+Usage (from the root folder of the repo):
+    python -m benchmarks.tick_decoder [tick recording e.g. .trader-cache/ticks/<date>-<pid>.ticks]
+"""
+import random
+import struct
+import sys
+import timeit
+import tracemalloc
+
+from src.apps.kite.connectors.recorder import read_recording
+from src.apps.kite.connectors.ticks import (
+    FULL_PACKET, INDEX_FULL_PACKET, INDEX_QUOTE_PACKET, LTP_PACKET, QUOTE_PACKET, TICK_FORMATS, TickDecoder
+)
+
+FRAME_SIZES = [10, 100, 500]
+NUMBER_OF_FRAMES = 20
+NUMBER_OF_RUNS = 5
+
+# Following maps the packet length to its layout, as per the mode and the segment of the instrument
+PACKETS = dict((packet.size, packet) for packet in [LTP_PACKET, INDEX_QUOTE_PACKET, INDEX_FULL_PACKET, QUOTE_PACKET, FULL_PACKET])
+
+
+def unpack_slicing(frame: bytes) -> list:
+    """Previous implementation, packets are sliced (copied) out of the frame before unpacking"""
+    number_of_packets, = struct.unpack('>H', frame[0:2])
+    packets = []
+    offset = 2
+
+    for _ in range(number_of_packets):
+        packet_length, = struct.unpack('>H', frame[offset:offset + 2])
+        packets.append(frame[offset + 2:offset + 2 + packet_length])
+        offset += 2 + packet_length
+
+    return [PACKETS[len(packet)].unpack(packet) for packet in packets]
+
+
+def unpack_memoryview(frame: bytes) -> list:
+    frame = memoryview(frame)
+
+    return [PACKETS[packet_length].unpack_from(frame, offset) for offset, packet_length in TickDecoder()._split_packets(frame)]
+
+
+def get_frame(size: int, seed: int = 42) -> bytes:
+    random_state = random.Random(seed)
+    packets = []
+
+    for _ in range(size):
+        # NFO segment instrument token
+        token = random_state.randrange(1, 1 << 20) << 8 | 2
+        values = [token] + [random_state.randrange(1, 1 << 24) for _ in range(10)] + [1634000000, 1000, 1200, 900, 1634000000]
+
+        for _ in range(10):
+            values += [random_state.randrange(1, 1000), random_state.randrange(1, 1 << 24), random_state.randrange(1, 100)]
+
+        packets.append(FULL_PACKET.pack(*values))
+
+    return struct.pack('>H', size) + b''.join(struct.pack('>H', len(packet)) + packet for packet in packets)
+
+
+def get_recorded_frames(location: str) -> list:
+    """Returns the binary frames of the recording, heartbeats and text messages are skipped"""
+    return [
+        payload for _, payload, is_binary in read_recording(location=location)
+        if is_binary and len(payload) >= 2
+    ]
+
+
+def get_number_of_ticks(frame: bytes) -> int:
+    return struct.unpack('>H', frame[0:2])[0]
+
+
+def get_transient_bytes(func, frame: bytes) -> int:
+    """Returns the peak of the memory allocated while unpacking the frame on top of the returned
+    values i.e. the memory of the intermediate objects like the packet copies"""
+    tracemalloc.start()
+
+    values = func(frame)
+    retained_size, peak_size = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    del values
+
+    return peak_size - retained_size
+
+
+def main():
+    if len(sys.argv) > 1:
+        cases = [('recorded', get_recorded_frames(location=sys.argv[1]))]
+
+        if not cases[0][1]:
+            raise ValueError('No ticks found in the recording: %s' % sys.argv[1])
+    else:
+        cases = [
+            (str(size), [get_frame(size=size, seed=seed) for seed in range(NUMBER_OF_FRAMES)]) for size in FRAME_SIZES
+        ]
+
+    print('{:<10} {:>8} {:<12} {:>18} {:>12} {:>8}'.format('case', 'ticks', 'split', 'transient B/tick', 'us/tick', 'speedup'))
+
+    for name, frames in cases:
+        if [unpack_slicing(frame) for frame in frames] != [unpack_memoryview(frame) for frame in frames]:
+            raise ValueError('Values mismatch for the %s frames' % name)
+
+        number_of_ticks = sum(get_number_of_ticks(frame) for frame in frames)
+        # Largest frame is the one showing the transient memory of the split
+        largest_frame = max(frames, key=get_number_of_ticks)
+        timings = {}
+
+        for split_name, func in [('slicing', unpack_slicing), ('memoryview', unpack_memoryview)]:
+            transient_bytes = get_transient_bytes(func=func, frame=largest_frame)
+            timings[split_name] = timeit.timeit(lambda: [func(frame) for frame in frames], number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS / number_of_ticks
+
+            print('{:<10} {:>8} {:<12} {:>18.1f} {:>12.2f} {:>7.1f}x'.format(
+                name, number_of_ticks, split_name, transient_bytes / max(get_number_of_ticks(largest_frame), 1),
+                timings[split_name] * 10 ** 6, timings['slicing'] / timings[split_name]
+            ))
+
+    print()
+    print('{:<10} {:>10}'.format('format', 'us/tick'))
+
+    # Format timings are of the recorded frames or the largest synthetic ones
+    frames = cases[-1][1]
+    number_of_ticks = sum(get_number_of_ticks(frame) for frame in frames)
+
+    for tick_format in TICK_FORMATS:
+        decoder = TickDecoder(tick_format=tick_format)
+        timing = timeit.timeit(lambda: [decoder.decode(frame) for frame in frames], number=NUMBER_OF_RUNS) / NUMBER_OF_RUNS / number_of_ticks
+
+        print('{:<10} {:>10.2f}'.format(tick_format, timing * 10 ** 6))
+
+
+if __name__ == '__main__':
+    main()
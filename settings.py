@@ -7,4 +7,8 @@ ENVIRONMENT_PRODUCTION = 'prod'
 # Valid types: memory, disk
 # Default: disk
 CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'disk'
+# Maximum size (in bytes) of the cached entries held in memory; least recently used
+# entries are evicted beyond it
+# Default: 32 MB
+CACHE_MEMORY_BUDGET = int(os.environ.get('CACHE_MEMORY_BUDGET') or 32 * 1024 * 1024)
 ENVIRONMENT = os.environ.get('ENVIRONMENT') or ENVIRONMENT_LOCAL
@@ -0,0 +1,35 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.ratelimit import TokenBucket
+
+# Following limits are documented here: https://kite.trade/docs/connect/v3/exceptions/#api-rate-limit
+HISTORICAL_RATE_LIMIT = 3  # requests per second
+MAX_WORKERS = 8
+
+
+class KiteClient:
+    """Shared HTTP session for the concurrent calls to Kite so that the connections are pooled
+    across the worker threads instead of opening a new connection per request"""
+    _self = None
+    S = None
+
+    HISTORICAL_RATE_LIMITER = TokenBucket(rate=HISTORICAL_RATE_LIMIT, capacity=HISTORICAL_RATE_LIMIT)
+
+    def __init__(self):
+        pass
+
+    def __new__(cls):
+        if cls._self is None:
+            cls._self = super().__new__(cls)
+
+        return cls._self
+
+    def initialize(self) -> requests.Session:
+        if not self.S:
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+
+            self.S = requests.Session()
+            self.S.mount('https://', adapter)
+
+        return self.S
@@ -0,0 +1,178 @@
+import math
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.apps.kite.models import CandleModel
+
+# Interval (in seconds) of the candles against the Kite granularity name
+CANDLE_INTERVALS = {
+    'minute': 60,
+    '5minute': 5 * 60,
+    '15minute': 15 * 60
+}
+# Number of candles kept per instrument and interval i.e. a trading day of minute candles
+CANDLES_SIZE = 375
+
+IST = timezone(timedelta(hours=5, minutes=30))
+# Following matches the timestamp format of the Kite historical candles e.g. 2021-10-14T09:15:00+0530
+CANDLE_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+
+class CandleRing:
+    """Fixed size ring buffer of the OHLCV candles of an instrument for an interval, the oldest
+    candle gets overwritten once the buffer is full"""
+
+    def __init__(self, interval: int, size: int):
+        self.interval = interval
+        self.size = size
+
+        self.starts = array('q', [0]) * size
+        self.opens = array('d', [math.nan]) * size
+        self.highs = array('d', [math.nan]) * size
+        self.lows = array('d', [math.nan]) * size
+        self.closes = array('d', [math.nan]) * size
+        self.volumes = array('q', [0]) * size
+
+        self.head = -1
+        self.count = 0
+
+    def add(self, timestamp: int, price: float, volume: int):
+        start = timestamp - timestamp % self.interval
+        head = self.head
+
+        if self.count and start == self.starts[head]:
+            if price > self.highs[head]:
+                self.highs[head] = price
+
+            if price < self.lows[head]:
+                self.lows[head] = price
+
+            self.closes[head] = price
+            self.volumes[head] += volume
+
+            return
+
+        # Ticks older than the current candle i.e. out of order ticks are ignored
+        if self.count and start < self.starts[head]:
+            return
+
+        head = (head + 1) % self.size
+
+        self.starts[head] = start
+        self.opens[head] = price
+        self.highs[head] = price
+        self.lows[head] = price
+        self.closes[head] = price
+        self.volumes[head] = volume
+
+        self.head = head
+        self.count = min(self.count + 1, self.size)
+
+    def get_columns(self) -> Tuple[np.ndarray, ...]:
+        """Returns the (starts, opens, highs, lows, closes, volumes) columns in chronological order"""
+        indices = (np.arange(self.head - self.count + 1, self.head + 1)) % self.size
+
+        return tuple(
+            np.frombuffer(column, dtype=np.int64 if column.typecode == 'q' else np.float64)[indices]
+            for column in (self.starts, self.opens, self.highs, self.lows, self.closes, self.volumes)
+        )
+
+
+class CandleAggregator:
+    """Builds the OHLCV candles of the instruments from the live ticks.
+
+    Candles are kept per instrument and interval in preallocated ring buffers (CandleRing) and get
+    updated in place as the ticks arrive. Volume of a candle is the change in the cumulative day
+    volume sent in the ticks, the first tick of an instrument has no previous cumulative volume
+    hence its last traded quantity is counted instead. Exchange timestamp of the tick (time of receiving it for the
+    modes without one) decides its candle. Candles are returned in the same shape as the ones of
+    the Kite historical API, i.e. as a CandleModel list or a DataFrame.
+    """
+
+    def __init__(self, intervals: List[str] = None, size: int = CANDLES_SIZE):
+        intervals = intervals or list(CANDLE_INTERVALS.keys())
+
+        for interval in intervals:
+            if interval not in CANDLE_INTERVALS:
+                raise ValueError('Invalid interval: %s, expected one of: %s' % (interval, ', '.join(CANDLE_INTERVALS)))
+
+        self.intervals = intervals
+        self.size = size
+
+        self._rings: Dict[int, Dict[str, CandleRing]] = {}
+        self._volumes: Dict[int, int] = {}
+
+    def add_tick(self, instrument_token: int, last_price: float, volume_traded: int = None, timestamp: int = None,
+                 last_traded_quantity: int = None):
+        """Adds the tick with the exchange timestamp in epoch seconds, receive time is used in-case it's missing"""
+        rings = self._rings.get(instrument_token)
+
+        if rings is None:
+            rings = dict((interval, CandleRing(interval=CANDLE_INTERVALS[interval], size=self.size)) for interval in self.intervals)
+
+            self._rings[instrument_token] = rings
+
+        volume = 0
+
+        if volume_traded is not None:
+            previous_volume_traded = self._volumes.get(instrument_token)
+
+            # Cumulative volume resets with the day, in which case the volume is counted from zero
+            if previous_volume_traded is not None:
+                volume = volume_traded - previous_volume_traded if volume_traded >= previous_volume_traded else volume_traded
+            else:
+                # Cumulative volume of the first tick includes the trades before the aggregation started
+                volume = last_traded_quantity or 0
+
+            self._volumes[instrument_token] = volume_traded
+
+        timestamp = int(timestamp or time.time())
+
+        for ring in rings.values():
+            ring.add(timestamp=timestamp, price=last_price, volume=volume)
+
+    def add_ticks(self, ticks: list):
+        """Adds the decoded ticks, both the dict and the tuple tick formats are supported"""
+        for tick in ticks:
+            if isinstance(tick, dict):
+                timestamp = tick.get('exchange_timestamp')
+
+                self.add_tick(
+                    instrument_token=tick['instrument_token'],
+                    last_price=tick['last_price'],
+                    volume_traded=tick.get('volume_traded'),
+                    timestamp=timestamp.timestamp() if timestamp else None,
+                    last_traded_quantity=tick.get('last_traded_quantity')
+                )
+            else:
+                # Following are the positions of the values in TICK_FIELDS
+                self.add_tick(
+                    instrument_token=tick[0], last_price=tick[3], volume_traded=tick[6], timestamp=tick[18],
+                    last_traded_quantity=tick[4]
+                )
+
+    def _get_candle_columns(self, instrument_token: int, interval: str) -> tuple:
+        ring = self._rings.get(instrument_token, {}).get(interval)
+
+        if ring is None:
+            return [], [], [], [], [], []
+
+        starts, opens, highs, lows, closes, volumes = ring.get_columns()
+        timestamps = [datetime.fromtimestamp(start, tz=IST).strftime(CANDLE_TIMESTAMP_FORMAT) for start in starts.tolist()]
+
+        return timestamps, opens.tolist(), highs.tolist(), lows.tolist(), closes.tolist(), volumes.tolist()
+
+    def get_candles_df(self, instrument_token: int, interval: str = 'minute') -> pd.DataFrame:
+        columns = self._get_candle_columns(instrument_token=instrument_token, interval=interval)
+
+        return pd.DataFrame(dict(zip(['timestamp', 'open', 'high', 'low', 'close', 'volume'], columns)))
+
+    def get_candles(self, instrument_token: int, interval: str = 'minute') -> List[CandleModel]:
+        columns = self._get_candle_columns(instrument_token=instrument_token, interval=interval)
+
+        return [CandleModel(*candle) for candle in zip(*columns)]
@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Callable
+
+from src.logger import LOGGER
+
+DISPATCH_POLICY_DROP_OLDEST = 'drop_oldest'
+DISPATCH_POLICY_COALESCE = 'coalesce'
+DISPATCH_POLICIES = (DISPATCH_POLICY_DROP_OLDEST, DISPATCH_POLICY_COALESCE)
+
+DISPATCH_QUEUE_SIZE = 10000
+
+
+def _get_instrument_token(tick):
+    # Ticks are either dicts or flat tuples with the instrument token as the first value
+    return tick['instrument_token'] if isinstance(tick, dict) else tick[0]
+
+
+class TickDispatcher:
+    """Bounded queue of ticks consumed by a worker thread which calls `callback` with the batch of
+    all the ticks queued since the previous call.
+
+    `put` never blocks, hence a slow callback doesn't stall the thread receiving the ticks. Once the
+    queue is full, the behaviour depends on the policy:
+        - drop_oldest: oldest queued tick is dropped to make room for the new one
+        - coalesce: only the latest tick per instrument token is kept in the queue i.e. a new tick
+          replaces the queued one of the same token, the oldest token is dropped if still full
+    """
+
+    def __init__(self, callback: Callable[[list], None], policy: str = DISPATCH_POLICY_DROP_OLDEST, maxsize: int = DISPATCH_QUEUE_SIZE):
+        if policy not in DISPATCH_POLICIES:
+            raise ValueError('Invalid dispatch policy: %s, expected one of: %s' % (policy, ', '.join(DISPATCH_POLICIES)))
+
+        self.callback = callback
+        self.policy = policy
+        self.maxsize = maxsize
+
+        self._queue = OrderedDict() if policy == DISPATCH_POLICY_COALESCE else deque()
+        self._condition = threading.Condition()
+        self._is_running = False
+        self._thread = None
+        self._metrics = {
+            'enqueued': 0,
+            'dispatched': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'batches': 0,
+            'max_queue_depth': 0
+        }
+
+    def start(self):
+        with self._condition:
+            if self._is_running:
+                return
+
+            self._is_running = True
+
+        self._thread = threading.Thread(target=self._run, name='tick-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Stops the worker after the batch in progress, queued ticks are discarded. Waits for the
+        worker to finish unless called from the callback itself"""
+        with self._condition:
+            self._is_running = False
+            self._queue.clear()
+            self._condition.notify_all()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def put(self, ticks: list):
+        with self._condition:
+            if not self._is_running:
+                return
+
+            for tick in ticks:
+                if self.policy == DISPATCH_POLICY_COALESCE:
+                    instrument_token = _get_instrument_token(tick)
+
+                    if instrument_token in self._queue:
+                        self._metrics['coalesced'] += 1
+
+                    self._queue[instrument_token] = tick
+
+                    if len(self._queue) > self.maxsize:
+                        self._queue.popitem(last=False)
+                        self._metrics['dropped'] += 1
+                else:
+                    self._queue.append(tick)
+
+                    if len(self._queue) > self.maxsize:
+                        self._queue.popleft()
+                        self._metrics['dropped'] += 1
+
+            self._metrics['enqueued'] += len(ticks)
+            self._metrics['max_queue_depth'] = max(self._metrics['max_queue_depth'], len(self._queue))
+
+            self._condition.notify()
+
+    def get_metrics(self) -> dict:
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics['queue_depth'] = len(self._queue)
+
+        return metrics
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._is_running and not self._queue:
+                    self._condition.wait()
+
+                if not self._is_running:
+                    return
+
+                if self.policy == DISPATCH_POLICY_COALESCE:
+                    ticks = list(self._queue.values())
+                else:
+                    ticks = list(self._queue)
+
+                self._queue.clear()
+
+                self._metrics['dispatched'] += len(ticks)
+                self._metrics['batches'] += 1
+
+            try:
+                self.callback(ticks)
+            except Exception as ex:
+                LOGGER.exception('Error while dispatching ticks: %s' % ex)
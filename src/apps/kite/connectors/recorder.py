@@ -0,0 +1,142 @@
+import os
+import struct
+import time
+from typing import Iterator, Tuple
+
+# Following identifies the file format, changing the record layout requires a new version
+RECORDING_HEADER = b'KTICK001'
+# Received at (epoch seconds), is binary flag and length of the frame
+RECORD_HEADER = struct.Struct('>d?I')
+
+RECORDER_FLUSH_INTERVAL = 1  # in seconds
+
+
+class TickRecorder:
+    """Appends the raw websocket frames along with the time they were received at to a file.
+
+    Each record is a fixed size header (RECORD_HEADER) followed by the frame as is, hence the
+    recording is compact and the cost of recording is a single write per frame. Text frames (e.g.
+    order updates) are recorded as well so that the replay matches the live session.
+    """
+
+    def __init__(self, location: str):
+        self.location = location
+
+        folder = os.path.dirname(location)
+
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        is_new_file = not os.path.exists(location) or os.path.getsize(location) == 0
+
+        # Following takes care of a partially written frame i.e. process killed mid-write, so that
+        # the frames appended now stay readable
+        if not is_new_file:
+            valid_size = _get_valid_size(location=location)
+
+            if valid_size < os.path.getsize(location):
+                os.truncate(location, valid_size)
+
+        self._fileop = open(location, 'ab')
+        self._flushed_at = time.time()
+
+        if is_new_file:
+            self._fileop.write(RECORDING_HEADER)
+
+    def record(self, payload: bytes, is_binary: bool, received_at: float = None):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+
+        received_at = received_at or time.time()
+
+        self._fileop.write(RECORD_HEADER.pack(received_at, is_binary, len(payload)))
+        self._fileop.write(payload)
+
+        # Flushing at an interval keeps the recording close to complete in-case the process gets killed
+        if received_at - self._flushed_at > RECORDER_FLUSH_INTERVAL:
+            self._fileop.flush()
+            self._flushed_at = received_at
+
+    def close(self):
+        self._fileop.close()
+
+
+def _get_valid_size(location: str) -> int:
+    with open(location, 'rb') as fileop:
+        if fileop.read(len(RECORDING_HEADER)) != RECORDING_HEADER:
+            raise ValueError('Invalid tick recording: %s' % location)
+
+        file_size = os.fstat(fileop.fileno()).st_size
+        valid_size = fileop.tell()
+
+        while True:
+            header = fileop.read(RECORD_HEADER.size)
+
+            if len(header) < RECORD_HEADER.size:
+                return valid_size
+
+            _, _, length = RECORD_HEADER.unpack(header)
+
+            if valid_size + RECORD_HEADER.size + length > file_size:
+                return valid_size
+
+            valid_size = fileop.seek(length, os.SEEK_CUR)
+
+
+def read_recording(location: str) -> Iterator[Tuple[float, bytes, bool]]:
+    """Yields the (received_at, payload, is_binary) of the recorded frames, a partially written
+    frame at the end of the recording is ignored"""
+    with open(location, 'rb') as fileop:
+        if fileop.read(len(RECORDING_HEADER)) != RECORDING_HEADER:
+            raise ValueError('Invalid tick recording: %s' % location)
+
+        while True:
+            header = fileop.read(RECORD_HEADER.size)
+
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            received_at, is_binary, length = RECORD_HEADER.unpack(header)
+            payload = fileop.read(length)
+
+            if len(payload) < length:
+                return
+
+            yield received_at, payload, is_binary
+
+
+def replay(ticker, location: str, speed: float = None) -> dict:
+    """Feeds the recorded frames to the `_on_message` of the ticker i.e. through the same decoding
+    and callbacks as a live session.
+
+    `speed` is the multiple of the recorded pace at which the frames are fed i.e. 1 for real time,
+    10 for 10x accelerated and None for as fast as possible. Returns the stats of the replay.
+    """
+    frames = 0
+    size = 0
+    first_received_at = None
+    started_at = time.perf_counter()
+
+    for received_at, payload, is_binary in read_recording(location=location):
+        if first_received_at is None:
+            first_received_at = received_at
+
+        if speed:
+            wait_time = (received_at - first_received_at) / speed - (time.perf_counter() - started_at)
+
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+        ticker._on_message(None, payload, is_binary)
+
+        frames += 1
+        size += len(payload)
+
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        'frames': frames,
+        'size': size,
+        'elapsed': elapsed,
+        'frames_per_second': frames / elapsed if elapsed else None
+    }
@@ -0,0 +1,146 @@
+import threading
+from collections import defaultdict
+from typing import Callable, List
+
+from twisted.internet import reactor
+
+from src.logger import LOGGER
+
+from .dispatch import _get_instrument_token
+from .ticks import MODE_FULL, MODE_LTP, MODE_QUOTE
+
+# Ref: https://kite.trade/docs/connect/v3/websocket/#request-structure
+MAX_TOKENS_PER_CONNECTION = 3000
+
+# Following is used to pick the mode of a token subscribed in different modes, higher mode is a
+# superset of the lower ones
+MODE_RANKS = {
+    MODE_LTP: 0,
+    MODE_QUOTE: 1,
+    MODE_FULL: 2
+}
+
+
+class TickRouter:
+    """Shares a single ticker connection across multiple strategies.
+
+    Strategies subscribe to the instrument tokens along with a callback, the router subscribes a token
+    on the connection when its first subscriber comes in and unsubscribes it when the last one leaves
+    (reference counted). Ticks received on the connection are fanned out to the callbacks by token,
+    every callback receives a batch of only the ticks of its tokens. A token subscribed in different
+    modes is subscribed in the highest of them. Subscriptions are (re)sent on every connect.
+
+    In-case `route_ticks` is disabled, the ticks are neither decoded nor fanned out and the strategies
+    read them from the tick table of the ticker (updated by the decoder directly), the callbacks then
+    only identify the subscribers.
+    """
+
+    def __init__(self, ticker, max_tokens: int = MAX_TOKENS_PER_CONNECTION, route_ticks: bool = True):
+        self.ticker = ticker
+        self.max_tokens = max_tokens
+
+        # Following maps the token to the mode requested by each of its subscribers (callbacks)
+        self._subscriptions = defaultdict(dict)
+        self._lock = threading.Lock()
+
+        if route_ticks:
+            ticker.on_ticks = self._on_ticks
+
+        ticker.on_connect = self._on_connect
+
+    def get_tokens(self) -> List[int]:
+        with self._lock:
+            return list(self._subscriptions.keys())
+
+    def subscribe(self, callback: Callable[[list], None], instrument_tokens: List[int], mode: str = MODE_FULL):
+        """Subscribes the callback to the ticks of the tokens, safe to be called from any thread"""
+        changed_modes = defaultdict(list)
+
+        with self._lock:
+            new_tokens = set(instrument_tokens) - set(self._subscriptions.keys())
+
+            if len(self._subscriptions) + len(new_tokens) > self.max_tokens:
+                raise ValueError('Subscribing %d new tokens exceeds the limit of %d tokens per connection' % (
+                    len(new_tokens), self.max_tokens
+                ))
+
+            for instrument_token in instrument_tokens:
+                previous_mode = self._get_mode(instrument_token=instrument_token)
+
+                self._subscriptions[instrument_token][callback] = mode
+
+                current_mode = self._get_mode(instrument_token=instrument_token)
+
+                if current_mode != previous_mode:
+                    changed_modes[current_mode].append(instrument_token)
+
+        if new_tokens:
+            self._call(self.ticker.subscribe, list(new_tokens))
+
+        for mode, tokens in changed_modes.items():
+            self._call(self.ticker.set_mode, mode, tokens)
+
+    def unsubscribe(self, callback: Callable[[list], None], instrument_tokens: List[int]):
+        """Unsubscribes the callback from the ticks of the tokens, safe to be called from any thread"""
+        removed_tokens = []
+        changed_modes = defaultdict(list)
+
+        with self._lock:
+            for instrument_token in instrument_tokens:
+                subscribers = self._subscriptions.get(instrument_token)
+
+                if not subscribers or callback not in subscribers:
+                    continue
+
+                previous_mode = self._get_mode(instrument_token=instrument_token)
+
+                del subscribers[callback]
+
+                if not subscribers:
+                    del self._subscriptions[instrument_token]
+
+                    removed_tokens.append(instrument_token)
+                elif self._get_mode(instrument_token=instrument_token) != previous_mode:
+                    changed_modes[self._get_mode(instrument_token=instrument_token)].append(instrument_token)
+
+        if removed_tokens:
+            self._call(self.ticker.unsubscribe, removed_tokens)
+
+        for mode, tokens in changed_modes.items():
+            self._call(self.ticker.set_mode, mode, tokens)
+
+    def _get_mode(self, instrument_token: int) -> str:
+        modes = self._subscriptions.get(instrument_token, {}).values()
+
+        return max(modes, key=lambda mode: MODE_RANKS[mode]) if modes else None
+
+    def _call(self, func, *args):
+        # Messages can only be sent from the reactor thread and only over an open connection, the
+        # subscriptions made before connecting are sent on connect
+        if self.ticker.is_connected():
+            reactor.callFromThread(func, *args)
+
+    def _on_connect(self, ws, response):
+        modes = defaultdict(list)
+
+        with self._lock:
+            for instrument_token in self._subscriptions:
+                modes[self._get_mode(instrument_token=instrument_token)].append(instrument_token)
+
+        for mode, tokens in modes.items():
+            ws.subscribe(tokens)
+            ws.set_mode(mode, tokens)
+
+    def _on_ticks(self, ws, ticks):
+        callback_ticks = defaultdict(list)
+
+        with self._lock:
+            for tick in ticks:
+                for callback in self._subscriptions.get(_get_instrument_token(tick), ()):
+                    callback_ticks[callback].append(tick)
+
+        for callback, ticks in callback_ticks.items():
+            try:
+                callback(ticks)
+            except Exception as ex:
+                LOGGER.exception('Error while routing ticks: %s' % ex)
@@ -0,0 +1,126 @@
+import math
+import threading
+from array import array
+from typing import Dict, Iterable, List, Tuple, Union
+
+TICK_TABLE_FIELDS = ('last_price', 'volume_traded', 'oi', 'exchange_timestamp')
+
+
+class TickTable:
+    """Last value table of the ticks keyed by instrument token.
+
+    Values are kept in arrays (one per field in TICK_TABLE_FIELDS) indexed by the slot assigned to
+    the token on its first tick, along with a changed flag per slot. The decoder keeps overwriting
+    the values as the ticks arrive and the strategies poll the changed instruments at their own
+    cadence, hence the work of a strategy doesn't grow with the number of ticks received. Values
+    not sent in the subscribed mode are NaN.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._tokens = array('q')
+        self._values = dict((field, array('d')) for field in TICK_TABLE_FIELDS)
+        self._changed = bytearray()
+        self._changed_slots = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __contains__(self, instrument_token: int) -> bool:
+        return instrument_token in self._slots
+
+    def _get_slot(self, instrument_token: int) -> int:
+        slot = self._slots.get(instrument_token)
+
+        if slot is None:
+            slot = len(self._tokens)
+
+            self._slots[instrument_token] = slot
+            self._tokens.append(instrument_token)
+            self._changed.append(0)
+
+            for values in self._values.values():
+                values.append(math.nan)
+
+        return slot
+
+    def update(self, rows: Iterable[tuple]):
+        """Updates the table with the (instrument_token, last_price, volume_traded, oi, exchange_timestamp)
+        rows, None values are skipped i.e. the previous value is kept"""
+        last_prices = self._values['last_price']
+        volumes = self._values['volume_traded']
+        ois = self._values['oi']
+        timestamps = self._values['exchange_timestamp']
+
+        with self._lock:
+            for instrument_token, last_price, volume_traded, oi, exchange_timestamp in rows:
+                slot = self._get_slot(instrument_token)
+
+                last_prices[slot] = last_price
+
+                if volume_traded is not None:
+                    volumes[slot] = volume_traded
+
+                if oi is not None:
+                    ois[slot] = oi
+
+                if exchange_timestamp is not None:
+                    timestamps[slot] = exchange_timestamp
+
+                if not self._changed[slot]:
+                    self._changed[slot] = 1
+                    self._changed_slots.append(slot)
+
+    def get(self, instrument_token: int) -> Union[Dict[str, float], None]:
+        with self._lock:
+            slot = self._slots.get(instrument_token)
+
+            if slot is None:
+                return None
+
+            return dict((field, values[slot]) for field, values in self._values.items())
+
+    def get_values(self, instrument_tokens: Iterable[int], field: str = 'last_price') -> List[Tuple[int, float]]:
+        """Returns the (instrument_token, value) of the tokens having a tick, without touching the changed
+        flags i.e. the table can be shared by the strategies reading their own instruments"""
+        values = self._values[field]
+
+        with self._lock:
+            return [
+                (instrument_token, values[self._slots[instrument_token]])
+                for instrument_token in instrument_tokens if instrument_token in self._slots
+            ]
+
+    def poll_changed(self, field: str = 'last_price') -> List[Tuple[int, float]]:
+        """Returns the (instrument_token, value) of the instruments which changed since the previous
+        poll, in the order of their first change, and resets the changed flags"""
+        values = self._values[field]
+
+        with self._lock:
+            changed = [(self._tokens[slot], values[slot]) for slot in self._changed_slots]
+
+            for slot in self._changed_slots:
+                self._changed[slot] = 0
+
+            self._changed_slots = []
+
+        return changed
+
+    def add_ticks(self, ticks: list):
+        """Updates the table with the decoded ticks, both the dict and the tuple tick formats are supported"""
+        rows = []
+
+        for tick in ticks:
+            if isinstance(tick, dict):
+                timestamp = tick.get('exchange_timestamp')
+
+                rows.append((
+                    tick['instrument_token'], tick['last_price'], tick.get('volume_traded'), tick.get('oi'),
+                    timestamp.timestamp() if timestamp else None
+                ))
+            else:
+                # Following are the positions of the values in TICK_FIELDS
+                rows.append((tick[0], tick[3], tick[6], tick[15], tick[18]))
+
+        self.update(rows)
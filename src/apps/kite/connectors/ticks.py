@@ -0,0 +1,284 @@
+"""
+Decoder of the binary market data packets sent over the Kite ticker websocket.
+Ref: https://kite.trade/docs/connect/v3/websocket/#message-structure
+"""
+import struct
+from datetime import datetime
+
+from .table import TickTable
+
+MODE_FULL = 'full'
+MODE_QUOTE = 'quote'
+MODE_LTP = 'ltp'
+
+# Following are the segment constants (last byte of the instrument token) which affect the parsing
+CDS_SEGMENT = 3
+INDICES_SEGMENT = 9
+
+TICK_FORMAT_DICT = 'dict'
+TICK_FORMAT_TUPLE = 'tuple'
+TICK_FORMAT_COLUMNAR = 'columnar'
+TICK_FORMATS = (TICK_FORMAT_DICT, TICK_FORMAT_TUPLE, TICK_FORMAT_COLUMNAR)
+
+# Sequence of the values in a tuple (and the columns in a columnar batch) of a tick, the values not
+# sent in a mode are set as None. Timestamps are kept as epoch seconds and the depth as a tuple of
+# (quantity, price, orders) for 5 buy followed by 5 sell entries.
+TICK_FIELDS = (
+    'instrument_token',
+    'mode',
+    'tradable',
+    'last_price',
+    'last_traded_quantity',
+    'average_traded_price',
+    'volume_traded',
+    'total_buy_quantity',
+    'total_sell_quantity',
+    'open',
+    'high',
+    'low',
+    'close',
+    'change',
+    'last_trade_time',
+    'oi',
+    'oi_day_high',
+    'oi_day_low',
+    'exchange_timestamp',
+    'depth'
+)
+
+DEPTH_SIZE = 10
+
+NUMBER_OF_PACKETS = struct.Struct('>H')
+PACKET_LENGTH = struct.Struct('>H')
+
+# token, last price
+LTP_PACKET = struct.Struct('>2I')
+# token, last price, high, low, open, close, change, (exchange timestamp)
+INDEX_QUOTE_PACKET = struct.Struct('>7I')
+INDEX_FULL_PACKET = struct.Struct('>8I')
+# token, last price, last traded quantity, average traded price, volume, total buy quantity,
+# total sell quantity, open, high, low, close
+QUOTE_PACKET = struct.Struct('>11I')
+# quote packet followed by last trade time, oi, oi day high, oi day low, exchange timestamp and the
+# market depth of (quantity, price, orders, 2 bytes padding) per entry
+FULL_PACKET = struct.Struct('>16I' + 'IIH2x' * DEPTH_SIZE)
+# Single value of a packet, used to only read the fields required for the tick table
+UINT_VALUE = struct.Struct('>I')
+
+
+def _get_datetime(timestamp: int):
+    try:
+        return datetime.fromtimestamp(timestamp)
+    except Exception:
+        return None
+
+
+def _get_change(last_price: float, close: float) -> float:
+    return (last_price - close) * 100 / close if close != 0 else 0
+
+
+class TickDecoder:
+    """Decodes the binary websocket messages to the list of ticks.
+
+    Packet layouts are precompiled as `struct.Struct` and unpacked in a single call per packet
+    directly from a memoryview of the message i.e. without copying the packets out of it.
+    Ticks can be emitted as:
+        - dict: same structure as the one of pykiteconnect (default)
+        - tuple: flat tuple per tick with the values in the sequence of TICK_FIELDS
+        - columnar: dict of TICK_FIELDS against the list of values of all the ticks in the message
+    """
+
+    def __init__(self, tick_format: str = TICK_FORMAT_DICT):
+        if tick_format not in TICK_FORMATS:
+            raise ValueError('Invalid tick format: %s, expected one of: %s' % (tick_format, ', '.join(TICK_FORMATS)))
+
+        self.tick_format = tick_format
+
+    def decode(self, message: bytes):
+        if self.tick_format == TICK_FORMAT_DICT:
+            return [self._to_dict(tick) for tick in self._decode(message)]
+
+        ticks = list(self._decode(message))
+
+        if self.tick_format == TICK_FORMAT_TUPLE:
+            return ticks
+
+        columns = list(zip(*ticks)) if ticks else [() for _ in TICK_FIELDS]
+
+        return dict((field, list(values)) for field, values in zip(TICK_FIELDS, columns))
+
+    def update_table(self, message: bytes, table: TickTable):
+        """Updates the table with the values of the ticks in the message, only the values kept by the
+        table are unpacked and no tick is materialized"""
+        message = memoryview(message)
+        rows = []
+
+        for offset, packet_length in self._split_packets(message):
+            token, last_price = LTP_PACKET.unpack_from(message, offset)
+            divisor = 10000000.0 if token & 0xff == CDS_SEGMENT else 100.0
+            volume_traded, oi, timestamp = None, None, None
+
+            if packet_length == 32:
+                timestamp, = UINT_VALUE.unpack_from(message, offset + 28)
+            elif packet_length == 44 or packet_length == 184:
+                volume_traded, = UINT_VALUE.unpack_from(message, offset + 16)
+
+                if packet_length == 184:
+                    oi, = UINT_VALUE.unpack_from(message, offset + 48)
+                    timestamp, = UINT_VALUE.unpack_from(message, offset + 60)
+            elif packet_length != 8 and packet_length != 28:
+                continue
+
+            rows.append((token, last_price / divisor, volume_traded, oi, timestamp))
+
+        table.update(rows)
+
+    def _split_packets(self, message: memoryview):
+        """Yields the (offset, length) of the packets in the message, packets are not copied out of it"""
+        # Ignore heartbeat data
+        if len(message) < 2:
+            return
+
+        number_of_packets, = NUMBER_OF_PACKETS.unpack_from(message, 0)
+        offset = 2
+
+        for _ in range(number_of_packets):
+            packet_length, = PACKET_LENGTH.unpack_from(message, offset)
+
+            yield offset + 2, packet_length
+
+            offset += 2 + packet_length
+
+    def _decode(self, message: bytes):
+        """Yields the ticks as flat tuples in the sequence of TICK_FIELDS"""
+        message = memoryview(message)
+
+        for offset, packet_length in self._split_packets(message):
+            if packet_length == 8:
+                token, last_price = LTP_PACKET.unpack_from(message, offset)
+                segment = token & 0xff
+                divisor = 10000000.0 if segment == CDS_SEGMENT else 100.0
+
+                yield (
+                    token, MODE_LTP, segment != INDICES_SEGMENT, last_price / divisor,
+                    None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None
+                )
+            elif packet_length == 28 or packet_length == 32:
+                if packet_length == 28:
+                    token, last_price, high, low, open_, close, _ = INDEX_QUOTE_PACKET.unpack_from(message, offset)
+                    mode, timestamp = MODE_QUOTE, None
+                else:
+                    token, last_price, high, low, open_, close, _, timestamp = INDEX_FULL_PACKET.unpack_from(message, offset)
+                    mode = MODE_FULL
+
+                segment = token & 0xff
+                divisor = 10000000.0 if segment == CDS_SEGMENT else 100.0
+                last_price, close = last_price / divisor, close / divisor
+
+                yield (
+                    token, mode, segment != INDICES_SEGMENT, last_price,
+                    None, None, None, None, None,
+                    open_ / divisor, high / divisor, low / divisor, close, _get_change(last_price, close),
+                    None, None, None, None, timestamp, None
+                )
+            elif packet_length == 44 or packet_length == 184:
+                if packet_length == 44:
+                    values = QUOTE_PACKET.unpack_from(message, offset)
+                    mode = MODE_QUOTE
+                    last_trade_time, oi, oi_day_high, oi_day_low, timestamp, depth = None, None, None, None, None, None
+                else:
+                    values = FULL_PACKET.unpack_from(message, offset)
+                    mode = MODE_FULL
+                    last_trade_time, oi, oi_day_high, oi_day_low, timestamp = values[11:16]
+
+                token, last_price, last_traded_quantity, average_traded_price, volume_traded, \
+                    total_buy_quantity, total_sell_quantity, open_, high, low, close = values[:11]
+
+                segment = token & 0xff
+                divisor = 10000000.0 if segment == CDS_SEGMENT else 100.0
+                last_price, close = last_price / divisor, close / divisor
+
+                if mode == MODE_FULL:
+                    depth = tuple(
+                        (values[index], values[index + 1] / divisor, values[index + 2])
+                        for index in range(16, 16 + 3 * DEPTH_SIZE, 3)
+                    )
+
+                yield (
+                    token, mode, segment != INDICES_SEGMENT, last_price,
+                    last_traded_quantity, average_traded_price / divisor, volume_traded,
+                    total_buy_quantity, total_sell_quantity,
+                    open_ / divisor, high / divisor, low / divisor, close, _get_change(last_price, close),
+                    last_trade_time, oi, oi_day_high, oi_day_low, timestamp, depth
+                )
+
+    def _to_dict(self, tick: tuple) -> dict:
+        token, mode, tradable, last_price, last_traded_quantity, average_traded_price, volume_traded, \
+            total_buy_quantity, total_sell_quantity, open_, high, low, close, change, \
+            last_trade_time, oi, oi_day_high, oi_day_low, timestamp, depth = tick
+
+        if open_ is None:
+            return {
+                'tradable': tradable,
+                'mode': mode,
+                'instrument_token': token,
+                'last_price': last_price
+            }
+
+        if last_traded_quantity is None:
+            data = {
+                'tradable': tradable,
+                'mode': mode,
+                'instrument_token': token,
+                'last_price': last_price,
+                'ohlc': {
+                    'high': high,
+                    'low': low,
+                    'open': open_,
+                    'close': close
+                },
+                'change': change
+            }
+
+            if mode == MODE_FULL:
+                data['exchange_timestamp'] = _get_datetime(timestamp)
+
+            return data
+
+        data = {
+            'tradable': tradable,
+            'mode': mode,
+            'instrument_token': token,
+            'last_price': last_price,
+            'last_traded_quantity': last_traded_quantity,
+            'average_traded_price': average_traded_price,
+            'volume_traded': volume_traded,
+            'total_buy_quantity': total_buy_quantity,
+            'total_sell_quantity': total_sell_quantity,
+            'ohlc': {
+                'open': open_,
+                'high': high,
+                'low': low,
+                'close': close
+            },
+            'change': change
+        }
+
+        if mode == MODE_FULL:
+            data['last_trade_time'] = _get_datetime(last_trade_time)
+            data['oi'] = oi
+            data['oi_day_high'] = oi_day_high
+            data['oi_day_low'] = oi_day_low
+            data['exchange_timestamp'] = _get_datetime(timestamp)
+            data['depth'] = {
+                'buy': [
+                    { 'quantity': quantity, 'price': price, 'orders': orders }
+                    for quantity, price, orders in depth[:DEPTH_SIZE // 2]
+                ],
+                'sell': [
+                    { 'quantity': quantity, 'price': price, 'orders': orders }
+                    for quantity, price, orders in depth[DEPTH_SIZE // 2:]
+                ]
+            }
+
+        return data
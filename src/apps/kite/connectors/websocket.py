@@ -5,11 +5,11 @@ import six
 import sys
 import time
 import json
-import struct
 import threading
 from datetime import datetime
 
 from twisted.internet import reactor, ssl
+from twisted.python import threadable
 from twisted.python import log as twisted_log
 from twisted.internet.protocol import ReconnectingClientFactory
 from autobahn.twisted.websocket import WebSocketClientProtocol, \
@@ -17,6 +17,9 @@ from autobahn.twisted.websocket import WebSocketClientProtocol, \
 
 from src.logger import LOGGER
 
+from .dispatch import DISPATCH_QUEUE_SIZE, TickDispatcher
+from .ticks import TICK_FORMAT_COLUMNAR, TICK_FORMAT_DICT, TickDecoder
+
 __title__ = "kiteconnect"
 __version__ = "3.9.4"
 
@@ -378,7 +381,8 @@ class KiteTicker(object):
 
     def __init__(self, user_id, enctoken, debug=False, root=None,
                  reconnect=True, reconnect_max_tries=RECONNECT_MAX_TRIES, reconnect_max_delay=RECONNECT_MAX_DELAY,
-                 connect_timeout=CONNECT_TIMEOUT):
+                 connect_timeout=CONNECT_TIMEOUT, tick_format=TICK_FORMAT_DICT,
+                 dispatch_policy=None, dispatch_queue_size=DISPATCH_QUEUE_SIZE, tick_table=None, recorder=None):
         """
         Initialise websocket client instance.
         - `api_key` is the API key issued to you
@@ -394,6 +398,16 @@ class KiteTicker(object):
         - `reconnect_max_delay` in seconds is the maximum delay after which subsequent reconnection interval will become constant. Defaults to 60s and minimum acceptable value is 5s.
         - `reconnect_max_tries` is maximum number reconnection attempts. Defaults to 50 attempts and maximum up to 300 attempts.
         - `connect_timeout` in seconds is the maximum interval after which connection is considered as timeout. Defaults to 30s.
+        - `tick_format` is the structure in which ticks are sent to `on_ticks`. It can be one of `dict` (default),
+            `tuple` (flat tuples in the sequence of `TICK_FIELDS`) or `columnar` (dict of `TICK_FIELDS` against the values).
+        - `dispatch_policy` enables calling `on_ticks` from a worker thread instead of the reactor thread, ticks are
+            queued (up to `dispatch_queue_size`) till then. It can be one of `drop_oldest` or `coalesce` (latest tick
+            per instrument), which decides the ticks kept once the queue is full. Defaults to None i.e. `on_ticks`
+            is called synchronously.
+        - `tick_table` is a `TickTable` which is updated with the latest values of the ticks as they arrive, strategies
+            can poll it for the changed instruments instead of (or along with) handling every tick in `on_ticks`.
+        - `recorder` is a `TickRecorder` to which the raw frames are appended as they arrive, which can later be
+            replayed through `src.apps.kite.connectors.recorder.replay` (a module level function).
         """
         self.root = root or self.ROOT_URI
 
@@ -439,6 +453,21 @@ class KiteTicker(object):
         # List of current subscribed tokens
         self.subscribed_tokens = {}
 
+        self._tick_decoder = TickDecoder(tick_format=tick_format)
+        self.tick_table = tick_table
+        self.recorder = recorder
+        self._tick_dispatcher = None
+
+        if dispatch_policy:
+            if tick_format == TICK_FORMAT_COLUMNAR:
+                raise ValueError('Dispatching ticks is not supported with the columnar tick format')
+
+            self._tick_dispatcher = TickDispatcher(
+                callback=self._dispatch_ticks,
+                policy=dispatch_policy,
+                maxsize=dispatch_queue_size
+            )
+
     def _create_connection(self, url, **kwargs):
         """Create a WebSocket client connection."""
         self.factory = KiteTickerClientFactory(url, **kwargs)
@@ -485,6 +514,9 @@ class KiteTicker(object):
         if self.factory.isSecure and not disable_ssl_verification:
             context_factory = ssl.ClientContextFactory()
 
+        if self._tick_dispatcher:
+            self._tick_dispatcher.start()
+
         # Establish WebSocket connection to a server
         connectWS(self.factory, contextFactory=context_factory, timeout=self.connect_timeout)
 
@@ -517,16 +549,37 @@ class KiteTicker(object):
         if self.ws:
             self.ws.sendClose(code, reason)
 
+    def _call_in_reactor(self, func, *args):
+        """Calls the function on the reactor thread. Calls made from the reactor thread, or while the
+        reactor isn't running (as the queued calls would never run), are made directly."""
+        if not reactor.running or threadable.isInIOThread():
+            func(*args)
+        else:
+            reactor.callFromThread(func, *args)
+
     def close(self, code=None, reason=None):
-        """Close the WebSocket connection."""
-        self.stop_retry()
-        self._close(code, reason)
+        """Close the WebSocket connection. Safe to be called from any thread i.e. the dispatcher as well."""
+        # Ticks still in the queue are not dispatched once the connection is being closed
+        if self._tick_dispatcher:
+            self._tick_dispatcher.stop()
+
+        self._call_in_reactor(self.stop_retry)
+        self._call_in_reactor(self._close, code, reason)
 
     def stop(self):
         """Stop the event loop. Should be used if main thread has to be closed in `on_close` method.
         Reconnection mechanism cannot happen past this method
         """
-        reactor.stop()
+        if self._tick_dispatcher:
+            self._tick_dispatcher.stop()
+
+        # Following avoids ReactorNotRunning, there is no event loop to be stopped
+        if reactor.running:
+            self._call_in_reactor(reactor.stop)
+
+    def get_dispatch_metrics(self):
+        """Returns the queue metrics of the tick dispatcher, None if ticks are not being dispatched."""
+        return self._tick_dispatcher.get_metrics() if self._tick_dispatcher else None
 
     def stop_retry(self):
         """Stop auto retry when it is in progress."""
@@ -633,17 +686,31 @@ class KiteTicker(object):
 
     def _on_message(self, ws, payload, is_binary):
         """Call `on_message` callback when text message is received."""
+        if self.recorder:
+            self.recorder.record(payload, is_binary)
+
         if self.on_message:
             self.on_message(self, payload, is_binary)
 
+        if self.tick_table is not None and is_binary and len(payload) > 4:
+            self._tick_decoder.update_table(payload, self.tick_table)
+
         # If the message is binary, parse it and send it to the callback.
         if self.on_ticks and is_binary and len(payload) > 4:
-            self.on_ticks(self, self._parse_binary(payload))
+            if self._tick_dispatcher:
+                self._tick_dispatcher.put(self._parse_binary(payload))
+            else:
+                self.on_ticks(self, self._parse_binary(payload))
 
         # Parse text messages
         if not is_binary:
             self._parse_text_message(payload)
 
+    def _dispatch_ticks(self, ticks):
+        """Call `on_ticks` callback from the dispatcher thread."""
+        if self.on_ticks:
+            self.on_ticks(self, ticks)
+
     def _on_open(self, ws):
         # Resubscribe if its reconnect
         if not self._is_first_connect:
@@ -684,140 +751,4 @@ class KiteTicker(object):
 
     def _parse_binary(self, bin):
         """Parse binary data to a (list of) ticks structure."""
-        packets = self._split_packets(bin)  # split data to individual ticks packet
-        data = []
-
-        for packet in packets:
-            instrument_token = self._unpack_int(packet, 0, 4)
-            segment = instrument_token & 0xff  # Retrive segment constant from instrument_token
-
-            divisor = 10000000.0 if segment == self.EXCHANGE_MAP["cds"] else 100.0
-
-            # All indices are not tradable
-            tradable = False if segment == self.EXCHANGE_MAP["indices"] else True
-
-            # LTP packets
-            if len(packet) == 8:
-                data.append({
-                    "tradable": tradable,
-                    "mode": self.MODE_LTP,
-                    "instrument_token": instrument_token,
-                    "last_price": self._unpack_int(packet, 4, 8) / divisor
-                })
-            # Indices quote and full mode
-            elif len(packet) == 28 or len(packet) == 32:
-                mode = self.MODE_QUOTE if len(packet) == 28 else self.MODE_FULL
-
-                d = {
-                    "tradable": tradable,
-                    "mode": mode,
-                    "instrument_token": instrument_token,
-                    "last_price": self._unpack_int(packet, 4, 8) / divisor,
-                    "ohlc": {
-                        "high": self._unpack_int(packet, 8, 12) / divisor,
-                        "low": self._unpack_int(packet, 12, 16) / divisor,
-                        "open": self._unpack_int(packet, 16, 20) / divisor,
-                        "close": self._unpack_int(packet, 20, 24) / divisor
-                    }
-                }
-
-                # Compute the change price using close price and last price
-                d["change"] = 0
-                if(d["ohlc"]["close"] != 0):
-                    d["change"] = (d["last_price"] - d["ohlc"]["close"]) * 100 / d["ohlc"]["close"]
-
-                # Full mode with timestamp
-                if len(packet) == 32:
-                    try:
-                        timestamp = datetime.fromtimestamp(self._unpack_int(packet, 28, 32))
-                    except Exception:
-                        timestamp = None
-
-                    d["exchange_timestamp"] = timestamp
-
-                data.append(d)
-            # Quote and full mode
-            elif len(packet) == 44 or len(packet) == 184:
-                mode = self.MODE_QUOTE if len(packet) == 44 else self.MODE_FULL
-
-                d = {
-                    "tradable": tradable,
-                    "mode": mode,
-                    "instrument_token": instrument_token,
-                    "last_price": self._unpack_int(packet, 4, 8) / divisor,
-                    "last_traded_quantity": self._unpack_int(packet, 8, 12),
-                    "average_traded_price": self._unpack_int(packet, 12, 16) / divisor,
-                    "volume_traded": self._unpack_int(packet, 16, 20),
-                    "total_buy_quantity": self._unpack_int(packet, 20, 24),
-                    "total_sell_quantity": self._unpack_int(packet, 24, 28),
-                    "ohlc": {
-                        "open": self._unpack_int(packet, 28, 32) / divisor,
-                        "high": self._unpack_int(packet, 32, 36) / divisor,
-                        "low": self._unpack_int(packet, 36, 40) / divisor,
-                        "close": self._unpack_int(packet, 40, 44) / divisor
-                    }
-                }
-
-                # Compute the change price using close price and last price
-                d["change"] = 0
-                if(d["ohlc"]["close"] != 0):
-                    d["change"] = (d["last_price"] - d["ohlc"]["close"]) * 100 / d["ohlc"]["close"]
-
-                # Parse full mode
-                if len(packet) == 184:
-                    try:
-                        last_trade_time = datetime.fromtimestamp(self._unpack_int(packet, 44, 48))
-                    except Exception:
-                        last_trade_time = None
-
-                    try:
-                        timestamp = datetime.fromtimestamp(self._unpack_int(packet, 60, 64))
-                    except Exception:
-                        timestamp = None
-
-                    d["last_trade_time"] = last_trade_time
-                    d["oi"] = self._unpack_int(packet, 48, 52)
-                    d["oi_day_high"] = self._unpack_int(packet, 52, 56)
-                    d["oi_day_low"] = self._unpack_int(packet, 56, 60)
-                    d["exchange_timestamp"] = timestamp
-
-                    # Market depth entries.
-                    depth = {
-                        "buy": [],
-                        "sell": []
-                    }
-
-                    # Compile the market depth lists.
-                    for i, p in enumerate(range(64, len(packet), 12)):
-                        depth["sell" if i >= 5 else "buy"].append({
-                            "quantity": self._unpack_int(packet, p, p + 4),
-                            "price": self._unpack_int(packet, p + 4, p + 8) / divisor,
-                            "orders": self._unpack_int(packet, p + 8, p + 10, byte_format="H")
-                        })
-
-                    d["depth"] = depth
-
-                data.append(d)
-
-        return data
-
-    def _unpack_int(self, bin, start, end, byte_format="I"):
-        """Unpack binary data as unsgined interger."""
-        return struct.unpack(">" + byte_format, bin[start:end])[0]
-
-    def _split_packets(self, bin):
-        """Split the data to individual packets of ticks."""
-        # Ignore heartbeat data.
-        if len(bin) < 2:
-            return []
-
-        number_of_packets = self._unpack_int(bin, 0, 2, byte_format="H")
-        packets = []
-
-        j = 2
-        for i in range(number_of_packets):
-            packet_length = self._unpack_int(bin, j, j + 2, byte_format="H")
-            packets.append(bin[j + 2: j + 2 + packet_length])
-            j = j + 2 + packet_length
-
-        return packets
+        return self._tick_decoder.decode(bin)
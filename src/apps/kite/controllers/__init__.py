@@ -4,5 +4,6 @@ from .instruments import *
 from .options import *
 from .orders import *
 from .positions import *
+from .quotes import *
 from .technicals import *
 from .users import *
@@ -1,9 +1,11 @@
-from dataclasses import asdict
 import json
-from typing import List
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from datetime import date, datetime, timedelta
 
 import requests
+import numpy as np
 import pandas as pd
 from dacite import from_dict
 
@@ -16,7 +18,9 @@ from src.cache import Cache
 from src.apps.nse.controllers.options import OptionsController as HistoricalOptionalsController
 from src.apps.settings.controllers import ConfigController
 
-from ..models import InstrumentModel, EnrichedInstrumentModel, CandleModel, OptionModel, StockOfInterest
+from ..client import KiteClient, MAX_WORKERS as KITE_MAX_WORKERS
+from ..models import InstrumentModel, EnrichedInstrumentModel, CandleModel, MomentumStateModel, OptionModel, StockOfInterest
+from ..stores import CandleStore, InstrumentStore
 from .technicals import TechnicalIndicatorsController
 
 MARKET_HOLIDAY_ALTERNATES = {
@@ -33,16 +37,7 @@ class InstrumentsController:
         if InstrumentsController.INSTRUMENT_TOKEN_DICT:
             return InstrumentsController.INSTRUMENT_TOKEN_DICT
 
-        response = requests.get('https://api.kite.trade/instruments')
-
-        if response.status_code != 200:
-            raise ValueError('Unexpected response code found: %d, response: %s' % (response.status_code, response.text))
-
-        instruments = Utilities.csv_text_to_dict(response.text)
-        instrument_token_dict = {}
-
-        for instrument in instruments:
-            instrument_token_dict[instrument['tradingsymbol']] = instrument['instrument_token']
+        instrument_token_dict = InstrumentStore().initialize().get_token_dict()
 
         InstrumentsController.INSTRUMENT_TOKEN_DICT = instrument_token_dict
 
@@ -128,30 +123,28 @@ class InstrumentsController:
         return InstrumentsController.get_instrument_price_details(tickersymbol=tickersymbol).close
 
     @staticmethod
-    def get_instrument_candles(tickersymbol: str, granularity: str = 'day', from_date: date = None, to_date: date = None) -> List[CandleModel]:
-        insturment_token_dict = InstrumentsController.get_instrument_token_dict()
-
-        # Following is documented here: https://kite.trade/docs/connect/v3/historical/
-        response_headers = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    def get_instrument_token(tickersymbol: str) -> str:
+        instrument_token = InstrumentStore().initialize().get_token(tradingsymbol=tickersymbol)
 
         tickersymbol_backup = {
             'BANKNIFTY': '260105',
             'NIFTY': '256265'
         }
 
-        if not from_date:
-            from_date = datetime.now() - timedelta(days=365)
+        return str(instrument_token) if instrument_token is not None else tickersymbol_backup[tickersymbol]
 
-        if not to_date:
-            to_date = datetime.now()
-
-        instrument_token = insturment_token_dict[tickersymbol] if tickersymbol in insturment_token_dict else tickersymbol_backup[tickersymbol]
+    @staticmethod
+    def fetch_instrument_candles(instrument_token: str, granularity: str, from_date: date, to_date: date, user_id: str = None) -> list:
+        """Fetches the raw candle rows from Kite i.e. [timestamp, open, high, low, close, volume, oi]"""
+        # Following ensures that the concurrent fetches stay within the historical API limits
+        KiteClient.HISTORICAL_RATE_LIMITER.acquire()
 
-        response = requests.get(
+        # Following is documented here: https://kite.trade/docs/connect/v3/historical/
+        response = KiteClient().initialize().get(
             'https://kite.zerodha.com/oms/instruments/historical/%(instrument_token)s/%(granularity)s?user_id=%(user_id)s&oi=1&from=%(from)s&to=%(to)s' % {
                 'instrument_token': instrument_token,
                 'granularity': granularity,
-                'user_id': UsersController.get_current_user().user_id,
+                'user_id': user_id or UsersController.get_current_user().user_id,
                 'from': from_date.strftime('%Y-%m-%d'),
                 'to': to_date.strftime('%Y-%m-%d')
             },
@@ -163,12 +156,95 @@ class InstrumentsController:
         if response.status_code != 200:
             raise ValueError('Unexpected response code found: %d, response: %s' % (response.status_code, response.text))
 
-        instrument_candles = []
+        return response.json()['data']['candles']
+
+    @staticmethod
+    def get_instrument_candles_array(
+        tickersymbol: str, granularity: str = 'day', from_date: date = None, to_date: date = None, user_id: str = None
+    ) -> np.ndarray:
+        """Returns the candles as a structured array of CANDLE_DTYPE, only the date ranges missing from
+        the local candle store are fetched from Kite"""
+        if not from_date:
+            from_date = datetime.now() - timedelta(days=365)
+
+        if not to_date:
+            to_date = datetime.now()
+
+        instrument_token = InstrumentsController.get_instrument_token(tickersymbol=tickersymbol)
+
+        return CandleStore.get_store(instrument_token=instrument_token, granularity=granularity).get(
+            from_date=from_date,
+            to_date=to_date,
+            fetcher=lambda start, end: InstrumentsController.fetch_instrument_candles(
+                instrument_token=instrument_token, granularity=granularity, from_date=start, to_date=end, user_id=user_id
+            )
+        )
+
+    @staticmethod
+    def get_instrument_candles_df(tickersymbol: str, granularity: str = 'day', from_date: date = None, to_date: date = None) -> pd.DataFrame:
+        return pd.DataFrame(InstrumentsController.get_instrument_candles_array(
+            tickersymbol=tickersymbol, granularity=granularity, from_date=from_date, to_date=to_date
+        ))
 
-        for row in response.json()['data']['candles']:
-            instrument_candles.append(from_dict(data_class=CandleModel, data=dict(zip(response_headers, row))))
+    @staticmethod
+    def get_instrument_candles_bulk(
+        tickersymbols: List[str], granularity: str = 'day', from_date: date = None, to_date: date = None
+    ) -> Dict[str, pd.DataFrame]:
+        """Fetches the candles of the tickersymbols concurrently, the requests are rate limited to the
+        Kite historical API limits hence the total time is bound by the limit rather than the latency"""
+        # Following are resolved upfront to avoid every worker thread making the same calls
+        InstrumentStore().initialize()
+        user_id = UsersController.get_current_user().user_id
+        tickersymbols = list(dict.fromkeys(tickersymbols))
+
+        with ThreadPoolExecutor(max_workers=KITE_MAX_WORKERS) as executor:
+            candles = executor.map(
+                lambda tickersymbol: InstrumentsController.get_instrument_candles_array(
+                    tickersymbol=tickersymbol, granularity=granularity, from_date=from_date, to_date=to_date, user_id=user_id
+                ),
+                tickersymbols
+            )
 
-        return instrument_candles
+            return dict((tickersymbol, pd.DataFrame(candle)) for tickersymbol, candle in zip(tickersymbols, candles))
+
+    @staticmethod
+    def get_instrument_candles(tickersymbol: str, granularity: str = 'day', from_date: date = None, to_date: date = None) -> List[CandleModel]:
+        candles = InstrumentsController.get_instrument_candles_array(
+            tickersymbol=tickersymbol, granularity=granularity, from_date=from_date, to_date=to_date
+        )
+
+        return [CandleModel(*candle) for candle in candles.tolist()]
+
+    @staticmethod
+    def get_momentum_state(tickersymbol: str, granularity: str = 'day', column_name: str = 'close') -> MomentumStateModel:
+        """Returns the MACD / RSI state as of the last complete candle. State is persisted in the candle
+        store, hence only the candles since the previous call are folded in instead of the entire history"""
+        state_name = f'momentum_{column_name}'
+        instrument_token = InstrumentsController.get_instrument_token(tickersymbol=tickersymbol)
+        candle_store = CandleStore.get_store(instrument_token=instrument_token, granularity=granularity)
+
+        df = InstrumentsController.get_instrument_candles_df(tickersymbol=tickersymbol, granularity=granularity)
+        # Today's candle is not considered since it keeps changing till the market closes
+        df = df[df['timestamp'] < date.today().isoformat()]
+
+        state = candle_store.get_indicator_state(name=state_name)
+        state = from_dict(data_class=MomentumStateModel, data=state) if state else None
+        state = TechnicalIndicatorsController.get_momentum_state(df=df, column_name=column_name, state=state)
+
+        candle_store.set_indicator_state(name=state_name, state=asdict(state))
+
+        return state
+
+    @staticmethod
+    def get_options_chain_expiry(tickersymbol: str, on_date: date) -> date:
+        """Returns the expiry of the options chain of the instrument traded on the date i.e. the
+        closest weekly expiry for the weekly options and the monthly one after 30 days otherwise"""
+        weekly_option_instruments = set(['NIFTY'])
+
+        if tickersymbol in weekly_option_instruments:
+            return Utilities.get_next_closest_thursday(dt=on_date)
+
+        return Utilities.get_last_thursday_for_derivative(dt=on_date + timedelta(days=30))
 
     @staticmethod
     def get_options_chain(instrument: InstrumentModel, on_date: date = None) -> List[OptionModel]:
@@ -176,7 +252,6 @@ class InstrumentsController:
             'NIFTY 50': 'NIFTY'
         }
         tickersymbol = instrument_map_dict.get(instrument.tickersymbol, instrument.tickersymbol)
-        weekly_option_instruments = set(['NIFTY'])
 
         response = requests.get(
             'https://api.sensibull.com/v1/instruments/%s' % tickersymbol,
@@ -191,9 +266,7 @@ class InstrumentsController:
         if on_date:
             return HistoricalOptionalsController.get_historical_data(
                 tickersymbol=tickersymbol,
-                expiry_date=
-                    Utilities.get_next_closest_thursday(dt=on_date) if tickersymbol in weekly_option_instruments \
-                        else Utilities.get_last_thursday_for_derivative(dt=on_date + timedelta(days=30)),
+                expiry_date=InstrumentsController.get_options_chain_expiry(tickersymbol=tickersymbol, on_date=on_date),
                 from_date=on_date,
                 to_date=on_date
             )
@@ -203,16 +276,17 @@ class InstrumentsController:
     @Cache
     @staticmethod
     def enrich_instruments(instruments: List[StockOfInterest], on_date: date = None) -> List[EnrichedInstrumentModel]:
-        candles_df = pd.DataFrame()
+        candles_dfs = []
         support_resistance_dict = {}
 
+        instruments_candles_df = InstrumentsController.get_instrument_candles_bulk(
+            tickersymbols=[instrument.tickersymbol for instrument in instruments],
+            from_date=on_date - timedelta(days=365) if on_date else None,
+            to_date=on_date if on_date else None
+        )
+
         for instrument in instruments:
-            candles = InstrumentsController.get_instrument_candles(
-                tickersymbol=instrument.tickersymbol,
-                from_date=on_date - timedelta(days=365) if on_date else None,
-                to_date=on_date if on_date else None
-            )
-            instrument_candles_df = pd.DataFrame.from_dict(data=[asdict(candle) for candle in candles])
+            instrument_candles_df = instruments_candles_df[instrument.tickersymbol].copy()
 
             support_and_resistance = TechnicalIndicatorsController.get_support_and_resistance(df=instrument_candles_df)
 
@@ -222,17 +296,14 @@ class InstrumentsController:
                     'resistances': [elem[2] for elem in support_and_resistance if elem[1] == 1],
                 }
 
-            candles = [{**asdict(candle), **asdict(instrument)} for candle in candles]
-            instrument_candles_df = pd.DataFrame.from_dict(data=candles)
+            instrument_candles_df['tickersymbol'] = instrument.tickersymbol
 
-            instrument_candles_df = TechnicalIndicatorsController.add_momentum_indicators(df=instrument_candles_df, column_name='close')
+            candles_dfs.append(instrument_candles_df)
 
-            if candles_df.empty:
-                candles_df = instrument_candles_df
-
-                continue
-
-            candles_df = pd.concat([candles_df, instrument_candles_df])
+        candles_df = pd.concat(candles_dfs, ignore_index=True)
+        candles_df = TechnicalIndicatorsController.add_grouped_momentum_indicators(
+            df=candles_df, column_name='close', symbol_column_name='tickersymbol'
+        )
 
         last_buy_signal_df = TechnicalIndicatorsController.get_buy_signal(df=candles_df)
 
@@ -1,7 +1,9 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from datetime import date
 import json
+import time
 from src.cache import Cache
 from src.apps.nse.models.options import HistoricalOptionModel
 from src.apps.kite.models.base import StockOfInterest
@@ -12,6 +14,8 @@ from dacite import from_dict
 import requests
 
 from .instruments import InstrumentsController
+from ..client import KiteClient, MAX_WORKERS as KITE_MAX_WORKERS
+from .quotes import QuotesController
 from .users import UsersController
 
 from ..models import (
@@ -26,6 +30,10 @@ from src.logger import LOGGER
 OPTIONS_SELLING_TARGET = -90  # in percentage i.e. recovering the entire put amount
 OPTIONS_SELLING_STOPLOSS = 150  # in percentage i.e. only holding till 250 % drop
 
+MARGIN_MAX_RETRIES = 3
+MARGIN_RETRY_BACKOFF = 0.5  # in seconds, doubled on every retry
+MARGIN_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
 
 class OptionsController:
     @staticmethod
@@ -33,27 +41,21 @@ class OptionsController:
         if not isinstance(option, EnrichedOptionModel):
             option = from_dict(data_class=EnrichedOptionModel, data=option)
 
-        # TODO: Find a better way to get the last price. Currently we are getting
-        #       the entire option chain to get the last price of an option
-        option_chain = InstrumentsController.get_options_chain(instrument=option.instrument_data)
-
-        for option_elem in option_chain:
-            if option_elem.tradingsymbol == option.tradingsymbol:
-                return option.last_price
-
-        return None
+        return QuotesController.get_last_price(tradingsymbol=option.tradingsymbol)
 
     @staticmethod
-    def sell_option(option: EnrichedOptionModel) -> bool:
+    def sell_option(option: EnrichedOptionModel, last_price: float = None) -> bool:
         # Since the price of the option can change during the analysis,
         # following code ensures that we don't trade at a lower value than the last price
         if not isinstance(option, EnrichedOptionModel):
             option = from_dict(data_class=EnrichedOptionModel, data=option)
 
-        option_last_price = OptionsController.get_option_last_price(option=option)
+        # Following takes the last price in-case it's already fetched along with the other options
+        # being traded, it's fetched here otherwise
+        option_last_price = last_price if last_price is not None else OptionsController.get_option_last_price(option=option)
         expected_trade_price = option.last_price
 
-        if option_last_price > expected_trade_price:
+        if option_last_price is not None and option_last_price > expected_trade_price:
             LOGGER.debug(
                 'Increasing the trade price for %s. Previous price: %s, new price: %s' % (
                     option.name, expected_trade_price, option_last_price
@@ -123,20 +125,33 @@ class OptionsController:
                 'price': option.last_price
             })
 
-        for chunk in Utilities.divide_chunks(input_list=data, chunk_size=chunk_size):
-            response = requests.post(
-                'https://kite.zerodha.com/oms/margins/orders',
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'enctoken {ConfigController.get_config().kite_auth_token}'
-                },
-                data=json.dumps(chunk)
-            )
+        def get_chunk_margins(chunk: List[dict]) -> List[dict]:
+            for attempt in range(MARGIN_MAX_RETRIES + 1):
+                response = KiteClient().initialize().post(
+                    'https://kite.zerodha.com/oms/margins/orders',
+                    headers={
+                        'Content-Type': 'application/json',
+                        'Authorization': f'enctoken {ConfigController.get_config().kite_auth_token}'
+                    },
+                    data=json.dumps(chunk)
+                )
+
+                if response.status_code not in MARGIN_RETRY_STATUS_CODES or attempt == MARGIN_MAX_RETRIES:
+                    break
+
+                LOGGER.debug('Retrying margins request after response code: %d' % response.status_code)
+
+                time.sleep(MARGIN_RETRY_BACKOFF * 2 ** attempt)
 
             if response.status_code != 200:
                 raise Exception('Invalid response code found: %s, expected: 200, response: %s' % (response.status_code, response.text))
 
-            return_data += response.json()['data']
+            return response.json()['data']
+
+        # Chunks are requested concurrently, executor.map keeps the margins in the order of the options
+        with ThreadPoolExecutor(max_workers=KITE_MAX_WORKERS) as executor:
+            for chunk_margins in executor.map(get_chunk_margins, Utilities.divide_chunks(input_list=data, chunk_size=chunk_size)):
+                return_data += chunk_margins
 
         return [from_dict(data_class=OptionMarginModel, data=option_margin) for option_margin in return_data]
 
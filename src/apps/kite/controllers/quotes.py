@@ -0,0 +1,58 @@
+import time
+from typing import Dict, List
+
+from src.apps.settings.controllers import ConfigController
+import src.utilities as Utilities
+
+from ..client import KiteClient
+
+# Quotes older than following (in seconds) are fetched again
+QUOTE_TTL = 5
+# Maximum number of instruments allowed in a single LTP request
+# Ref: https://kite.trade/docs/connect/v3/market-quotes/#limits
+QUOTE_CHUNK_SIZE = 1000
+
+
+class QuotesController:
+    # Following holds the last fetched price as (fetched_at, last_price) against exchange:tradingsymbol
+    QUOTES = {}
+
+    @staticmethod
+    def get_last_prices(tradingsymbols: List[str], exchange: str = 'NFO') -> Dict[str, float]:
+        """Returns the last price of the tradingsymbols, all the quotes missing from (or stale in)
+        the cache are fetched in a single request"""
+        now = time.time()
+        instruments = ['%s:%s' % (exchange, tradingsymbol) for tradingsymbol in tradingsymbols]
+        missing_instruments = [
+            instrument for instrument in set(instruments)
+            if now - QuotesController.QUOTES.get(instrument, (0, None))[0] > QUOTE_TTL
+        ]
+
+        for chunk in Utilities.divide_chunks(input_list=sorted(missing_instruments), chunk_size=QUOTE_CHUNK_SIZE):
+            response = KiteClient().initialize().get(
+                'https://kite.zerodha.com/oms/quote/ltp',
+                headers={
+                    'Authorization': f'enctoken {ConfigController.get_config().kite_auth_token}'
+                },
+                params={
+                    'i': chunk
+                }
+            )
+
+            if response.status_code != 200:
+                raise ValueError('Unexpected response code found: %d, response: %s' % (response.status_code, response.text))
+
+            for instrument, quote in response.json()['data'].items():
+                QuotesController.QUOTES[instrument] = (now, quote['last_price'])
+
+        last_prices = {}
+
+        for tradingsymbol, instrument in zip(tradingsymbols, instruments):
+            if instrument in QuotesController.QUOTES:
+                last_prices[tradingsymbol] = QuotesController.QUOTES[instrument][1]
+
+        return last_prices
+
+    @staticmethod
+    def get_last_price(tradingsymbol: str, exchange: str = 'NFO') -> float:
+        return QuotesController.get_last_prices(tradingsymbols=[tradingsymbol], exchange=exchange).get(tradingsymbol)
@@ -1,11 +1,19 @@
+import bisect
 from datetime import datetime, timedelta
 import numpy as np
 
 import pandas as pd
 
+from ..models import MomentumStateModel, MACD_FAST_SPAN, MACD_SLOW_SPAN, MACD_SIGNAL_SPAN, RSI_PERIOD
+
 TIMESTAMP_FORMAT = '%Y-%m-%d'
 
 
+def _update_ewm(mean: float, value: float, alpha: float) -> float:
+    # Following matches pandas' ewm(adjust=False) i.e. the series starts at the first value
+    return value if mean is None else mean + alpha * (value - mean)
+
+
 class TechnicalIndicatorsController:
     @staticmethod
     def add_momentum_indicators(df: pd.DataFrame, column_name: str) -> pd.DataFrame:
@@ -30,21 +38,106 @@ class TechnicalIndicatorsController:
 
         return df
 
+    @staticmethod
+    def update_momentum_state(state: MomentumStateModel, value: float, timestamp: str = None) -> MomentumStateModel:
+        """Returns the state after adding the value of the next candle, in O(1). Indicators of the
+        state match the last row of `add_momentum_indicators` over the same series. The passed state
+        is not modified, hence the indicators of a forming candle (e.g. on every tick) can be computed
+        from the state of the last complete candle."""
+        fast_alpha = 2 / (MACD_FAST_SPAN + 1)
+        slow_alpha = 2 / (MACD_SLOW_SPAN + 1)
+        signal_alpha = 2 / (MACD_SIGNAL_SPAN + 1)
+        rsi_alpha = 1 / RSI_PERIOD
+
+        ema_fast = _update_ewm(state.ema_fast, value, fast_alpha)
+        ema_slow = _update_ewm(state.ema_slow, value, slow_alpha)
+        ema_up, ema_down = state.ema_up, state.ema_down
+
+        if state.last_value is not None:
+            delta = value - state.last_value
+
+            ema_up = _update_ewm(ema_up, max(delta, 0), rsi_alpha)
+            ema_down = _update_ewm(ema_down, max(-delta, 0), rsi_alpha)
+
+        return MomentumStateModel(
+            timestamp=timestamp,
+            count=state.count + 1,
+            last_value=value,
+            ema_fast=ema_fast,
+            ema_slow=ema_slow,
+            signal=_update_ewm(state.signal, ema_fast - ema_slow, signal_alpha),
+            ema_up=ema_up,
+            ema_down=ema_down
+        )
+
+    @staticmethod
+    def get_momentum_state(
+        df: pd.DataFrame, column_name: str, state: MomentumStateModel = None, timestamp_column_name: str = 'timestamp'
+    ) -> MomentumStateModel:
+        """Folds the candles (newer than the state's timestamp, if any) into the state"""
+        state = state or MomentumStateModel()
+
+        if state.timestamp is not None:
+            df = df[df[timestamp_column_name] > state.timestamp]
+
+        for value, timestamp in zip(df[column_name].tolist(), df[timestamp_column_name].tolist()):
+            state = TechnicalIndicatorsController.update_momentum_state(state=state, value=value, timestamp=timestamp)
+
+        return state
+
+    @staticmethod
+    def add_grouped_momentum_indicators(df: pd.DataFrame, column_name: str, symbol_column_name: str = 'tickersymbol') -> pd.DataFrame:
+        """Same as `add_momentum_indicators` for a long-format DataFrame of multiple symbols, each of the
+        indicators is computed in a single pass with the series restarting at every symbol. Expects a
+        unique index and rows sorted by time within a symbol."""
+        symbols = df[symbol_column_name]
+
+        def grouped_ewm_mean(series: pd.Series, **kwargs) -> pd.Series:
+            return series.groupby(symbols, sort=False).ewm(**kwargs).mean().reset_index(level=0, drop=True)
+
+        # Adding MACD indicators
+        exp1 = grouped_ewm_mean(df[column_name], span=12, adjust=False)
+        exp2 = grouped_ewm_mean(df[column_name], span=26, adjust=False)
+        macd = exp1 - exp2
+        signal = grouped_ewm_mean(macd, span=9, adjust=False)
+
+        df['macd'] = macd
+        df['signal'] = signal
+
+        # Adding RSI indicator
+        delta = df[column_name].groupby(symbols, sort=False).diff()
+        up = delta.clip(lower=0)
+        down = -1 * delta.clip(upper=0)
+        ema_up = grouped_ewm_mean(up, com=13, adjust=False)
+        ema_down = grouped_ewm_mean(down, com=13, adjust=False)
+        rs = ema_up / ema_down
+
+        df['rsi'] = 100 - (100 / (1 + rs))
+
+        return df
+
     @staticmethod
     def get_buy_signal(df: pd.DataFrame, symbol_column_name: str = 'tickersymbol', timestamp_column_name: str = 'timestamp') -> pd.DataFrame:
         df['buy_signal'] = 0
 
+        # Shifts are done within the symbol so that the previous symbol's last candles don't leak
+        # into the first candles of the next symbol
+        grouped_df = df.groupby(symbol_column_name, sort=False)
+        macd, signal = grouped_df['macd'], grouped_df['signal']
+
         df.loc[
-            df['macd'].shift(1).gt(df['signal'].shift(1)) &
-                df['macd'].shift(2).gt(df['signal'].shift(2)) &
-                df['macd'].shift(3).gt(df['signal'].shift(3)),
+            macd.shift(1).gt(signal.shift(1)) &
+                macd.shift(2).gt(signal.shift(2)) &
+                macd.shift(3).gt(signal.shift(3)),
             'buy_signal'
         ] = 1
 
+        buy_signal = df.groupby(symbol_column_name, sort=False)['buy_signal']
+
         df.loc[
-            df['buy_signal'].shift(1).eq(1) &
-                df['buy_signal'].shift(2).eq(1) &
-                df['buy_signal'].shift(3).eq(0),
+            buy_signal.shift(1).eq(1) &
+                buy_signal.shift(2).eq(1) &
+                buy_signal.shift(3).eq(0),
             'buy_signal'
         ] = 2
 
@@ -69,36 +162,54 @@ class TechnicalIndicatorsController:
         average_candle_size = np.mean(df[high_column_name] - df[low_column_name])
         levels = []
 
-        def is_support(df, i):
-            support = df[low_column_name][i] < df[low_column_name][i - 1] and \
-                df[low_column_name][i] < df[low_column_name][i + 1] and \
-                df[low_column_name][i + 1] < df[low_column_name][i + 2] and \
-                df[low_column_name][i - 1] < df[low_column_name][i - 2]
+        lows = df[low_column_name].to_numpy()
+        highs = df[high_column_name].to_numpy()
 
-            return support
+        # Fractal detection over the shifted arrays, index i of the following masks maps to the
+        # candle i + 2 since the first and last two candles can't be a support / resistance
+        is_support = (lows[2:-2] < lows[1:-3]) & (lows[2:-2] < lows[3:-1]) & \
+            (lows[3:-1] < lows[4:]) & (lows[1:-3] < lows[:-4])
+        is_resistance = (highs[2:-2] > highs[1:-3]) & (highs[2:-2] > highs[3:-1]) & \
+            (highs[3:-1] > highs[4:]) & (highs[1:-3] > highs[:-4])
 
-        def is_resistance(df, i):
-            resistance = df[high_column_name][i] > df[high_column_name][i - 1] and \
-                df[high_column_name][i] > df[high_column_name][i + 1] and \
-                df[high_column_name][i + 1] > df[high_column_name][i + 2] and \
-                df[high_column_name][i - 1] > df[high_column_name][i - 2]
+        # Levels found till now are kept sorted so that only the closest levels on either side
+        # need to be checked for a candidate being far from the existing levels.
+        # Note: the check has always been done against the entire (index, type, level) tuple i.e.
+        # a candidate is also discarded if it is close to the index or type of an existing level,
+        # hence the indices (appended in the sorted order already) and types are checked as well
+        sorted_levels = []
+        level_indices = []
+        level_types = set()
 
-            return resistance
+        def is_close_to_sorted(l, sorted_values):
+            position = bisect.bisect_left(sorted_values, l)
+
+            if position > 0 and abs(l - sorted_values[position - 1]) < average_candle_size:
+                return True
+
+            if position < len(sorted_values) and abs(l - sorted_values[position]) < average_candle_size:
+                return True
+
+            return False
 
         def is_far_from_level(l):
-            return np.sum([abs(l - x) < average_candle_size for x in levels]) == 0
+            return not (
+                is_close_to_sorted(l, sorted_levels) or is_close_to_sorted(l, level_indices) or
+                    any(abs(l - level_type) < average_candle_size for level_type in level_types)
+            )
 
-        for i in range(2, df.shape[0] - 2):
-            if is_support(df, i):
-                l = df[low_column_name][i]
+        for i in np.flatnonzero(is_support | is_resistance).tolist():
+            if is_support[i]:
+                level_type, l = -1, lows[i + 2]
+            else:
+                level_type, l = 1, highs[i + 2]
 
-                if is_far_from_level(l):
-                    levels.append((i, -1, l))
-            elif is_resistance(df, i):
-                l = df[high_column_name][i]
+            if is_far_from_level(l):
+                levels.append((i + 2, level_type, l))
 
-                if is_far_from_level(l):
-                    levels.append((i, 1, l))
+                bisect.insort(sorted_levels, l)
+                level_indices.append(i + 2)
+                level_types.add(level_type)
 
         def plot_all():
             import matplotlib.pyplot as plt
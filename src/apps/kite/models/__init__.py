@@ -5,4 +5,5 @@ from .instruments import *
 from .options import *
 from .orders import *
 from .positions import *
+from .technicals import *
 from .users import *
@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+# Following are the spans of the MACD EMAs and the RSI period
+MACD_FAST_SPAN = 12
+MACD_SLOW_SPAN = 26
+MACD_SIGNAL_SPAN = 9
+RSI_PERIOD = 14
+
+
+@dataclass
+class MomentumStateModel:
+    """State of the MACD and RSI EMAs after the candle of `timestamp`"""
+    timestamp: str = None
+    count: int = 0
+    last_value: float = None
+    ema_fast: float = None
+    ema_slow: float = None
+    signal: float = None
+    ema_up: float = None
+    ema_down: float = None
+
+    @property
+    def macd(self) -> float:
+        return self.ema_fast - self.ema_slow if self.count else None
+
+    @property
+    def rsi(self) -> float:
+        if self.ema_up is None:
+            return None
+
+        if self.ema_down == 0:
+            return 100.0 if self.ema_up > 0 else None
+
+        return 100 - (100 / (1 + self.ema_up / self.ema_down))
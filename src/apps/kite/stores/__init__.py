@@ -0,0 +1,2 @@
+from .candles import *
+from .instruments import *
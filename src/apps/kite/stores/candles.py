@@ -0,0 +1,224 @@
+import os
+import json
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Union
+
+import numpy as np
+
+from src.cache import CACHE_FOLDER, DISK_CACHE_TYPE
+from settings import CACHE_TYPE
+
+CANDLES_FOLDER = f'{CACHE_FOLDER}/candles'
+
+# Kite timestamps are of fixed length e.g. 2021-10-14T00:00:00+0530, hence kept as is so that
+# the range lookups are simple string comparisons and the DataFrames match the API response
+CANDLE_DTYPE = np.dtype([
+    ('timestamp', 'U24'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'i8')
+])
+
+# Maximum number of days that can be fetched in a single request for the granularity
+# Ref: https://kite.trade/docs/connect/v3/historical/
+GRANULARITY_MAX_DAYS = {
+    'minute': 60,
+    '3minute': 100,
+    '5minute': 100,
+    '10minute': 100,
+    '15minute': 200,
+    '30minute': 200,
+    '60minute': 400,
+    'day': 2000
+}
+
+
+def _to_date(value: Union[date, datetime]) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+
+    return value
+
+
+class CandleStore:
+    """Columnar store of candles for an instrument token and granularity.
+
+    Candles are kept as a structured numpy array sorted by timestamp along with the date ranges
+    which have already been fetched. Only the missing ranges are fetched from the source and the
+    rest is served from the store. With the disk cache the array is persisted as `.npy` and memory
+    mapped on load. Today is never marked as fetched since its candle keeps changing till the
+    market closes.
+    """
+    STORES = {}
+    STORES_LOCK = threading.Lock()
+
+    def __init__(self, instrument_token: Union[int, str], granularity: str):
+        self.instrument_token = instrument_token
+        self.granularity = granularity
+
+        self._location = f'{CANDLES_FOLDER}/{instrument_token}_{granularity}.npy'
+        self._meta_location = f'{CANDLES_FOLDER}/{instrument_token}_{granularity}.json'
+        self._candles = None
+        self._meta = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_store(instrument_token: Union[int, str], granularity: str) -> 'CandleStore':
+        key = (str(instrument_token), granularity)
+
+        with CandleStore.STORES_LOCK:
+            if key not in CandleStore.STORES:
+                CandleStore.STORES[key] = CandleStore(instrument_token=instrument_token, granularity=granularity)
+
+            return CandleStore.STORES[key]
+
+    def _load(self):
+        if self._candles is not None:
+            return
+
+        self._candles = np.empty(0, dtype=CANDLE_DTYPE)
+        self._meta = { 'coverage': [] }
+
+        if CACHE_TYPE != DISK_CACHE_TYPE or not os.path.exists(self._meta_location):
+            return
+
+        with open(self._meta_location, 'r') as fileop:
+            self._meta = json.loads(fileop.read())
+
+        if os.path.exists(self._location):
+            self._candles = np.load(self._location, mmap_mode='r')
+
+    def _dump(self):
+        if CACHE_TYPE != DISK_CACHE_TYPE:
+            return
+
+        if not os.path.exists(CANDLES_FOLDER):
+            os.makedirs(CANDLES_FOLDER)
+
+        # Writing to a temporary file first ensures that the readers never see a partial file
+        with open(self._location + '.tmp', 'wb') as fileop:
+            np.save(fileop, self._candles)
+
+        os.replace(self._location + '.tmp', self._location)
+
+        self._dump_meta()
+
+    def _dump_meta(self):
+        if CACHE_TYPE != DISK_CACHE_TYPE:
+            return
+
+        if not os.path.exists(CANDLES_FOLDER):
+            os.makedirs(CANDLES_FOLDER)
+
+        with open(self._meta_location, 'w+') as fileop:
+            fileop.write(json.dumps(self._meta))
+
+    def get_indicator_state(self, name: str) -> Union[dict, None]:
+        """Returns the state of the incremental indicator, which is persisted along with the candles"""
+        with self._lock:
+            self._load()
+
+            return self._meta.get('indicators', {}).get(name)
+
+    def set_indicator_state(self, name: str, state: dict):
+        with self._lock:
+            self._load()
+
+            self._meta.setdefault('indicators', {})[name] = state
+
+            self._dump_meta()
+
+    def get_coverage(self) -> List[List[date]]:
+        self._load()
+
+        return [[date.fromisoformat(start), date.fromisoformat(end)] for start, end in self._meta['coverage']]
+
+    def get_missing_ranges(self, from_date: date, to_date: date) -> List[List[date]]:
+        missing_ranges = []
+        current_date = from_date
+
+        for start, end in self.get_coverage():
+            if end < current_date:
+                continue
+
+            if start > to_date:
+                break
+
+            if start > current_date:
+                missing_ranges.append([current_date, start - timedelta(days=1)])
+
+            current_date = max(current_date, end + timedelta(days=1))
+
+        if current_date <= to_date:
+            missing_ranges.append([current_date, to_date])
+
+        max_days = GRANULARITY_MAX_DAYS.get(self.granularity, GRANULARITY_MAX_DAYS['day'])
+        chunked_ranges = []
+
+        for start, end in missing_ranges:
+            while start <= end:
+                chunk_end = min(end, start + timedelta(days=max_days - 1))
+
+                chunked_ranges.append([start, chunk_end])
+
+                start = chunk_end + timedelta(days=1)
+
+        return chunked_ranges
+
+    def _add_coverage(self, from_date: date, to_date: date):
+        # Following ensures that today's (incomplete) candle is fetched again on the next call
+        to_date = min(to_date, date.today() - timedelta(days=1))
+
+        if from_date > to_date:
+            return
+
+        ranges = sorted(self.get_coverage() + [[from_date, to_date]])
+        merged_ranges = [ranges[0]]
+
+        for start, end in ranges[1:]:
+            if start <= merged_ranges[-1][1] + timedelta(days=1):
+                merged_ranges[-1][1] = max(merged_ranges[-1][1], end)
+            else:
+                merged_ranges.append([start, end])
+
+        self._meta['coverage'] = [[start.isoformat(), end.isoformat()] for start, end in merged_ranges]
+
+    def _merge(self, rows: list):
+        if not rows:
+            return
+
+        # Kite also sends open interest as the last column when requested, which is not stored
+        new_candles = np.array([tuple(row[:len(CANDLE_DTYPE)]) for row in rows], dtype=CANDLE_DTYPE)
+        candles = np.concatenate([new_candles, self._candles])
+
+        # Since new candles come first, following keeps the latest version of a re-fetched candle
+        _, unique_indices = np.unique(candles['timestamp'], return_index=True)
+
+        self._candles = candles[unique_indices]
+
+    def get(self, from_date: Union[date, datetime], to_date: Union[date, datetime], fetcher: Callable[[date, date], list]) -> np.ndarray:
+        """Returns the candles between the dates (both inclusive), `fetcher` is called with the missing
+        date ranges and is expected to return the candle rows in the Kite historical API format"""
+        from_date, to_date = _to_date(from_date), _to_date(to_date)
+
+        with self._lock:
+            self._load()
+
+            missing_ranges = self.get_missing_ranges(from_date=from_date, to_date=to_date)
+
+            for start, end in missing_ranges:
+                self._merge(rows=fetcher(start, end))
+                self._add_coverage(from_date=start, to_date=end)
+
+            if missing_ranges:
+                self._dump()
+
+            start_index, end_index = np.searchsorted(
+                self._candles['timestamp'],
+                [from_date.isoformat(), (to_date + timedelta(days=1)).isoformat()]
+            )
+
+            return self._candles[start_index:end_index]
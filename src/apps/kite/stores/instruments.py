@@ -0,0 +1,217 @@
+import os
+import itertools
+import json
+import threading
+from datetime import date
+from typing import Dict, List, Union
+
+import numpy as np
+import requests
+
+from src.cache import CACHE_FOLDER, DISK_CACHE_TYPE
+from src.logger import LOGGER
+import src.utilities as Utilities
+from settings import CACHE_TYPE
+
+INSTRUMENTS_URL = 'https://api.kite.trade/instruments'
+INSTRUMENTS_LOCATION = f'{CACHE_FOLDER}/instruments.npz'
+# Number of rows converted to the typed arrays at once, bounds the memory used by the parsing
+INSTRUMENTS_CHUNK_SIZE = 10000
+
+# Following is the column order of the instruments dump along with the type it is stored as
+# Ref: https://kite.trade/docs/connect/v3/market-quotes/#instruments
+INSTRUMENT_COLUMNS = {
+    'instrument_token': np.int64,
+    'exchange_token': np.int64,
+    'tradingsymbol': str,
+    'name': str,
+    'last_price': np.float64,
+    'expiry': str,
+    'strike': np.float64,
+    'tick_size': np.float64,
+    'lot_size': np.int64,
+    'instrument_type': str,
+    'segment': str,
+    'exchange': str
+}
+# Following are the fields of the lookup indices, contract index only has the derivatives (with an expiry)
+INDEX_FIELDS = {
+    'tradingsymbol': ['tradingsymbol'],
+    'token': ['instrument_token'],
+    'underlying': ['name'],
+    'contract': ['name', 'expiry', 'strike']
+}
+
+
+class InstrumentStore:
+    """Instrument master of Kite kept as numpy columns along with lookup indices.
+
+    Kite publishes the instruments dump once a day, hence the store downloads it only on the first
+    access of the day. With the disk cache the columns are persisted as a compressed `.npz` file so
+    that the other processes (CLI, backtests) only load the file instead of downloading and parsing
+    the dump again. Indices (refer INDEX_FIELDS) are the rows sorted by the fields, built on their
+    first use, and every lookup is a range scan of binary searches on them. Tradingsymbol and token
+    resolve to the last matching row, underlying and (underlying, expiry, strike) to all of them.
+    """
+    _self = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._self is None:
+            cls._self = super().__new__(cls)
+
+            cls._self.fetched_on = None
+            cls._self.columns = None
+            cls._self.indices = {}
+
+        return cls._self
+
+    def initialize(self) -> 'InstrumentStore':
+        with InstrumentStore._lock:
+            if self.fetched_on == date.today():
+                return self
+
+            self._load()
+
+            if self.fetched_on != date.today():
+                self._fetch()
+                self._dump()
+
+            self.indices = {}
+
+        return self
+
+    def _load(self):
+        if CACHE_TYPE != DISK_CACHE_TYPE or not os.path.exists(INSTRUMENTS_LOCATION):
+            return
+
+        with np.load(INSTRUMENTS_LOCATION, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+
+            self.fetched_on = date.fromisoformat(meta['fetched_on'])
+            self.columns = dict((column, data[column]) for column in INSTRUMENT_COLUMNS)
+
+    def _fetch(self):
+        LOGGER.debug('Downloading the instruments dump...')
+
+        response = requests.get(INSTRUMENTS_URL, stream=True)
+
+        if response.status_code != 200:
+            raise ValueError('Unexpected response code found: %d, response: %s' % (response.status_code, response.text))
+
+        rows = Utilities.iter_csv_rows(response)
+        headers = next(rows)
+        header_indices = [headers.index(column) for column in INSTRUMENT_COLUMNS]
+        chunks = dict((column, []) for column in INSTRUMENT_COLUMNS)
+
+        # Rows are converted to the typed arrays chunk by chunk while streaming, hence only a chunk of
+        # the rows is held as the python objects along with the compact columns
+        while True:
+            chunk = list(itertools.islice(rows, INSTRUMENTS_CHUNK_SIZE))
+
+            if not chunk:
+                break
+
+            for (column, column_type), index in zip(INSTRUMENT_COLUMNS.items(), header_indices):
+                if column_type is str:
+                    chunks[column].append(np.array([row[index] for row in chunk], dtype=str))
+                else:
+                    # Empty strings are sent for the non applicable values e.g. strike of an equity
+                    chunks[column].append(np.fromiter(
+                        (float(row[index] or 0) for row in chunk), dtype=column_type, count=len(chunk)
+                    ))
+
+        response.close()
+
+        self.columns = dict(
+            (column, np.concatenate(chunks.pop(column)) if chunks[column] else np.array([], dtype=column_type))
+            for column, column_type in INSTRUMENT_COLUMNS.items()
+        )
+
+        self.fetched_on = date.today()
+
+    def _dump(self):
+        if CACHE_TYPE != DISK_CACHE_TYPE:
+            return
+
+        if not os.path.exists(CACHE_FOLDER):
+            os.makedirs(CACHE_FOLDER)
+
+        meta = json.dumps({ 'fetched_on': self.fetched_on.isoformat() })
+
+        # Writing to a temporary file first ensures that the readers never see a partial file
+        with open(INSTRUMENTS_LOCATION + '.tmp', 'wb') as fileop:
+            np.savez_compressed(fileop, meta=np.array(meta), **self.columns)
+
+        os.replace(INSTRUMENTS_LOCATION + '.tmp', INSTRUMENTS_LOCATION)
+
+    def _get_index(self, name: str) -> tuple:
+        """Returns the (rows, sorted values of the fields) of the index, sort is stable hence the rows
+        with the same values are kept in the store order"""
+        index = self.indices.get(name)
+
+        if index is None:
+            fields = INDEX_FIELDS[name]
+            rows = np.arange(len(self.columns['instrument_token']))
+
+            if name == 'contract':
+                rows = rows[self.columns['expiry'] != '']
+
+            rows = rows[np.lexsort([self.columns[field][rows] for field in reversed(fields)])]
+            index = (rows, [self.columns[field][rows] for field in fields])
+
+            self.indices[name] = index
+
+        return index
+
+    def _search(self, name: str, *values) -> np.ndarray:
+        """Returns the rows of the index matching the values of its fields"""
+        rows, sorted_values = self._get_index(name=name)
+        start, end = 0, len(rows)
+
+        for field_values, value in zip(sorted_values, values):
+            start, end = (
+                start + int(np.searchsorted(field_values[start:end], value, side='left')),
+                start + int(np.searchsorted(field_values[start:end], value, side='right'))
+            )
+
+        return rows[start:end]
+
+    def _search_last(self, name: str, *values) -> Union[int, None]:
+        rows = self._search(name, *values)
+
+        return int(rows[-1]) if len(rows) else None
+
+    def _get_row(self, row: int) -> dict:
+        return dict((column, values[row].item()) for column, values in self.columns.items())
+
+    def get_token_dict(self) -> Dict[str, str]:
+        """Returns tradingsymbol to instrument token (as string) mapping of all the instruments"""
+        return dict((tradingsymbol, str(token)) for tradingsymbol, token in zip(
+            self.columns['tradingsymbol'].tolist(), self.columns['instrument_token'].tolist()
+        ))
+
+    def get_token(self, tradingsymbol: str) -> Union[int, None]:
+        row = self._search_last('tradingsymbol', tradingsymbol)
+
+        return None if row is None else int(self.columns['instrument_token'][row])
+
+    def get_by_tradingsymbol(self, tradingsymbol: str) -> Union[dict, None]:
+        row = self._search_last('tradingsymbol', tradingsymbol)
+
+        return None if row is None else self._get_row(row)
+
+    def get_by_token(self, instrument_token: Union[int, str]) -> Union[dict, None]:
+        row = self._search_last('token', int(instrument_token))
+
+        return None if row is None else self._get_row(row)
+
+    def get_by_underlying(self, underlying: str) -> List[dict]:
+        return [self._get_row(row) for row in self._search('underlying', underlying)]
+
+    def get_contracts(self, underlying: str, expiry: Union[date, str], strike: float) -> List[dict]:
+        """Returns the derivative contracts (futures & options) of the underlying for the expiry and strike"""
+        if isinstance(expiry, date):
+            expiry = expiry.isoformat()
+
+        return [self._get_row(row) for row in self._search('contract', underlying, expiry, float(strike))]
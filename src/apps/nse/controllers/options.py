@@ -1,20 +1,140 @@
-from typing import List
-from datetime import date, timedelta
+import io
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from html import unescape
+from typing import Dict, List, Union
+from datetime import date, datetime, timedelta
 
+import numpy as np
+import pandas as pd
 import requests
-from bs4 import BeautifulSoup
 from dacite import from_dict
 
 from src.cache import Cache
-from src.apps.nse.models.options import HistoricalOptionModel
+from src.apps.nse.models.options import HistoricalDataRequestModel, HistoricalOptionModel, OPTIONS_EXPIRY_DATETIME_FORMAT
+from src.apps.nse.stores import OptionsStore
+from src.ratelimit import TokenBucket
 
 EXPIRY_DATE_FORMAT = '%d-%m-%Y'
 FROM_TO_DATE_FORMAT = '%d-%m-%Y'
 
 FLOAT_FIELDS = set(['strike_price', 'open', 'high', 'low', 'close', 'ltp', 'settle_price', 'open_int'])
+# Following are kept as strings in the HistoricalOptionModel but are numeric in the DataFrames
+NUMERIC_FIELDS = set(['no_of_contracts', 'turnover_in_lacs', 'premium_turnover_in_lacs', 'change_in_oi', 'underlying_value'])
+DATE_FIELDS = ['date', 'expiry']
+# Following is the placeholder of the missing values in the historical data of NSE
+MISSING_VALUE = '-'
+
+# Historical data page has the CSV content of the table, with ':' separated rows, in the following div
+CSV_CONTENT_PATTERN = re.compile(r'<div[^>]*\bid=["\']?csvContentDiv["\']?[^>]*>(.*?)</div>', re.DOTALL | re.IGNORECASE)
+
+# Following keeps the scraping polite, NSE blocks the clients sending too many requests
+NSE_RATE_LIMITER = TokenBucket(rate=2, capacity=2)
+NSE_MAX_WORKERS = 4
+
+INSTRUMENT_TYPE_MAP = {
+    'BANKNIFTY': 'OPTIDX',
+    'NIFTY': 'OPTIDX',
+    'default': 'OPTSTK'
+}
+
+
+def extract_csv_content(html: str) -> Union[str, None]:
+    """Returns the CSV content of the historical data page, None in-case the page has no data"""
+    match = CSV_CONTENT_PATTERN.search(html)
+
+    return None if match is None else unescape(match.group(1))
+
+
+def _to_numeric(values: pd.Series) -> pd.Series:
+    """Converts the scraped values (with thousands separators) to floats, missing values (refer
+    MISSING_VALUE) are NaN and any other non numeric value raises ValueError"""
+    values = values.str.replace(',', '', regex=False).str.strip()
+
+    return pd.to_numeric(values.mask(values == MISSING_VALUE), errors='raise').astype(float)
+
+
+def parse_csv_content(csv_content: str) -> pd.DataFrame:
+    """Parses the CSV content of the historical data page to columns in a single pass of the pandas
+    CSV parser, the float fields are numeric and the rest are kept as strings"""
+    df = pd.read_csv(io.StringIO(csv_content.replace(':', '\n')), dtype=str, keep_default_na=False, skipinitialspace=True)
+
+    # Same normalization as the one of the columns of the HistoricalOptionModel
+    df.columns = [column.lower().strip().replace(' ', '_').replace('.', '') for column in df.columns]
+
+    for field in FLOAT_FIELDS.intersection(df.columns):
+        df[field] = _to_numeric(values=df[field])
+
+    return df
+
+
+def _to_str(value: float) -> str:
+    # Following matches the values of the scraped data, where the non float fields are kept as is
+    if np.isnan(value):
+        return '-'
+
+    return str(int(value)) if value.is_integer() else str(value)
 
 
 class OptionsController:
+    @staticmethod
+    def _get_historical_data_page(tickersymbol: str, expiry_date: date, strike_price: float, option_type: str, from_date: date, to_date: date) -> Union[str, None]:
+        url = 'https://www1.nseindia.com/products/dynaContent/common/productsSymbolMapping.jsp?instrumentType=%(instrument_type)s&symbol=%(tickersymbol)s&expiryDate=%(expiry_date)s&optionType=%(option_type)s&strikePrice=%(strike_price)s&dateRange=&fromDate=%(from_date)s&toDate=%(to_date)s&segmentLink=9&symbolCount=' % {
+            'instrument_type': INSTRUMENT_TYPE_MAP.get(tickersymbol, INSTRUMENT_TYPE_MAP['default']),
+            'tickersymbol': tickersymbol,
+            'option_type': option_type,
+            'strike_price': str(strike_price),
+            'expiry_date': expiry_date.strftime(EXPIRY_DATE_FORMAT),
+            'from_date': from_date.strftime(FROM_TO_DATE_FORMAT),
+            'to_date': to_date.strftime(FROM_TO_DATE_FORMAT)
+        }
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/93.0.4577.82 Safari/537.36',
+            'Referer': 'https://www1.nseindia.com/products/content/derivatives/equities/historical_fo.htm'
+        }
+
+        NSE_RATE_LIMITER.acquire()
+
+        response = requests.get(url, headers=headers)
+
+        if response.status_code != 200:
+            raise ValueError('Unexpected response code found: %d, response: %s' % (response.status_code, response.text))
+
+        return extract_csv_content(html=response.text)
+
+    @staticmethod
+    def get_stored_historical_data(tickersymbol: str, expiry_date: date, strike_price: float = '', option_types: str = ['PE', 'CE'], from_date: date = None, to_date: date = None) -> List[HistoricalOptionModel]:
+        """Returns the historical data from the ingested bhavcopies (refer OptionsStore)"""
+        rows = OptionsStore().get(
+            symbol=tickersymbol,
+            expiry_date=expiry_date,
+            option_types=option_types,
+            strike_price=strike_price,
+            from_date=from_date,
+            to_date=to_date
+        )
+
+        data = []
+
+        for row in rows.tolist():
+            content = dict(zip(rows.dtype.names, row))
+
+            for key, value in content.items():
+                if isinstance(value, date):
+                    content[key] = value.strftime(OPTIONS_EXPIRY_DATETIME_FORMAT)
+                elif isinstance(value, float) and key not in FLOAT_FIELDS:
+                    content[key] = _to_str(value)
+
+            content['symbol'] = tickersymbol
+            content['instrument_type'] = content['option_type']
+            content['underlying_instrument'] = tickersymbol
+
+            data.append(from_dict(data_class=HistoricalOptionModel, data=content))
+
+        return data
+
     # @Cache
     @staticmethod
     def get_historical_data(tickersymbol: str, expiry_date: date, strike_price: float = '', option_types: str = ['PE', 'CE'], from_date: date = None, to_date: date = None) -> List[HistoricalOptionModel]:
@@ -24,58 +144,170 @@ class OptionsController:
         if not to_date:
             to_date = expiry_date
 
+        # Ingested bhavcopies are used whenever they cover the range, NSE is scraped otherwise
+        if OptionsStore().covers(from_date=from_date, to_date=to_date):
+            return OptionsController.get_stored_historical_data(
+                tickersymbol=tickersymbol,
+                expiry_date=expiry_date,
+                strike_price=strike_price,
+                option_types=option_types,
+                from_date=from_date,
+                to_date=to_date
+            )
+
         data = []
-        instrument_type_map = {
-            'BANKNIFTY': 'OPTIDX',
-            'NIFTY': 'OPTIDX',
-            'default': 'OPTSTK'
-        }
 
         for option_type in option_types:
-            url = 'https://www1.nseindia.com/products/dynaContent/common/productsSymbolMapping.jsp?instrumentType=%(instrument_type)s&symbol=%(tickersymbol)s&expiryDate=%(expiry_date)s&optionType=%(option_type)s&strikePrice=%(strike_price)s&dateRange=&fromDate=%(from_date)s&toDate=%(to_date)s&segmentLink=9&symbolCount=' % {
-                'instrument_type': instrument_type_map.get(tickersymbol, instrument_type_map['default']),
-                'tickersymbol': tickersymbol,
-                'option_type': option_type,
-                'strike_price': str(strike_price),
-                'expiry_date': expiry_date.strftime(EXPIRY_DATE_FORMAT),
-                'from_date': from_date.strftime(FROM_TO_DATE_FORMAT),
-                'to_date': to_date.strftime(FROM_TO_DATE_FORMAT)
-            }
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/93.0.4577.82 Safari/537.36',
-                'Referer': 'https://www1.nseindia.com/products/content/derivatives/equities/historical_fo.htm'
-            }
+            csv_content = OptionsController._get_historical_data_page(
+                tickersymbol=tickersymbol,
+                expiry_date=expiry_date,
+                strike_price=strike_price,
+                option_type=option_type,
+                from_date=from_date,
+                to_date=to_date
+            )
+
+            if not csv_content:
+                continue
+
+            df = parse_csv_content(csv_content=csv_content)
+
+            df['instrument_type'] = option_type
+            df['underlying_instrument'] = tickersymbol
+
+            data += [from_dict(data_class=HistoricalOptionModel, data=content) for content in df.to_dict('records')]
+
+        return data
+
+    @staticmethod
+    def get_historical_data_df(tickersymbol: str, expiry_date: date, strike_price: float = '', option_types: str = ['PE', 'CE'], from_date: date = None, to_date: date = None) -> pd.DataFrame:
+        """DataFrame variant of `get_historical_data`, which skips the per row models. Dates are parsed
+        as datetimes and the numeric values as floats (NaN in-case of missing values)"""
+        if not from_date:
+            from_date = expiry_date - timedelta(days=7)
+
+        if not to_date:
+            to_date = expiry_date
+
+        if OptionsStore().covers(from_date=from_date, to_date=to_date):
+            df = pd.DataFrame(OptionsStore().get(
+                symbol=tickersymbol,
+                expiry_date=expiry_date,
+                option_types=option_types,
+                strike_price=strike_price,
+                from_date=from_date,
+                to_date=to_date
+            ))
 
-            response = requests.get(url, headers=headers)
+            df['symbol'] = tickersymbol
+            df['instrument_type'] = df['option_type']
+            df['underlying_instrument'] = tickersymbol
 
-            if response.status_code != 200:
-                raise ValueError('Unexpected response code found: %d, response: %s' % (response.status_code, response.text))
+            return df
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+        dfs = []
 
-            csv_content = soup.find('div', {'id': 'csvContentDiv'})
+        for option_type in option_types:
+            csv_content = OptionsController._get_historical_data_page(
+                tickersymbol=tickersymbol,
+                expiry_date=expiry_date,
+                strike_price=strike_price,
+                option_type=option_type,
+                from_date=from_date,
+                to_date=to_date
+            )
 
             if not csv_content:
                 continue
 
-            csv_content = csv_content.get_text()
-            lines = csv_content.split(':')
+            df = parse_csv_content(csv_content=csv_content)
 
-            headers = lines[0].lower().strip() \
-                .replace('"', '').replace(' ', '_').replace('.', '') \
-                .split(',')
+            df['instrument_type'] = option_type
+            df['underlying_instrument'] = tickersymbol
 
-            for line in lines[1:]:
-                if not line:
-                    continue
+            dfs.append(df)
 
-                content = line.strip().replace('"', '').split(',')
-                content = dict(zip(headers, content))
+        if not dfs:
+            return pd.DataFrame()
 
-                content = dict((k, float(v) if k in FLOAT_FIELDS else v) for k, v in content.items())
-                content['instrument_type'] = option_type
-                content['underlying_instrument'] = tickersymbol
+        df = pd.concat(dfs, ignore_index=True)
 
-                data.append(from_dict(data_class=HistoricalOptionModel, data=content))
+        for field in DATE_FIELDS:
+            df[field] = pd.to_datetime(df[field], format=OPTIONS_EXPIRY_DATETIME_FORMAT)
 
-        return data
+        for field in NUMERIC_FIELDS.intersection(df.columns):
+            df[field] = _to_numeric(values=df[field])
+
+        return df
+
+    @staticmethod
+    def get_historical_data_bulk(data_requests: List[HistoricalDataRequestModel]) -> Dict[HistoricalDataRequestModel, List[HistoricalOptionModel]]:
+        """Fetches the historical data of the requests in a single concurrent phase, returns the data
+        keyed by the request.
+
+        Overlapping (and adjacent) date ranges of the requests of the same option are merged and
+        fetched once, the requests to NSE are rate limited by NSE_RATE_LIMITER. Every request gets its
+        own (shallow) copies of the options, hence enriching the options of a request in place doesn't
+        affect the other requests.
+        """
+        get_option_key = lambda request: (request.tickersymbol, request.expiry_date, request.option_type, request.strike_price)
+        option_ranges = defaultdict(list)
+
+        for request in set(data_requests):
+            option_ranges[get_option_key(request)].append([request.from_date, request.to_date])
+
+        fetch_requests = []
+
+        for (tickersymbol, expiry_date, option_type, strike_price), ranges in option_ranges.items():
+            ranges = sorted(ranges)
+            merged_ranges = [ranges[0]]
+
+            for from_date, to_date in ranges[1:]:
+                if from_date <= merged_ranges[-1][1] + timedelta(days=1):
+                    merged_ranges[-1][1] = max(merged_ranges[-1][1], to_date)
+                else:
+                    merged_ranges.append([from_date, to_date])
+
+            fetch_requests += [
+                HistoricalDataRequestModel(
+                    tickersymbol=tickersymbol,
+                    expiry_date=expiry_date,
+                    option_type=option_type,
+                    from_date=from_date,
+                    to_date=to_date,
+                    strike_price=strike_price
+                )
+                for from_date, to_date in merged_ranges
+            ]
+
+        with ThreadPoolExecutor(max_workers=NSE_MAX_WORKERS) as executor:
+            fetched_data = list(executor.map(
+                lambda request: OptionsController.get_historical_data(
+                    tickersymbol=request.tickersymbol,
+                    expiry_date=request.expiry_date,
+                    strike_price=request.strike_price,
+                    option_types=[request.option_type],
+                    from_date=request.from_date,
+                    to_date=request.to_date
+                ),
+                fetch_requests
+            ))
+
+        # Following keeps the (date, option) of the fetched options against the option
+        dated_options = defaultdict(list)
+
+        for fetch_request, options in zip(fetch_requests, fetched_data):
+            dated_options[get_option_key(fetch_request)] += [
+                (datetime.strptime(option.date, OPTIONS_EXPIRY_DATETIME_FORMAT).date(), option) for option in options
+            ]
+
+        return dict(
+            (
+                request,
+                [
+                    replace(option) for option_date, option in dated_options[get_option_key(request)]
+                    if request.from_date <= option_date <= request.to_date
+                ]
+            )
+            for request in data_requests
+        )
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import date, datetime
 from src.apps.kite.models.orders import OrderModel
 from src.apps.kite.models.positions import PositionModel
 from src.apps.kite.models.instruments import EnrichedInstrumentModel, InstrumentModel
@@ -16,6 +16,17 @@ class DefaultVal:
     val: Any
 
 
+@dataclass(frozen=True)
+class HistoricalDataRequestModel:
+    """Request of the historical data of the options of a type, hashable so that the results can be keyed by it"""
+    tickersymbol: str
+    expiry_date: date
+    option_type: str
+    from_date: date
+    to_date: date
+    strike_price: Union[float, str] = ''
+
+
 @dataclass
 class HistoricalOptionMarginModel:
     total: float
@@ -0,0 +1 @@
+from .options import *
@@ -0,0 +1,347 @@
+import os
+import bisect
+import csv
+import io
+import json
+import threading
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from src.cache import CACHE_FOLDER
+from src.logger import LOGGER
+
+OPTIONS_FOLDER = f'{CACHE_FOLDER}/nse-options'
+OPTIONS_META_LOCATION = f'{OPTIONS_FOLDER}/meta.json'
+
+# Rows are sorted by (expiry, option_type, strike_price, date) i.e. the leading fields of the dtype,
+# hence every lookup is a range scan of binary searches on the sorted fields
+OPTION_DTYPE = np.dtype([
+    ('expiry', 'M8[D]'),
+    ('option_type', 'U2'),
+    ('strike_price', 'f8'),
+    ('date', 'M8[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('ltp', 'f8'),
+    ('settle_price', 'f8'),
+    ('no_of_contracts', 'f8'),
+    ('turnover_in_lacs', 'f8'),
+    ('premium_turnover_in_lacs', 'f8'),
+    ('open_int', 'f8'),
+    ('change_in_oi', 'f8'),
+    ('underlying_value', 'f8')
+])
+OPTION_KEY_FIELDS = ['expiry', 'option_type', 'strike_price', 'date']
+OPTION_TYPES = set(['CE', 'PE'])
+
+# Following maps the store columns to the (normalized) columns of the F&O bhavcopy i.e.
+# fo<DDMMMYYYY>bhav.csv as well as the contract-wise historical data export of NSE, missing
+# numeric values are stored as NaN
+BHAVCOPY_COLUMNS = {
+    'symbol': ['symbol'],
+    'expiry': ['expiry', 'expiry_dt'],
+    'option_type': ['option_type', 'option_typ'],
+    'strike_price': ['strike_price', 'strike_pr'],
+    'date': ['date', 'timestamp'],
+    'open': ['open'],
+    'high': ['high'],
+    'low': ['low'],
+    'close': ['close'],
+    'ltp': ['ltp', 'close'],
+    'settle_price': ['settle_price', 'settle_pr'],
+    'no_of_contracts': ['no_of_contracts', 'contracts'],
+    'turnover_in_lacs': ['turnover_in_lacs', 'val_inlakh'],
+    'premium_turnover_in_lacs': ['premium_turnover_in_lacs'],
+    'open_int': ['open_int'],
+    'change_in_oi': ['change_in_oi', 'chg_in_oi'],
+    'underlying_value': ['underlying_value']
+}
+BHAVCOPY_DATE_FORMATS = ['%d-%b-%Y', '%Y-%m-%d']
+# Following column is only found in the bhavcopy, which tells it apart from the contract-wise export
+# i.e. a file with just a few of the contracts traded on its dates
+BHAVCOPY_INSTRUMENT_COLUMN = 'instrument'
+# Number of files parsed before merging them into the store, bounds the memory used by the ingestion
+BHAVCOPY_BATCH_SIZE = 50
+# Following is the longest gap between the consecutive trading days i.e. a weekend along with the
+# holidays around it, a longer gap between the ingested dates is taken as a missing bhavcopy
+MAX_TRADING_DAYS_GAP = timedelta(days=5)
+
+
+def _normalize_header(header: str) -> str:
+    # Same normalization as the one of the scraped historical data
+    return header.lower().strip().replace('"', '').replace(' ', '_').replace('.', '')
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return np.nan
+
+
+def _iter_bhavcopy_files(folder: str) -> Iterator[tuple]:
+    """Yields the (name, text) of the CSV files in the folder, zipped bhavcopies are read as is"""
+    for name in sorted(os.listdir(folder)):
+        location = os.path.join(folder, name)
+
+        if name.lower().endswith('.csv'):
+            with open(location, 'r', encoding='utf-8-sig') as fileop:
+                yield name, fileop.read()
+        elif name.lower().endswith('.zip'):
+            with zipfile.ZipFile(location) as zip_file:
+                for member in zip_file.namelist():
+                    if member.lower().endswith('.csv'):
+                        yield member, zip_file.read(member).decode('utf-8-sig')
+
+
+class OptionsStore:
+    """Historical end of day data of the NSE options, ingested from the F&O bhavcopies.
+
+    Rows are kept per underlying symbol as a structured numpy array (OPTION_DTYPE) sorted by
+    (expiry, option_type, strike_price, date) and persisted as `.npy`, which is memory mapped on
+    load. Since a bhavcopy has all the contracts traded on the day, the dates of the ingested bhavcopies
+    are tracked across the symbols and a range is answered from the store only if it's covered by them.
+    Contract-wise exports are stored as well but don't count towards the coverage. Unlike the
+    cache, the store is always persisted to the disk as it's explicitly ingested.
+    """
+    _self = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._self is None:
+            cls._self = super().__new__(cls)
+
+            cls._self.meta = None
+            cls._self.symbols = {}
+
+        return cls._self
+
+    def initialize(self) -> 'OptionsStore':
+        with OptionsStore._lock:
+            if self.meta is not None:
+                return self
+
+            self.meta = { 'dates': [] }
+
+            if os.path.exists(OPTIONS_META_LOCATION):
+                with open(OPTIONS_META_LOCATION, 'r') as fileop:
+                    self.meta = json.loads(fileop.read())
+
+        return self
+
+    def _get_location(self, symbol: str) -> str:
+        return f'{OPTIONS_FOLDER}/{symbol}.npy'
+
+    def _get_options(self, symbol: str) -> np.ndarray:
+        options = self.symbols.get(symbol)
+
+        if options is None:
+            location = self._get_location(symbol=symbol)
+            options = np.load(location, mmap_mode='r') if os.path.exists(location) else np.empty(0, dtype=OPTION_DTYPE)
+
+            self.symbols[symbol] = options
+
+        return options
+
+    def _dump(self, symbols: List[str]):
+        if not os.path.exists(OPTIONS_FOLDER):
+            os.makedirs(OPTIONS_FOLDER)
+
+        # Writing to a temporary file first ensures that the readers never see a partial file
+        for symbol in symbols:
+            location = self._get_location(symbol=symbol)
+
+            with open(location + '.tmp', 'wb') as fileop:
+                np.save(fileop, self.symbols[symbol])
+
+            os.replace(location + '.tmp', location)
+
+        with open(OPTIONS_META_LOCATION + '.tmp', 'w+') as fileop:
+            fileop.write(json.dumps(self.meta))
+
+        os.replace(OPTIONS_META_LOCATION + '.tmp', OPTIONS_META_LOCATION)
+
+    def _merge(self, symbol: str, new_options: np.ndarray):
+        options = np.concatenate([self._get_options(symbol=symbol), new_options])
+
+        # Sort is stable and the new rows come last, hence the latest version of a re-ingested row is kept
+        options = options[np.lexsort([options[field] for field in reversed(OPTION_KEY_FIELDS)])]
+
+        if len(options) > 1:
+            is_duplicate = np.ones(len(options) - 1, dtype=bool)
+
+            for field in OPTION_KEY_FIELDS:
+                is_duplicate &= options[field][1:] == options[field][:-1]
+
+            options = options[np.append(~is_duplicate, True)]
+
+        self.symbols[symbol] = options
+
+    def _parse(self, text: str, parsed_dates: Dict[str, np.datetime64]) -> Tuple[Dict[str, list], bool]:
+        """Returns the option rows of the file grouped by symbol (rows of the futures are skipped) and
+        whether the file is a bhavcopy (refer BHAVCOPY_INSTRUMENT_COLUMN)"""
+        rows = csv.reader(io.StringIO(text))
+        headers = [_normalize_header(header) for header in next(rows)]
+        header_indices = {}
+
+        for column, aliases in BHAVCOPY_COLUMNS.items():
+            header_indices[column] = next((headers.index(alias) for alias in aliases if alias in headers), None)
+
+        for column in OPTION_KEY_FIELDS + ['symbol']:
+            if header_indices[column] is None:
+                raise ValueError('Unexpected bhavcopy format, column not found: %s' % column)
+
+        def parse_date(value: str) -> np.datetime64:
+            # Dates repeat across the rows, hence parsed once
+            if value not in parsed_dates:
+                for date_format in BHAVCOPY_DATE_FORMATS:
+                    try:
+                        parsed_dates[value] = np.datetime64(datetime.strptime(value.strip().title(), date_format).date(), 'D')
+
+                        break
+                    except ValueError:
+                        continue
+                else:
+                    raise ValueError('Unexpected date found: %s' % value)
+
+            return parsed_dates[value]
+
+        symbol_rows = {}
+        value_columns = OPTION_DTYPE.names[len(OPTION_KEY_FIELDS):]
+
+        for row in rows:
+            if not row:
+                continue
+
+            option_type = row[header_indices['option_type']].strip()
+
+            if option_type not in OPTION_TYPES:
+                continue
+
+            symbol_rows.setdefault(row[header_indices['symbol']].strip(), []).append((
+                parse_date(row[header_indices['expiry']]),
+                option_type,
+                _to_float(row[header_indices['strike_price']]),
+                parse_date(row[header_indices['date']]),
+                *(
+                    np.nan if header_indices[column] is None else _to_float(row[header_indices[column]])
+                    for column in value_columns
+                )
+            ))
+
+        return symbol_rows, BHAVCOPY_INSTRUMENT_COLUMN in headers
+
+    def ingest(self, folder: str) -> dict:
+        """Ingests the bhavcopy (or contract-wise export) CSV and zipped CSV files of the folder, rows of
+        a re-ingested file are updated"""
+        self.initialize()
+
+        stats = { 'files': 0, 'bhavcopies': 0, 'rows': 0 }
+        dates = set(self.meta['dates'])
+        parsed_dates = {}
+        batch = {}
+
+        def merge_batch():
+            for symbol, symbol_rows in batch.items():
+                self._merge(symbol=symbol, new_options=np.array(symbol_rows, dtype=OPTION_DTYPE))
+
+            self.meta['dates'] = sorted(dates)
+
+            self._dump(symbols=list(batch.keys()))
+
+            batch.clear()
+
+        with OptionsStore._lock:
+            for name, text in _iter_bhavcopy_files(folder=folder):
+                LOGGER.debug('Ingesting %s...' % name)
+
+                symbol_rows_map, is_bhavcopy = self._parse(text=text, parsed_dates=parsed_dates)
+
+                for symbol, symbol_rows in symbol_rows_map.items():
+                    batch.setdefault(symbol, []).extend(symbol_rows)
+
+                    # Following ensures that the dates are covered only by the files with all the contracts
+                    if is_bhavcopy:
+                        dates.update(str(row[3]) for row in symbol_rows)
+
+                    stats['rows'] += len(symbol_rows)
+
+                stats['files'] += 1
+                stats['bhavcopies'] += int(is_bhavcopy)
+
+                if stats['files'] % BHAVCOPY_BATCH_SIZE == 0:
+                    merge_batch()
+
+            if batch:
+                merge_batch()
+
+        return stats
+
+    def covers(self, from_date: date, to_date: date) -> bool:
+        """Whether the range is covered by the ingested bhavcopies i.e. the bhavcopies of both the dates
+        are ingested and no bhavcopy seems to be missing between them (refer MAX_TRADING_DAYS_GAP)"""
+        self.initialize()
+
+        dates = self.meta['dates']
+        start = bisect.bisect_left(dates, from_date.isoformat())
+        end = bisect.bisect_right(dates, to_date.isoformat())
+
+        if end <= start or dates[start] != from_date.isoformat() or dates[end - 1] != to_date.isoformat():
+            return False
+
+        ingested_dates = [date.fromisoformat(ingested_date) for ingested_date in dates[start:end]]
+
+        return all(
+            next_date - ingested_date <= MAX_TRADING_DAYS_GAP
+            for ingested_date, next_date in zip(ingested_dates, ingested_dates[1:])
+        )
+
+    def get(self, symbol: str, expiry_date: date, option_types: List[str], strike_price: Union[float, str] = '',
+            from_date: date = None, to_date: date = None) -> np.ndarray:
+        """Returns the rows of the options of the expiry (optionally of the strike) traded between the dates"""
+        self.initialize()
+
+        with OptionsStore._lock:
+            options = self._get_options(symbol=symbol)
+
+        def narrow(start: int, end: int, field: str, low, high) -> tuple:
+            values = options[field][start:end]
+
+            return (
+                start + int(np.searchsorted(values, low, side='left')),
+                start + int(np.searchsorted(values, high, side='right'))
+            )
+
+        expiry_date = np.datetime64(expiry_date, 'D')
+        from_date = np.datetime64(from_date, 'D') if from_date else np.datetime64('NaT')
+        to_date = np.datetime64(to_date, 'D') if to_date else np.datetime64('NaT')
+
+        expiry_start, expiry_end = narrow(0, len(options), 'expiry', expiry_date, expiry_date)
+        selections = []
+
+        for option_type in option_types:
+            start, end = narrow(expiry_start, expiry_end, 'option_type', option_type, option_type)
+
+            if strike_price != '' and strike_price is not None:
+                start, end = narrow(start, end, 'strike_price', float(strike_price), float(strike_price))
+
+                # Dates are sorted within a strike, hence the date range is a range scan as well
+                if not np.isnat(from_date) and not np.isnat(to_date):
+                    start, end = narrow(start, end, 'date', from_date, to_date)
+
+            selection = options[start:end]
+
+            if not np.isnat(from_date):
+                selection = selection[selection['date'] >= from_date]
+
+            if not np.isnat(to_date):
+                selection = selection[selection['date'] <= to_date]
+
+            selections.append(selection)
+
+        return np.concatenate(selections) if selections else np.empty(0, dtype=OPTION_DTYPE)
@@ -1,4 +1,5 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 
 from datetime import date, timedelta
@@ -8,6 +9,7 @@ import pandas as pd
 from dacite import from_dict
 from src.apps.settings.controllers import ConfigController
 from src.logger import LOGGER
+from src.ratelimit import TokenBucket
 from src.apps.kite.controllers import TechnicalIndicatorsController
 
 from ..models import CandleModel, SymbolModel, SymbolBaseModel, EnrichedSymbolModel
@@ -15,6 +17,10 @@ from ..client import QuestradeClient
 
 Q = QuestradeClient().initialize()
 
+# Following is documented here: https://www.questrade.com/api/documentation/rate-limiting
+MARKET_DATA_RATE_LIMITER = TokenBucket(rate=20, capacity=20)
+MAX_WORKERS = 8
+
 
 class SymbolsController:
     @staticmethod
@@ -72,18 +78,24 @@ class SymbolsController:
 
     @staticmethod
     def enrich_symbols(symbols: List[SymbolModel]) -> List[EnrichedSymbolModel]:
-        candles_df = pd.DataFrame()
+        candles_dfs = []
         support_resistance_dict = {}
         today = date.today()
 
-        for symbol in symbols:
-            candles = SymbolsController.get_candles(
+        def get_candles(symbol: SymbolModel) -> List[CandleModel]:
+            MARKET_DATA_RATE_LIMITER.acquire()
+
+            return SymbolsController.get_candles(
                 symbol_id=symbol.symbolId,
                 start=(today - timedelta(days=365)),
                 end=today,
                 interval='OneDay'
             )
 
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            symbols_candles = list(executor.map(get_candles, symbols))
+
+        for symbol, candles in zip(symbols, symbols_candles):
             symbol_candles_df = pd.DataFrame.from_dict(data=[asdict(candle) for candle in candles])
 
             support_and_resistance = TechnicalIndicatorsController.get_support_and_resistance(
@@ -101,16 +113,12 @@ class SymbolsController:
                 }
 
             candles = [{**asdict(candle), **asdict(symbol)} for candle in candles]
-            symbol_candles_df = pd.DataFrame.from_dict(data=candles)
-
-            symbol_candles_df = TechnicalIndicatorsController.add_momentum_indicators(df=symbol_candles_df, column_name='close')
+            candles_dfs.append(pd.DataFrame.from_dict(data=candles))
 
-            if candles_df.empty:
-                candles_df = symbol_candles_df
-
-                continue
-
-            candles_df = pd.concat([candles_df, symbol_candles_df])
+        candles_df = pd.concat(candles_dfs, ignore_index=True)
+        candles_df = TechnicalIndicatorsController.add_grouped_momentum_indicators(
+            df=candles_df, column_name='close', symbol_column_name='symbol'
+        )
 
         last_buy_signal_df = TechnicalIndicatorsController.get_buy_signal(
             df=candles_df, symbol_column_name='symbol', timestamp_column_name='start'
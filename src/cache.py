@@ -1,17 +1,26 @@
 import os
 import json
+import time
+import hashlib
+import inspect
+from collections import OrderedDict
+from datetime import date, datetime
 from dataclasses import asdict, is_dataclass
 
 from typing import List
 
 from dacite import from_dict
 
+from src.logger import LOGGER
 from src.apps.nse.models.options import HistoricalOptionModel
 from src.apps.kite.models.instruments import CandleModel, EnrichedInstrumentModel, InstrumentModel
-from settings import CACHE_TYPE
+from settings import CACHE_TYPE, CACHE_MEMORY_BUDGET
 
 CACHE_FOLDER = './.trader-cache'
 DISK_CACHE_TYPE = 'disk'
+# Following is part of the names of the log and index files, hence needs to be bumped along with
+# any change of their line format so that the logs of the older format are migrated (refer DiskStore)
+CACHE_LOG_VERSION = 2
 
 # Following is a patch due to the limitations of python getargspec with annotations
 FUNCTION_MODAL_MAP = {
@@ -22,55 +31,343 @@ FUNCTION_MODAL_MAP = {
     'get_instrument_price_details': CandleModel
 }
 
+# Time to live (in seconds) of the cached entries, None depicts that the entry never expires
+# since the historical data does not change once the day is over
+FUNCTION_TTL_MAP = {
+    'get_historical_data': None,
+    'get_instrument': 24 * 60 * 60,
+    'enrich_instruments': None,
+    'enrich_options': None,
+    'get_instrument_price_details': None
+}
+
+
+def _canonicalize(value):
+    """Converts the argument value to a JSON serializable structure which is stable across runs"""
+    if is_dataclass(value):
+        return _canonicalize(asdict(value))
+
+    if isinstance(value, dict):
+        return dict((str(k), _canonicalize(v)) for k, v in value.items())
+
+    if isinstance(value, (list, tuple, set)):
+        return [_canonicalize(elem) for elem in value]
+
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    return str(value)
+
+
+class DiskStore:
+    """Append-only log of cache entries, one line per key in `<key>\\t<written_at>\\t<json value>` format.
+
+    A miss only appends the new entry at the end of the file, hence the cost of writing stays
+    constant irrespective of the size of the cache. Offsets of the entries are kept in a sidecar
+    index file (`<key>\\t<offset>\\t<length>\\t<written_at>` per line) so that opening the store only
+    reads the index, and a lookup only reads the requested entry from the log. The store is
+    opened lazily on the first access. In-case a key is written more than once, the last entry wins.
+
+    File names carry the format version (refer CACHE_LOG_VERSION). Log of the previous format i.e.
+    `<name>.log` with a `[key, value]` JSON per line is migrated on the first load, lines which
+    can't be parsed (in either of the logs) are skipped instead of failing the load.
+    """
+
+    def __init__(self, name: str):
+        self._location = f'{CACHE_FOLDER}/{name}.v{CACHE_LOG_VERSION}.log'
+        self._index_location = f'{CACHE_FOLDER}/{name}.v{CACHE_LOG_VERSION}.idx'
+        self._legacy_location = f'{CACHE_FOLDER}/{name}.log'
+        self._index = None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._get_index()
+
+    def _get_index(self) -> dict:
+        if self._index is None:
+            self.load()
+
+        return self._index
+
+    def load(self):
+        self._index = {}
+
+        if not os.path.exists(self._location) and os.path.exists(self._legacy_location):
+            self._migrate()
+
+        if not os.path.exists(self._location):
+            return
+
+        indexed_size = 0
+
+        if os.path.exists(self._index_location):
+            valid_index_size = 0
+
+            with open(self._index_location, 'rb') as fileop:
+                for line in fileop:
+                    # Following takes care of a partially written entry i.e. process killed mid-write
+                    if not line.endswith(b'\n'):
+                        break
+
+                    try:
+                        key, offset, length, written_at = line.split(b'\t')
+                        entry = (int(offset), int(length), float(written_at))
+                    except ValueError:
+                        # Following rebuilds the whole index from the log since the offsets after a
+                        # corrupted line can't be trusted either
+                        LOGGER.warning('Rebuilding the corrupted cache index: %s' % self._index_location)
+
+                        self._index = {}
+                        valid_index_size = indexed_size = 0
+
+                        break
+
+                    valid_index_size += len(line)
+
+                    self._index[key.decode('utf-8')] = entry
+
+                    indexed_size = max(indexed_size, entry[0] + entry[1])
+
+            if valid_index_size < os.path.getsize(self._index_location):
+                os.truncate(self._index_location, valid_index_size)
+
+        # Following catches up with the entries which made it to the log but not to the index,
+        # that also covers the logs written before the index was introduced
+        if indexed_size < os.path.getsize(self._location):
+            self._index_tail(offset=indexed_size)
+
+    def _index_tail(self, offset: int):
+        index_lines = []
+
+        with open(self._location, 'rb') as fileop:
+            fileop.seek(offset)
+
+            for line in fileop:
+                if not line.endswith(b'\n'):
+                    break
+
+                try:
+                    key, written_at, _ = line.split(b'\t', 2)
+                    key, written_at = key.decode('utf-8'), float(written_at)
+                except ValueError:
+                    LOGGER.warning('Skipping an unparseable cache entry at %d of %s' % (offset, self._location))
+
+                    offset += len(line)
+
+                    continue
+
+                self._index[key] = (offset, len(line), written_at)
+
+                index_lines.append('%s\t%d\t%d\t%f\n' % (key, offset, len(line), written_at))
+
+                offset += len(line)
+
+        with open(self._index_location, 'a') as fileop:
+            fileop.write(''.join(index_lines))
+
+    def _migrate(self):
+        """Rewrites the entries of the legacy log in the current format, the entries are considered
+        to be written when the legacy log was last modified as it doesn't record it per entry"""
+        written_at = os.path.getmtime(self._legacy_location)
+        entries = OrderedDict()
+
+        with open(self._legacy_location, 'rb') as fileop:
+            for line in fileop:
+                try:
+                    key, value = json.loads(line)
+                except (ValueError, TypeError):
+                    continue
+
+                entries[key] = json.dumps(value)
+
+        LOGGER.info('Migrating %d cache entries of %s' % (len(entries), self._legacy_location))
+
+        self._index = {}
+
+        for key, serialized_value in entries.items():
+            self.append(key=key, written_at=written_at, serialized_value=serialized_value)
+
+        self._index = {}
+
+    def get(self, key: str) -> tuple:
+        """Returns the entry as (written_at, value, size) tuple"""
+        offset, length, written_at = self._get_index()[key]
+
+        with open(self._location, 'rb') as fileop:
+            fileop.seek(offset)
+
+            _, _, value = fileop.read(length).rstrip(b'\n').split(b'\t', 2)
+
+        return written_at, json.loads(value), len(value)
+
+    def append(self, key: str, written_at: float, serialized_value: str):
+        if not os.path.exists(CACHE_FOLDER):
+            os.makedirs(CACHE_FOLDER)
+
+        index = self._get_index()
+        line = ('%s\t%f\t%s\n' % (key, written_at, serialized_value)).encode('utf-8')
+
+        with open(self._location, 'ab') as fileop:
+            offset = fileop.tell()
+
+            fileop.write(line)
+
+        with open(self._index_location, 'a') as fileop:
+            fileop.write('%s\t%d\t%d\t%f\n' % (key, offset, len(line), written_at))
+
+        index[key] = (offset, len(line), written_at)
+
+
+class MemoryStore:
+    """LRU of decoded cache entries shared across all the cached functions.
+
+    Size of an entry is approximated by the length of its serialized value, once the total goes
+    beyond the budget the least recently used entries are evicted. Evicted entries are read back
+    from the disk store (if enabled) on the next access.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: tuple):
+        if key not in self._entries:
+            return None
+
+        self._entries.move_to_end(key)
+
+        return self._entries[key]
+
+    def put(self, key: tuple, entry: tuple) -> List[tuple]:
+        """Adds the (written_at, value, size) entry and returns the keys evicted to fit it"""
+        self.remove(key)
+
+        self._entries[key] = entry
+        self.size += entry[2]
+
+        evicted_keys = []
+
+        # Most recent entry is always kept even if it is individually larger than the budget
+        while self.size > self.budget and len(self._entries) > 1:
+            evicted_key, evicted_entry = self._entries.popitem(last=False)
+
+            self.size -= evicted_entry[2]
+
+            evicted_keys.append(evicted_key)
+
+        return evicted_keys
+
+    def remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+
+        if entry:
+            self.size -= entry[2]
+
+
+MEMORY = MemoryStore(budget=CACHE_MEMORY_BUDGET)
+
 
 class Cache:
+    INSTANCES = {}
+
     def __init__(self, func):
         self._func = func.__func__
 
         func_name = self._func.__name__
 
+        self._name = func_name
+        self._signature = inspect.signature(self._func)
         self._return_model = FUNCTION_MODAL_MAP[func_name]
-        self._cache_loc = f'{CACHE_FOLDER}/{func_name}.txt'
-        self._memory = {}
+        self._ttl = FUNCTION_TTL_MAP.get(func_name)
+        self._store = DiskStore(name=func_name)
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
 
-        if CACHE_TYPE != DISK_CACHE_TYPE:
-            return
+        # Note that the disk store is not loaded here since the decorator is evaluated at import
+        # time, it gets opened lazily on the first cache lookup instead
+        Cache.INSTANCES[func_name] = self
 
-        if not os.path.exists(CACHE_FOLDER):
-            os.makedirs(CACHE_FOLDER)
+    @staticmethod
+    def get_stats() -> dict:
+        stats = dict((name, cache.stats()) for name, cache in Cache.INSTANCES.items())
 
-        self.load()
+        stats['memory'] = {
+            'size': MEMORY.size,
+            'budget': MEMORY.budget
+        }
 
-    def memory(self):
-        return self._memory
+        return stats
+
+    def stats(self) -> dict:
+        return dict(self._stats)
 
     def load(self):
         if CACHE_TYPE != DISK_CACHE_TYPE:
             return
 
-        if not os.path.exists(self._cache_loc):
-            return
-
-        with open(self._cache_loc, 'r') as fileop:
-            self._memory = json.loads(fileop.read())
+        self._store.load()
 
-    def dump(self):
+    def dump(self, key: str, written_at: float, serialized_value: str):
         if CACHE_TYPE != DISK_CACHE_TYPE:
             return
 
-        with open(self._cache_loc, 'w+') as fileop:
-            fileop.write(json.dumps(self._memory))
+        self._store.append(key=key, written_at=written_at, serialized_value=serialized_value)
+
+    def get_key(self, *args, **kwargs) -> str:
+        # Binding against the signature ensures that the positional and keyword way of passing
+        # the same arguments (as well as omitted defaults) resolve to the same key
+        bound_arguments = self._signature.bind(*args, **kwargs)
+        bound_arguments.apply_defaults()
+
+        serialized_arguments = json.dumps(_canonicalize(bound_arguments.arguments), sort_keys=True)
+
+        return hashlib.sha1(serialized_arguments.encode('utf-8')).hexdigest()
+
+    def _put_in_memory(self, key: str, entry: tuple):
+        for evicted_name, _ in MEMORY.put(key=(self._name, key), entry=entry):
+            Cache.INSTANCES[evicted_name]._stats['evictions'] += 1
+
+    def _get_entry(self, key: str):
+        entry = MEMORY.get(key=(self._name, key))
+
+        if entry is None and CACHE_TYPE == DISK_CACHE_TYPE and key in self._store:
+            entry = self._store.get(key=key)
+
+            self._put_in_memory(key=key, entry=entry)
+
+        if entry is None:
+            return None
+
+        written_at, _, _ = entry
+
+        if self._ttl is not None and time.time() - written_at > self._ttl:
+            self._stats['expirations'] += 1
+
+            MEMORY.remove(key=(self._name, key))
+
+            return None
+
+        return entry
 
     def __call__(self, *args, **kwargs):
         # Cache will not be used for latest data fetching i.e. no on_date value in the function
-        if not kwargs.get('on_date') and self._func.__name__ != 'get_historical_data':
+        if not self._signature.bind(*args, **kwargs).arguments.get('on_date') and self._func.__name__ != 'get_historical_data':
             return self._func(*args, **kwargs)
 
-        # Note that the memory optimization only supports kwargs as of now
-        hash_key = ('|'.join([str(elem) for elem in kwargs.values()]))
+        hash_key = self.get_key(*args, **kwargs)
+        entry = self._get_entry(key=hash_key)
 
-        if hash_key in self._memory:
-            ret_val = self._memory[hash_key]
+        if entry is not None:
+            self._stats['hits'] += 1
+
+            _, ret_val, _ = entry
 
             if is_dataclass(self._return_model):
                 return from_dict(data_class=self._return_model, data=ret_val)
@@ -80,14 +377,20 @@ class Cache:
 
             return [from_dict(data_class=data_model, data=elem) for elem in ret_val]
 
+        self._stats['misses'] += 1
+
         ret_val = self._func(*args, **kwargs)
 
         if is_dataclass(self._return_model):
-            self._memory = asdict(ret_val)
+            value = asdict(ret_val)
         else:
             # Assuming that the non dataclass response is a list with a dataclass as an element
-            self._memory[hash_key] = [asdict(elem) for elem in ret_val]
+            value = [asdict(elem) for elem in ret_val]
+
+        written_at = time.time()
+        serialized_value = json.dumps(value)
 
-        self.dump()
+        self._put_in_memory(key=hash_key, entry=(written_at, value, len(serialized_value)))
+        self.dump(key=hash_key, written_at=written_at, serialized_value=serialized_value)
 
         return ret_val
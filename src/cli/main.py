@@ -1,10 +1,15 @@
+import json
+
 import click
 from PyInquirer import prompt
 from dacite.core import from_dict
 
+from src.apps.nse.stores import OptionsStore
 from src.logger import LOGGER
 from src.strategies import BluechipOptionsSeller, Strangler, TaxHarvester
+from src.strategies.strangling.controllers import run_stranglers
 from src.strategies.strangling.models import ConfigV2Model
+from src.strategies.bluechip_options_selling.sweep import run_sweep
 from src.strategies.bluechip_options_selling.models import (
     ConfigModel as BluechipOptionsSellingConfig,
     AutomationConfig as BluechipOptionsSellingAutomationConfig
@@ -28,6 +33,17 @@ Sample commands:
 Indices Daily Strangler
 ----
 python run.py --strategy 'Indices Daily Strangler' --tickersymbol NIFTY --strangle_gap 200 --stoploss_pnl -1000 --is_mock_run true --number_of_lots 1
+python run.py --strategy 'Indices Daily Strangler' --tickersymbol NIFTY,BANKNIFTY --strangle_gap 200 --stoploss_pnl -1000 --is_mock_run true --number_of_lots 1
+python run.py --strategy 'Indices Daily Strangler' --tickersymbol NIFTY --strangle_gap 200 --stoploss_pnl -1000 --is_mock_run true --number_of_lots 1 --is_recording_enabled true
+
+NSE bhavcopies ingestion (for the backtests)
+----
+python run.py --ingest_bhavcopies ./bhavcopies
+
+Bluechip Options Seller backtest sweep (grid being a JSON of the config fields to their values)
+----
+python run.py --backtest_sweep ./grid.json
+e.g. grid.json: {"filter_options_min_percentage_dip": [6, 8, 10], "entry_day_before_expiry_in_days": [20, 25]}
 
 Bluechip Options Seller
 ----
@@ -37,19 +53,41 @@ python run.py --strategy 'Bluechip Options Seller' --stocks COALINDIA
 @click.command()
 @click.option('--strategy', default=None, help='Strategy to be executed')
 # Following are Indices Daily Strangler options
-@click.option('--tickersymbol', type=str, help='Stocks / Indices to trade')
+@click.option('--tickersymbol', type=str, help='Stocks / Indices to trade, comma separated to trade multiple over a single connection')
 @click.option('--strangle_gap', type=int, help='Points to be strangled with')
 @click.option('--stoploss_pnl', type=int, help='PnL to stop at')
 @click.option('--is_mock_run', type=bool, help='To run as a mock or not?')
 @click.option('--number_of_lots', type=int, help='Number of lots to be traded')
+@click.option('--is_recording_enabled', type=bool, help='To record the ticker frames (for the replays) or not?')
 # Following are Bluechip Options Seller options
 @click.option('--is_order_enabled', type=bool, default=True, help='Ordering to be enabled')
 @click.option('--is_order_profit_booking_enabled', type=bool, default=True, help='Profit booking to be enabled')
 @click.option('--stocks', type=str, help='List of tickersymbols to be processed')
 @click.option('--is_automated', type=bool, default=True, help='List of tickersymbols to be processed')
+# Following is the NSE historical data ingestion option
+@click.option('--ingest_bhavcopies', type=click.Path(exists=True, file_okay=False), help='Folder of the F&O bhavcopies to be ingested')
+# Following is the Bluechip Options Seller backtest sweep option
+@click.option('--backtest_sweep', type=click.Path(exists=True, dir_okay=False), help='JSON of the parameter grid to sweep the backtest over')
 def main(*args, **kwargs):
     LOGGER.info('Welcome to your personal trader!')
 
+    if kwargs.get('ingest_bhavcopies'):
+        stats = OptionsStore().ingest(folder=kwargs['ingest_bhavcopies'])
+
+        LOGGER.info('Ingested %d option rows from %d files (%d bhavcopies)' % (stats['rows'], stats['files'], stats['bhavcopies']))
+
+        return
+
+    if kwargs.get('backtest_sweep'):
+        with open(kwargs['backtest_sweep'], 'r') as fileop:
+            grid = json.loads(fileop.read())
+
+        results = run_sweep(grid=grid)
+
+        LOGGER.info('Top configs of the sweep:\n%s' % results.head(10).to_string())
+
+        return
+
     strategy_name = kwargs.get('strategy')
 
     if not strategy_name:
@@ -79,6 +117,16 @@ def main(*args, **kwargs):
 
         kwargs = dict((k, v) for k, v in kwargs.items() if v)
 
+        tickersymbols = kwargs.get('tickersymbol', '').split(',')
+
+        if len(tickersymbols) > 1:
+            run_stranglers(configs=[
+                from_dict(data_class=ConfigV2Model, data={ **kwargs, 'tickersymbol': tickersymbol })
+                for tickersymbol in tickersymbols
+            ])
+
+            return
+
         config = from_dict(data_class=ConfigV2Model, data=kwargs)
 
         strategy(config=config).run()
@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket i.e. allows bursts of up to `capacity` calls and `rate` calls per
+    second on an average, `acquire` blocks till a token is available."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+
+                    return
+
+                wait_time = (1 - self._tokens) / self.rate
+
+            time.sleep(wait_time)
@@ -6,20 +6,23 @@ from src.apps.kite.controllers.users import UsersController
 from src.apps.kite.models.gtt import OrderModel
 from src.apps.kite.models.instruments import CandleModel, EnrichedInstrumentModel
 from src.apps.kite.models.positions import PositionModel
-from src.apps.nse.models.options import HistoricalOptionModel
+from src.apps.nse.models.options import HistoricalDataRequestModel, HistoricalOptionModel
 from typing import List
 
 import emoji
+import numpy as np
+import pandas as pd
 from PyInquirer import Token, Separator, prompt, style_from_dict
 from dacite import from_dict
 
 from src.apps.telegram.controllers import TelegramController
 
+from .engine import PANEL_COLUMNS, simulate
 from .models import BackTestConfigModel, ConfigModel
 import src.utilities as Utilities
 from src.apps.kite.models import StockOfInterest, EnrichedOptionModel
 from src.apps.kite.controllers import (
-    InstrumentsController, OptionsController, PositionsController, GTTController
+    InstrumentsController, OptionsController, PositionsController, GTTController, QuotesController
 )
 from src.apps.nse.controllers.options import OptionsController as NSEOptionsController
 from src.logger import LOGGER
@@ -147,15 +150,9 @@ class BackTester:
             }
         )
 
-    def run(self):
-        stocks = self.get_stocks()
-        self.config = self.get_config()
-
-        print(self.config)
-
+    def get_days_of_trading(self) -> List[dict]:
         entry_date = self.config.entry_day_before_expiry_in_days  # x days before the expiry
         last_n_iterations = self.config.last_n_iterations  # None depicts all
-        filter_stocks_by_technicals = self.config.filter_stocks_by_technicals
 
         days_of_expiry = [
             date(2020, 1, 30), date(2020, 2, 27), date(2020, 3, 26), date(2020, 4, 30),
@@ -189,132 +186,134 @@ class BackTester:
         if last_n_iterations:
             days_of_trading = days_of_trading[-1 * last_n_iterations:]
 
-        # TODO
-        # 1. Add the custom entry point
-        # 2. Add the day based actions (optional)
-        # 2.1 Figure out if the GTT will even trigger
+        return days_of_trading
 
-        total_pnl = 0
-        total_optimistic_pnl = 0
-        total_expected_pnl = 0
-        positions = defaultdict(list)
+    def prepare_panel(self, stocks: List[StockOfInterest], days_of_trading: List[dict]) -> pd.DataFrame:
+        """Builds the option panel of the backtest (refer engine.PANEL_COLUMNS) i.e. a row per eligible
+        PE option of a stock on a trading day, along with the prices of the option and the stock on the
+        expiry. Data of all the trading days is fetched in bulk, and the filters which don't depend on
+        the config are applied here. Technicals of the stocks are only fetched in-case the config filters
+        the stocks by them.
+        """
+        percentage_up_from_supports = {}
 
-        for trade_day in days_of_trading:
-            # Following is divided by 1.4 to accomodate for 40% margin needed on expiry
-            # date. In-case the required margin exceeds available margin, it results into
-            # incurring charges and interest on top of it.
-            available_margin = self.config.available_margin / 1.4
+        for trade_day_index, trade_day in enumerate(days_of_trading):
+            if not self.config.filter_stocks_by_technicals:
+                break
 
-            print('Processing for %s, expiry: %s' % (trade_day['on_date'], trade_day['expiry']))
+            instruments: List[EnrichedInstrumentModel] = InstrumentsController.enrich_instruments(instruments=stocks, on_date=trade_day['on_date'])
 
-            if filter_stocks_by_technicals:
-                instruments: List[EnrichedInstrumentModel] = InstrumentsController.enrich_instruments(instruments=stocks, on_date=trade_day['on_date'])
-                filtered_instruments = set([instrument.tickersymbol for instrument in  self.filter_instruments(instruments=instruments)])
+            for instrument in instruments:
+                # Following are the conditions of `filter_instruments`, which don't depend on the config
+                if instrument.close_last_by_resistance is None or instrument.close_last_by_support is None:
+                    continue
 
-                filtered_stocks = [stock for stock in stocks if stock.tickersymbol in filtered_instruments]
+                if instrument.close_last_by_support < 0 or instrument.close_last_by_resistance > 0:
+                    continue
 
-                LOGGER.info('Filtered %d stocks from %d' % (len(filtered_stocks), len(stocks)))
-            else:
-                filtered_stocks = stocks
+                support_resistance_gap = instrument.close_last_by_support + abs(instrument.close_last_by_resistance)
 
-            options = self._get_options(stocks=filtered_stocks, on_date=trade_day['on_date'])
+                percentage_up_from_supports[(trade_day_index, instrument.tickersymbol)] = \
+                    instrument.close_last_by_support / support_resistance_gap * 100
 
-            if self.config.filter_options_by_open_int:
-                filter_function = lambda x: x.percentage_dip > self.config.filter_options_min_percentage_dip and x.percentage_dip < self.config.filter_options_max_percentage_dip \
-                    and x.oi > self.config.filter_options_min_open_int \
-                    and x.profit > self.config.filter_options_min_profit and x.profit < self.config.filter_options_max_profit
-            else:
-                filter_function = lambda x: x.percentage_dip > self.config.filter_options_min_percentage_dip and x.percentage_dip < self.config.filter_options_max_percentage_dip \
-                    and x.profit > self.config.filter_options_min_profit and x.profit < self.config.filter_options_max_profit
-
-            options = sorted(
-                list(
-                    filter(
-                        filter_function,
-                        options
-                    )
-                ),
-                key=lambda x: x.profit, reverse=True
-            )
+        def get_close(tickersymbol: str, on_date: date) -> float:
+            try:
+                return InstrumentsController.get_instrument_price_details(tickersymbol=tickersymbol, on_date=on_date).close
+            except IndexError:
+                return np.nan
+
+        chain_requests = {}
+        expiry_requests = {}
+
+        for trade_day_index, trade_day in enumerate(days_of_trading):
+            for stock in stocks:
+                chain_requests[(trade_day_index, stock.tickersymbol)] = HistoricalDataRequestModel(
+                    tickersymbol=stock.tickersymbol,
+                    expiry_date=InstrumentsController.get_options_chain_expiry(tickersymbol=stock.tickersymbol, on_date=trade_day['on_date']),
+                    option_type='PE',
+                    from_date=trade_day['on_date'],
+                    to_date=trade_day['on_date']
+                )
+                expiry_requests[(trade_day_index, stock.tickersymbol)] = HistoricalDataRequestModel(
+                    tickersymbol=stock.tickersymbol,
+                    expiry_date=trade_day['expiry'],
+                    option_type='PE',
+                    from_date=trade_day['expiry'],
+                    to_date=trade_day['expiry']
+                )
+
+        options_data = NSEOptionsController.get_historical_data_bulk(
+            data_requests=list(chain_requests.values()) + list(expiry_requests.values())
+        )
 
-            grouped_options = defaultdict(list)
+        rows = []
 
-            for option in options:
-                grouped_options[option.underlying_instrument].append(option)
+        for trade_day_index, trade_day in enumerate(days_of_trading):
+            for stock in stocks:
+                options = options_data[chain_requests[(trade_day_index, stock.tickersymbol)]]
 
-            for _, option_list in grouped_options.items():
-                if not option_list:
+                if not options:
                     continue
 
-                if available_margin < 50000:
-                    # Margin < 50,000 INR doesn't get us anything, hence skipping
-                    break
+                underlying_close = get_close(tickersymbol=stock.tickersymbol, on_date=trade_day['on_date'])
+                underlying_expiry_close = get_close(tickersymbol=stock.tickersymbol, on_date=trade_day['expiry'])
+                expiry_closes = {}
 
-                selected_option: HistoricalOptionModel = list(option_list)[0]
-                expected_pnl = selected_option.close * selected_option.lot_size
+                for option in options_data[expiry_requests[(trade_day_index, stock.tickersymbol)]]:
+                    expiry_closes.setdefault(option.strike, option.close)
 
-                instrument_expiry: CandleModel = InstrumentsController.get_instrument_price_details(
-                    tickersymbol=selected_option.underlying_instrument,
-                    on_date=trade_day['expiry']
-                )
+                for option in options:
+                    percentage_dip = (underlying_close - option.strike) / underlying_close * 100
 
-                available_margin -= selected_option.margin.total
-
-                if instrument_expiry.close >= selected_option.strike:
-                    pnl = expected_pnl
-                    expiry_data = None
-                else:
-                    expiry_data = NSEOptionsController.get_historical_data(
-                        tickersymbol=selected_option.underlying_instrument,
-                        expiry_date=trade_day['expiry'],
-                        option_types=[selected_option.instrument_type],
-                        strike_price=selected_option.strike,
-                        from_date=trade_day['expiry'],
-                        to_date=trade_day['expiry']
-                    )
+                    # Following are the filters of `_get_options`
+                    if not (
+                        option.strike < underlying_close \
+                            and option.time_to_expiry_in_days < OPTIONS_MAX_TIME_TO_EXPIRY \
+                            and stock.custom_filters.minimum_dip < percentage_dip < stock.custom_filters.maximum_dip
+                    ):
+                        continue
 
-                    if not expiry_data:
-                        print('Could not find the expiry data for option: ', selected_option)
+                    rows.append((
+                        trade_day_index, trade_day['on_date'], trade_day['expiry'], stock.tickersymbol,
+                        option.strike, option.close, option.open_int, option.lot_size, option.margin.total,
+                        underlying_close, underlying_expiry_close, expiry_closes.get(option.strike, np.nan),
+                        percentage_up_from_supports.get((trade_day_index, stock.tickersymbol), np.nan)
+                    ))
 
-                        continue
+        return pd.DataFrame(rows, columns=PANEL_COLUMNS)
 
-                    expiry_data = expiry_data[0]
+    def run(self):
+        stocks = self.get_stocks()
+        self.config = self.get_config()
 
-                    pnl = (selected_option.last_price - expiry_data.close) * selected_option.lot_size
+        print(self.config)
 
-                optimistic_pnl = 0 if pnl < 0 else pnl
+        days_of_trading = self.get_days_of_trading()
 
-                positions[trade_day['on_date']].append({
-                    'position': selected_option,
-                    'expiry': expiry_data,
-                    'expected_pnl': expected_pnl,
-                    'optimistic_pnl': optimistic_pnl,
-                    'pnl': pnl
-                })
+        panel = self.prepare_panel(stocks=stocks, days_of_trading=days_of_trading)
+        positions = simulate(panel=panel, config=self.config)
 
-                total_expected_pnl += expected_pnl
-                total_pnl += pnl
-                total_optimistic_pnl += optimistic_pnl
+        for trade_day_index, trade_day in enumerate(days_of_trading):
+            day_positions = positions[positions['trade_day'] == trade_day_index]
 
             print('Positions taken on %s' % trade_day['on_date'])
             print('\n'.join([
                 'symbol: %s strike: %s dip: %.2f expected-pnl: %.2f real-pnl: %.2f, margin: %.2f\topen_int: %.2f' % (
-                    position['position'].symbol, position['position'].strike, position['position'].percentage_dip,
-                    position['expected_pnl'], position['pnl'], position['position'].margin.total,
-                    position['position'].open_int
+                    position.symbol, position.strike, position.percentage_dip, position.expected_pnl,
+                    position.pnl, position.margin, position.open_int
                 ) \
-                    for position in positions[trade_day['on_date']]
+                    for position in day_positions.itertuples()
             ]))
             print(
                 'Real-Pnl: %.2f, Optimistic-Pnl: %.2f, Expected-Pnl: %.2f, Margin: %.2f' % (
-                    sum(position['pnl'] for position in positions[trade_day['on_date']]),
-                    sum(position['optimistic_pnl'] for position in positions[trade_day['on_date']]),
-                    sum(position['expected_pnl'] for position in positions[trade_day['on_date']]),
-                    sum(position['position'].margin.total for position in positions[trade_day['on_date']])
+                    day_positions['pnl'].sum(), day_positions['optimistic_pnl'].sum(),
+                    day_positions['expected_pnl'].sum(), day_positions['margin'].sum()
                 )
             )
 
-        print('\nReal-pnl: %.2f, Optimistic-pnl: %.2f, Total expected-pnl: %.2f ' % (total_pnl, total_optimistic_pnl, total_expected_pnl))
+        print('\nReal-pnl: %.2f, Optimistic-pnl: %.2f, Total expected-pnl: %.2f ' % (
+            positions['pnl'].sum(), positions['optimistic_pnl'].sum(), positions['expected_pnl'].sum()
+        ))
 
 
 class BluechipOptionsSeller:
@@ -399,12 +398,14 @@ class BluechipOptionsSeller:
                     and stock.custom_filters.minimum_dip < ((instrument.last_price - option.strike) / instrument.last_price * 100) < stock.custom_filters.maximum_dip,
                 options
             ))
-            options = OptionsController.enrich_options(options=options)
 
             all_options += options
 
             LOGGER.debug('Processed for %s' % stock.tickersymbol)
 
+        # Options of all the stocks are enriched together so that the margins are fetched in one go
+        all_options = OptionsController.enrich_options(options=all_options) if all_options else []
+
         all_options = list(filter(
             lambda elem: elem.profit_percentage >= OPTIONS_MINIMUM_PROFIT_PERCENTAGE,
             sorted(
@@ -523,8 +524,12 @@ class BluechipOptionsSeller:
 
         LOGGER.info('Expected profit: %d, margin: %d' % (expected_profit, margin_required))
 
+        # Following fetches the latest prices of all the options in a single request, which are
+        # then passed on while placing the orders irrespective of the time taken by the orders
+        last_prices = QuotesController.get_last_prices(tradingsymbols=[option.tradingsymbol for option in options])
+
         for option in options:
-            OptionsController.sell_option(option=option)
+            OptionsController.sell_option(option=option, last_price=last_prices.get(option.tradingsymbol))
 
     def _manual_run(self):
         options = self._get_options()
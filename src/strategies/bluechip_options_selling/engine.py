@@ -0,0 +1,110 @@
+"""
+Vectorized engine of the bluechip options selling backtest.
+
+The backtest is run over an option panel i.e. a long (columnar) format of the option chains of the
+trading days (dates x strikes x expiries), a row per candidate option with the prices needed for
+its PnL. Filters, the selection of an option per stock, the margin budget and the PnL are computed
+as array operations over the whole panel, which yields the same positions as the previous day by day
+loop of the backtest (refer benchmarks/bluechip_backtest.py).
+"""
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from .models import BackTestConfigModel
+
+# Following are the columns of the panel, rows are expected in the order of the trading days, the
+# stocks and the options (as in the option chain) i.e. the order of the day by day backtest
+PANEL_COLUMNS = [
+    'trade_day',  # index of the trading day
+    'on_date',
+    'expiry',
+    'symbol',
+    'strike',
+    'close',
+    'open_int',
+    'lot_size',
+    'margin',
+    'underlying_close',  # close of the stock on the trading day
+    'underlying_expiry_close',  # close of the stock on the expiry
+    'expiry_close',  # close of the option on the expiry, NaN in-case of missing data
+    'percentage_up_from_support'  # NaN in-case the stock can't be entered as per its technicals
+]
+POSITION_COLUMNS = [
+    'trade_day', 'on_date', 'expiry', 'symbol', 'strike', 'close', 'open_int', 'lot_size', 'margin'
+]
+
+# Following is divided by 1.4 to accomodate for 40% margin needed on expiry date
+EXPIRY_MARGIN_RATIO = 1.4
+# Margin < 50,000 INR doesn't get us anything, hence no positions are taken below it
+MINIMUM_AVAILABLE_MARGIN = 50000
+
+
+def simulate(panel: Union[pd.DataFrame, Dict[str, np.ndarray]], config: BackTestConfigModel, trade_days_of_interest: np.ndarray = None) -> pd.DataFrame:
+    """Returns the positions taken by the backtest over the panel (refer PANEL_COLUMNS) along with
+    their expected, real and optimistic PnLs.
+
+    Panel can as well be the arrays of its columns (e.g. memory mapped ones), which are only read.
+    In-case the trade days of interest are provided, the rest of the trading days are skipped.
+    """
+    trade_days = np.asarray(panel['trade_day'], dtype=np.int64)
+    symbols = pd.factorize(np.asarray(panel['symbol']))[0].astype(np.int64)
+    strikes = np.asarray(panel['strike'], dtype=float)
+    closes = np.asarray(panel['close'], dtype=float)
+    lot_sizes = np.asarray(panel['lot_size'], dtype=float)
+    margins = np.asarray(panel['margin'], dtype=float)
+    underlying_closes = np.asarray(panel['underlying_close'], dtype=float)
+    underlying_expiry_closes = np.asarray(panel['underlying_expiry_close'], dtype=float)
+    expiry_closes = np.asarray(panel['expiry_close'], dtype=float)
+
+    percentage_dips = (underlying_closes - strikes) / underlying_closes * 100
+    profits = closes * lot_sizes
+
+    with np.errstate(invalid='ignore'):
+        is_selected = (config.filter_options_min_percentage_dip < percentage_dips) \
+            & (percentage_dips < config.filter_options_max_percentage_dip) \
+            & (config.filter_options_min_profit < profits) & (profits < config.filter_options_max_profit)
+
+        if config.filter_options_by_open_int:
+            is_selected &= np.asarray(panel['open_int'], dtype=float) > config.filter_options_min_open_int
+
+        if config.filter_stocks_by_technicals:
+            is_selected &= np.asarray(panel['percentage_up_from_support'], dtype=float) <= config.entry_point_from_last_support
+
+    if trade_days_of_interest is not None:
+        is_selected &= np.isin(trade_days, trade_days_of_interest)
+
+    rows = np.flatnonzero(is_selected)
+
+    # Options of a trading day by profit (descending), ties are kept in the panel order as the sort
+    # of the day by day backtest is stable
+    rows = rows[np.lexsort((rows, -profits[rows], trade_days[rows]))]
+
+    # Most profitable option of every stock, the stocks being in the order of their most profitable option
+    _, first_indices = np.unique(trade_days[rows] * (symbols.max(initial=0) + 1) + symbols[rows], return_index=True)
+    rows = rows[np.sort(first_indices)]
+
+    # Margin blocked by the positions taken earlier on the same trading day, including the ones
+    # skipped for the missing expiry data
+    cumulative_margins = np.cumsum(margins[rows])
+    day_starts = np.searchsorted(trade_days[rows], trade_days[rows], side='left')
+    blocked_margins = cumulative_margins - margins[rows] - (cumulative_margins[day_starts] - margins[rows][day_starts])
+
+    rows = rows[config.available_margin / EXPIRY_MARGIN_RATIO - blocked_margins >= MINIMUM_AVAILABLE_MARGIN]
+
+    is_expired_worthless = underlying_expiry_closes[rows] >= strikes[rows]
+    pnls = np.where(is_expired_worthless, profits[rows], (closes[rows] - expiry_closes[rows]) * lot_sizes[rows])
+    is_valid = is_expired_worthless | ~np.isnan(expiry_closes[rows])
+
+    rows = rows[is_valid]
+    pnls = pnls[is_valid]
+
+    positions = pd.DataFrame(dict((column, np.asarray(panel[column])[rows]) for column in POSITION_COLUMNS))
+
+    positions['percentage_dip'] = percentage_dips[rows]
+    positions['expected_pnl'] = profits[rows]
+    positions['pnl'] = pnls
+    positions['optimistic_pnl'] = np.maximum(pnls, 0)
+
+    return positions
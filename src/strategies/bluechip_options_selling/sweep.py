@@ -0,0 +1,154 @@
+"""
+Parameter sweep of the bluechip options selling backtest.
+
+Option panel of all the trading days needed by the grid is built once and dumped as memory mapped
+column arrays, which are shared read-only by the worker processes i.e. every configuration of the
+grid is simulated (refer engine.simulate) in parallel without copying or re-fetching the market data.
+"""
+import itertools
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, replace
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.cache import CACHE_FOLDER
+from src.logger import LOGGER
+
+from .controllers import BackTester
+from .engine import PANEL_COLUMNS, simulate
+from .models import BackTestConfigModel
+
+SWEEPS_FOLDER = f'{CACHE_FOLDER}/backtest-sweeps'
+DATE_COLUMNS = set(['on_date', 'expiry'])
+
+# Following is loaded once per worker process (refer _initialize_worker)
+_PANEL = None
+
+
+def get_configs(grid: Dict[str, list], base_config: BackTestConfigModel) -> List[BackTestConfigModel]:
+    """Returns a config per combination of the values of the grid, rest of the fields are of the base config"""
+    unknown_fields = set(grid.keys()) - set(asdict(base_config).keys())
+
+    if unknown_fields:
+        raise ValueError('Unexpected config fields found in the grid: %s' % ', '.join(sorted(unknown_fields)))
+
+    fields = list(grid.keys())
+
+    return [
+        replace(base_config, **dict(zip(fields, values)))
+        for values in itertools.product(*[grid[field] for field in fields])
+    ]
+
+
+def dump_panel(panel: pd.DataFrame, folder: str):
+    """Dumps the columns of the panel as `.npy` arrays, dates and symbols are kept as fixed width
+    types as the object arrays can't be memory mapped"""
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    for column in PANEL_COLUMNS:
+        values = panel[column].to_numpy()
+
+        if column in DATE_COLUMNS:
+            values = values.astype('M8[D]')
+        elif values.dtype == object:
+            values = values.astype(str)
+
+        np.save(os.path.join(folder, f'{column}.npy'), values)
+
+
+def load_panel(folder: str) -> Dict[str, np.ndarray]:
+    return dict(
+        (column, np.load(os.path.join(folder, f'{column}.npy'), mmap_mode='r')) for column in PANEL_COLUMNS
+    )
+
+
+def _initialize_worker(folder: str):
+    global _PANEL
+
+    _PANEL = load_panel(folder=folder)
+
+
+def _run_config(trade_days_of_interest: List[int], config: BackTestConfigModel) -> dict:
+    positions = simulate(panel=_PANEL, config=config, trade_days_of_interest=np.array(trade_days_of_interest, dtype=np.int64))
+    daily_margins = positions.groupby('trade_day')['margin'].sum()
+
+    return {
+        'trading_days': len(trade_days_of_interest),
+        'positions': len(positions),
+        'winning_positions': int((positions['pnl'] > 0).sum()),
+        'expected_pnl': positions['expected_pnl'].sum(),
+        'pnl': positions['pnl'].sum(),
+        'optimistic_pnl': positions['optimistic_pnl'].sum(),
+        'worst_day_pnl': positions.groupby('trade_day')['pnl'].sum().min() if len(positions) else 0,
+        'max_margin': daily_margins.max() if len(daily_margins) else 0
+    }
+
+
+def run_sweep(grid: Dict[str, list], base_config: BackTestConfigModel = None, results_location: str = None, max_workers: int = None) -> pd.DataFrame:
+    """Runs the backtest for every config of the grid over all the cores, results (a row per config
+    with its values of the grid and the PnLs) are written as CSV and returned sorted by the PnL"""
+    backtester = BackTester()
+    base_config = base_config or backtester.get_config()
+    configs = get_configs(grid=grid, base_config=base_config)
+
+    if not configs:
+        raise ValueError('No configs found in the grid, every field of the grid needs at least a value')
+
+    stocks = backtester.get_stocks()
+
+    # Trading days depend on the config, hence the panel is built for the union of the days of all the configs
+    trade_day_indices = {}
+    config_trade_days = []
+
+    for config in configs:
+        backtester.config = config
+
+        config_trade_days.append([
+            trade_day_indices.setdefault((trade_day['on_date'], trade_day['expiry']), len(trade_day_indices))
+            for trade_day in backtester.get_days_of_trading()
+        ])
+
+    days_of_trading = [
+        { 'on_date': on_date, 'expiry': expiry } for on_date, expiry in trade_day_indices.keys()
+    ]
+
+    # Technicals are only fetched in-case any of the configs filters the stocks by them
+    backtester.config = replace(base_config, filter_stocks_by_technicals=any(config.filter_stocks_by_technicals for config in configs))
+
+    LOGGER.info('Preparing the panel of %d trading days for %d configs...' % (len(days_of_trading), len(configs)))
+
+    panel = backtester.prepare_panel(stocks=stocks, days_of_trading=days_of_trading)
+    sweep_id = datetime.now().strftime('%Y%m%d%H%M%S')
+    panel_folder = f'{SWEEPS_FOLDER}/{sweep_id}'
+
+    LOGGER.info('Running %d configs over a panel of %d options...' % (len(configs), len(panel)))
+
+    # Following removes the dumped panel once the workers are done with it, even if the sweep fails
+    try:
+        dump_panel(panel=panel, folder=panel_folder)
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_initialize_worker, initargs=(panel_folder,)) as executor:
+            summaries = list(executor.map(
+                _run_config, config_trade_days, configs, chunksize=max(1, len(configs) // ((max_workers or os.cpu_count() or 1) * 4))
+            ))
+    finally:
+        shutil.rmtree(panel_folder, ignore_errors=True)
+
+    results = pd.DataFrame([
+        { **dict((field, getattr(config, field)) for field in grid.keys()), **summary }
+        for config, summary in zip(configs, summaries)
+    ]).sort_values('pnl', ascending=False, kind='stable').reset_index(drop=True)
+
+    results_location = results_location or f'{SWEEPS_FOLDER}/{sweep_id}.csv'
+
+    results.to_csv(results_location, index=False)
+
+    LOGGER.info('Sweep results written to %s' % results_location)
+
+    return results
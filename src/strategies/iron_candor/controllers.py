@@ -5,6 +5,7 @@ from dacite import from_dict
 
 import src.utilities as Utilities
 from src.apps.nse.controllers.options import OptionsController
+from src.apps.nse.models.options import HistoricalDataRequestModel
 from src.apps.kite.controllers.instruments import InstrumentsController
 from src.strategies.iron_candor.models import ConfigModel
 from src.logger import LOGGER
@@ -52,7 +53,6 @@ class BackTester:
         iteration_date = start_date
         tickersymbol = config.tickers[0]
         lot_size = 40
-        iteration_count = 0
         max_iteration_count = 20
         total_expected_pnl = 0
         total_pnl = 0
@@ -62,12 +62,42 @@ class BackTester:
             date(2021, 8, 19), date(2021, 8, 26)
         ]
 
-        while iteration_date < end_date:
-            if iteration_date in skip_week:
-                iteration_date += timedelta(days=7)
+        iteration_dates = []
 
-                continue
+        while iteration_date < end_date and len(iteration_dates) < max_iteration_count:
+            if iteration_date not in skip_week:
+                iteration_dates.append(iteration_date)
 
+            iteration_date += timedelta(days=7)
+
+        # Following fetches the options data of all the iterations upfront, in a single concurrent phase
+        data_requests = [
+            HistoricalDataRequestModel(
+                tickersymbol=tickersymbol,
+                expiry_date=iteration_date,
+                option_type=option_type,
+                from_date=on_date,
+                to_date=on_date
+            )
+            for iteration_date in iteration_dates
+            for on_date in [iteration_date - timedelta(days=7), iteration_date]
+            for option_type in ['PE', 'CE']
+        ]
+        options_data_dict = OptionsController.get_historical_data_bulk(data_requests=data_requests)
+
+        def get_options_data(expiry_date: date, on_date: date) -> list:
+            return [
+                option for option_type in ['PE', 'CE']
+                for option in options_data_dict[HistoricalDataRequestModel(
+                    tickersymbol=tickersymbol,
+                    expiry_date=expiry_date,
+                    option_type=option_type,
+                    from_date=on_date,
+                    to_date=on_date
+                )]
+            ]
+
+        for iteration_date in iteration_dates:
             position_date = iteration_date - timedelta(days=7)
 
             instrument_price = InstrumentsController.get_instrument_price_details(
@@ -80,12 +110,7 @@ class BackTester:
             low_sell_price = Utilities.round_nearest(number=instrument_price * (1 - delta_expectation / 100), unit=100)
             high_sell_price = Utilities.round_nearest(number=instrument_price * (1 + delta_expectation / 100), unit=100)
 
-            options_data = OptionsController.get_historical_data(
-                tickersymbol=tickersymbol,
-                expiry_date=iteration_date,
-                from_date=position_date,
-                to_date=position_date
-            )
+            options_data = get_options_data(expiry_date=iteration_date, on_date=position_date)
 
             option_strike_price_dict = dict((option.option_type + str(int(option.strike_price)), option) for option in options_data)
 
@@ -109,12 +134,7 @@ class BackTester:
                 on_date=iteration_date
             ).close
 
-            expiry_options_data = OptionsController.get_historical_data(
-                tickersymbol=tickersymbol,
-                expiry_date=iteration_date,
-                from_date=iteration_date,
-                to_date=iteration_date
-            )
+            expiry_options_data = get_options_data(expiry_date=iteration_date, on_date=iteration_date)
 
             expiry_option_strike_price_dict = dict((option.option_type + str(int(option.strike_price)), option) for option in expiry_options_data)
 
@@ -144,13 +164,6 @@ class BackTester:
 
             print('----------------------------')
 
-            iteration_date += timedelta(days=7)
-
-            iteration_count += 1
-
-            if iteration_count >= max_iteration_count:
-                break
-
         print('-------------------')
         print('Total expected pnl: %.2f' % total_expected_pnl)
         print('Final pnl achieved: %.2f' % total_pnl)
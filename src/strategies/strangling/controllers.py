@@ -1,5 +1,9 @@
 from copy import deepcopy
+import json
+import os
 import re
+import threading
+import time
 from datetime import date, datetime, timedelta
 from typing import List
 from urllib.parse import quote_plus
@@ -9,6 +13,7 @@ from PyInquirer import Token, prompt, style_from_dict
 from dacite.core import from_dict
 
 from src.apps.kite.controllers.positions import PositionsController
+from src.apps.kite.controllers.quotes import QuotesController
 from src.apps.kite.controllers.instruments import InstrumentsController
 from src.apps.kite.controllers.options import OptionsController
 from src.apps.kite.controllers.users import UsersController
@@ -16,6 +21,7 @@ from src.apps.kite.models.positions import PositionModel
 from src.apps.nse.models.options import HistoricalOptionModel
 from src.apps.settings.controllers.config import ConfigController
 from src.strategies.strangling.models import ConfigModel, ConfigV2Model, MockPositionModel
+from src.cache import CACHE_FOLDER
 from src.logger import LOGGER
 from src import utilities as Utilities
 
@@ -31,9 +37,17 @@ STYLE = style_from_dict({
 OPTIONS_TICKERSYMBOL_DATETIME_FORMAT = '%y%b%d'
 STOCK_OPTIONS_TICKERSYMBOL_DATETIME_FORMAT = '%d%b'
 
-POSITIONS_DICT = {}
-GLOBAL_CONFIG: ConfigV2Model = None
+# Following is the gap between the strike prices of the weekly options of the indices
+OPTION_GAPS = {
+    'NIFTY': 50,
+    'BANKNIFTY': 100
+}
+
 DONE_CODE = 1000
+TICKER_CLOSE_TIMEOUT = 5  # in seconds
+TICK_POLL_INTERVAL = 1  # in seconds
+TICKS_RECORDING_FOLDER = f'{CACHE_FOLDER}/ticks'
+TICK_LOG_INTERVAL = 60  # in seconds
 
 
 def _get_weekly_option_tickersymbol(instrument: str, option_type: str, expiry: date, price: float):
@@ -47,93 +61,215 @@ def _get_weekly_option_tickersymbol(instrument: str, option_type: str, expiry: d
     }
 
 
-def process_ticks(ticks: list) -> bool:
-    global GLOBAL_CONFIG
-    global POSITIONS_DICT
+class PnLAccumulator:
+    """Total pnl of the positions maintained by applying the change in pnl of a position as its
+    ticks arrive, instead of summing all the positions on every tick"""
 
-    now = datetime.now()
+    def __init__(self):
+        self.total = 0.0
+        self._pnls = {}
 
-    # Exit the strategy to book the pnl for the day
-    if now.hour > 15 and now.minute > 15:
-        total_pnl = sum([position.pnl for position in POSITIONS_DICT.values()])
+    def reset(self, positions: dict):
+        self._pnls = dict((instrument_token, position.pnl or 0.0) for instrument_token, position in positions.items())
+        self.total = sum(self._pnls.values())
 
-        LOGGER.info('Booking the profit for the day: %.2f' % total_pnl)
+    def update(self, instrument_token: str, pnl: float):
+        self.total += pnl - self._pnls.get(instrument_token, 0.0)
+        self._pnls[instrument_token] = pnl
 
-        if not GLOBAL_CONFIG.is_mock_run:
-            for position in POSITIONS_DICT.values():
-                PositionsController.exit_position(position=position)
 
-        return True
+class TickLogger:
+    """Logs a summary of the ticks (count along with the latest price per instrument) at most once
+    per interval instead of logging every tick, `flush` logs the pending summary once the ticks stop"""
 
-    for tick in ticks:
-        LOGGER.info(tick)
+    def __init__(self, interval: float = TICK_LOG_INTERVAL):
+        self.interval = interval
 
-        position: PositionModel = POSITIONS_DICT[str(tick['instrument_token'])]
+        self._count = 0
+        self._last_prices = {}
+        self._total_pnl = 0.0
+        self._logged_at = time.monotonic()
 
-        if position.tradingsymbol.endswith('PE'):
-            position.pnl = (position.average_price - tick['last_price']) *  abs(position.quantity)
-        elif position.tradingsymbol.endswith('CE'):
-            position.pnl = (tick['last_price'] - position.average_price) * abs(position.quantity)
-        else:
-            raise ValueError('Unexpected tickersymbol found: %s' % position.tradingsymbol)
+    def log(self, instrument_token: str, last_price: float, total_pnl: float):
+        self._count += 1
+        self._last_prices[instrument_token] = last_price
+        self._total_pnl = total_pnl
 
-    total_pnl = sum([position.pnl for position in POSITIONS_DICT.values()])
+        if time.monotonic() - self._logged_at < self.interval:
+            return
 
-    if total_pnl < GLOBAL_CONFIG.stoploss_pnl:
-        LOGGER.info(
-            'Exiting the positions; condition met; stoploss_pnl: %d, current pnl: %.2f' % (
-                GLOBAL_CONFIG.stoploss_pnl, total_pnl
-            )
-        )
+        self.flush()
 
-        if not GLOBAL_CONFIG.is_mock_run:
-            for position in POSITIONS_DICT.values():
-                PositionsController.exit_position(position=position)
+    def flush(self):
+        if not self._count:
+            return
 
-        return True
+        LOGGER.info('Ticks: %s' % json.dumps({
+            'count': self._count,
+            'last_prices': self._last_prices,
+            'total_pnl': round(self._total_pnl, 2)
+        }))
 
-def on_ticks(ws, ticks):
-    try:
-        is_breaking_required = process_ticks(ticks=ticks)
-    except Exception as ex:
-        LOGGER.error(ex)
+        self._count = 0
+        self._last_prices = {}
+        self._logged_at = time.monotonic()
 
-        ws.close(code=DONE_CODE)
 
-        return
+def _get_ticker(is_recording_enabled: bool = False):
+    # In order to keep the requirements clean for deployments, the underlying twisted module is
+    # considered for development purposes only as of now, hence the following imports are localized
+    from src.apps.kite.connectors.recorder import TickRecorder
+    from src.apps.kite.connectors.table import TickTable
+    from src.apps.kite.connectors.websocket import KiteTicker
 
-    if is_breaking_required:
-        ws.close(code=DONE_CODE)
+    recorder = None
 
+    # Recorded frames of the session can be replayed later for the intraday backtests, the recording
+    # is per process so that the parallel sessions (and the reruns) don't append to the same file
+    if is_recording_enabled:
+        recorder = TickRecorder(location=f'{TICKS_RECORDING_FOLDER}/{date.today().isoformat()}-{os.getpid()}.ticks')
 
-def on_connect(ws, response):
-    # Callback on successful connect.
-    # Subscribe to a list of instrument_tokens (RELIANCE and ACC here).
-    global POSITIONS_DICT
+    # Since only the latest prices are used, the decoder writes them to the tick table directly
+    # instead of decoding the ticks for `on_ticks`
+    return KiteTicker(
+        user_id=UsersController.get_current_user().user_id,
+        enctoken=quote_plus(ConfigController.get_config().kite_auth_token),
+        tick_table=TickTable(),
+        recorder=recorder
+    )
 
-    position_tokens = [position.instrument_token for position in POSITIONS_DICT.values()]
 
-    ws.subscribe(position_tokens)
+def _close_ticker(kws):
+    closed_event = threading.Event()
 
-    # Set all instruments to tick in `full` mode.
-    ws.set_mode(ws.MODE_FULL, position_tokens)
+    kws.on_close = lambda ws, code, reason: closed_event.set()
+    kws.close(code=DONE_CODE)
 
+    closed_event.wait(timeout=TICKER_CLOSE_TIMEOUT)
 
-def on_close(ws, code, reason):
-    # On connection close stop the main loop
     # Reconnection will not happen after executing `ws.stop()`
-    if code == DONE_CODE:
-        # Closing the connection once the stoploss is met
-        ws.stop()
+    kws.stop()
+
+    if kws.recorder:
+        kws.recorder.close()
+
+
+def run_stranglers(configs: List[ConfigV2Model]):
+    """Runs a strangler per config (e.g. NIFTY and BANKNIFTY) in the same process, sharing a single
+    ticker connection (and its tick table) between them through the tick router"""
+    from src.apps.kite.connectors.router import TickRouter
+
+    kws = _get_ticker(is_recording_enabled=any(config.is_recording_enabled for config in configs))
+    router = TickRouter(ticker=kws, route_ticks=False)
+
+    kws.connect(threaded=True)
+
+    threads = [
+        threading.Thread(target=Strangler(config=config).run, kwargs={ 'router': router }, name=config.tickersymbol)
+        for config in configs
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    _close_ticker(kws=kws)
 
 
 class Strangler:
     def __init__(self, config: ConfigV2Model = None):
         self.config = config
 
-    def _enter_market(self, option_gap: int, on_date: date = None):
-        global POSITIONS
+        # Following is the state of a run, kept per instance so that multiple strategies can run
+        # in the same process
+        self.positions = {}
+        self.pnl_accumulator = PnLAccumulator()
+        self.tick_logger = TickLogger()
+        self.tick_table = None
+        self.last_prices = {}
+        self.done_event = threading.Event()
 
+    def _exit_positions(self):
+        if self.config.is_mock_run:
+            return
+
+        for position in self.positions.values():
+            PositionsController.exit_position(position=position)
+
+    def _process_ticks(self, ticks: list) -> bool:
+        now = datetime.now()
+
+        # Exit the strategy to book the pnl for the day
+        if now.hour > 15 and now.minute > 15:
+            total_pnl = self.pnl_accumulator.total
+
+            LOGGER.info('Booking the profit for the day: %.2f' % total_pnl)
+
+            self._exit_positions()
+
+            return True
+
+        for tick in ticks:
+            instrument_token = str(tick['instrument_token'])
+            position: PositionModel = self.positions[instrument_token]
+
+            if position.tradingsymbol.endswith('PE'):
+                position.pnl = (position.average_price - tick['last_price']) *  abs(position.quantity)
+            elif position.tradingsymbol.endswith('CE'):
+                position.pnl = (tick['last_price'] - position.average_price) * abs(position.quantity)
+            else:
+                raise ValueError('Unexpected tickersymbol found: %s' % position.tradingsymbol)
+
+            self.pnl_accumulator.update(instrument_token=instrument_token, pnl=position.pnl)
+            self.tick_logger.log(instrument_token=instrument_token, last_price=tick['last_price'], total_pnl=self.pnl_accumulator.total)
+
+        total_pnl = self.pnl_accumulator.total
+
+        if total_pnl < self.config.stoploss_pnl:
+            LOGGER.info(
+                'Exiting the positions; condition met; stoploss_pnl: %d, current pnl: %.2f' % (
+                    self.config.stoploss_pnl, total_pnl
+                )
+            )
+
+            self._exit_positions()
+
+            return True
+
+    def _poll_ticks(self):
+        self.pnl_accumulator.reset(positions=self.positions)
+
+        # Strategy is evaluated at its own cadence on the latest prices instead of on every tick,
+        # till the positions are exited
+        while not self.done_event.wait(timeout=TICK_POLL_INTERVAL):
+            # Tick table is shared by the strategies of the connection, hence only the prices of the
+            # positions are read and the ones changed since the previous poll are processed
+            ticks = [
+                { 'instrument_token': instrument_token, 'last_price': last_price }
+                for instrument_token, last_price in self.tick_table.get_values(
+                    instrument_tokens=[int(instrument_token) for instrument_token in self.positions.keys()]
+                )
+                if self.last_prices.get(instrument_token) != last_price
+            ]
+
+            self.last_prices.update((tick['instrument_token'], tick['last_price']) for tick in ticks)
+
+            try:
+                is_breaking_required = self._process_ticks(ticks=ticks)
+            except Exception as ex:
+                LOGGER.error(ex)
+
+                is_breaking_required = True
+
+            if is_breaking_required:
+                self.done_event.set()
+
+        # Following logs the summary of the ticks received since the last one, as no more ticks follow
+        self.tick_logger.flush()
+
+    def _enter_market(self, option_gap: int, on_date: date = None):
         tickersymbol = self.config.tickersymbol
         strangle_gap = self.config.strangle_gap
 
@@ -145,8 +281,6 @@ class Strangler:
         else:
             instrument_price = InstrumentsController.get_last_trading_price(tickersymbol=tickersymbol)
 
-        instrument_token_dict = InstrumentsController.get_instrument_token_dict()
-
         low_sell_price = Utilities.round_nearest(number=instrument_price - strangle_gap, unit=option_gap, direction='down')
         high_sell_price = Utilities.round_nearest(number=instrument_price + strangle_gap, unit=option_gap, direction='up')
 
@@ -180,8 +314,8 @@ class Strangler:
         low_option.lot_size = self.config.number_of_lots * low_option.lot_size
 
         if self.config.is_mock_run:
-            POSITIONS_DICT.update({
-                instrument_token_dict[high_option.tradingsymbol]: from_dict(
+            self.positions.update({
+                InstrumentsController.get_instrument_token(tickersymbol=high_option.tradingsymbol): from_dict(
                     data_class=MockPositionModel,
                     data={
                         'tradingsymbol': high_option.tradingsymbol,
@@ -191,7 +325,7 @@ class Strangler:
                         'pnl': 0.0
                     }
                 ),
-                instrument_token_dict[low_option.tradingsymbol]: from_dict(
+                InstrumentsController.get_instrument_token(tickersymbol=low_option.tradingsymbol): from_dict(
                     data_class=MockPositionModel,
                     data={
                         'tradingsymbol': low_option.tradingsymbol,
@@ -209,10 +343,12 @@ class Strangler:
             if self.config.is_backtest:
                 return [high_option, low_option]
 
-            return POSITIONS_DICT
+            return self.positions
+
+        last_prices = QuotesController.get_last_prices(tradingsymbols=[high_option.tradingsymbol, low_option.tradingsymbol])
 
-        OptionsController.sell_option(option=high_option)
-        OptionsController.sell_option(option=low_option)
+        OptionsController.sell_option(option=high_option, last_price=last_prices.get(high_option.tradingsymbol))
+        OptionsController.sell_option(option=low_option, last_price=last_prices.get(low_option.tradingsymbol))
 
         LOGGER.info('Sold upper option: %s' % high_option)
         LOGGER.info('Sold lower option: %s' % low_option)
@@ -221,9 +357,9 @@ class Strangler:
 
         for position in positions:
             if position.tradingsymbol in [high_option.tradingsymbol, low_option.tradingsymbol]:
-                POSITIONS_DICT[instrument_token_dict[position.tradingsymbol]] = position
+                self.positions[InstrumentsController.get_instrument_token(tickersymbol=position.tradingsymbol)] = position
 
-        return POSITIONS_DICT
+        return self.positions
 
     def get_config(self):
         questions = [
@@ -232,7 +368,8 @@ class Strangler:
                 'name': 'tickersymbol',
                 'message': 'List of stocks to be processed!',
                 'choices': [
-                    { 'name': 'NIFTY' }
+                    { 'name': 'NIFTY' },
+                    { 'name': 'BANKNIFTY' }
                 ],
                 'default': 0
             },
@@ -263,18 +400,24 @@ class Strangler:
 
         return from_dict(data_class=ConfigV2Model, data=config)
 
-    def run(self):
+    def _get_option_gap(self) -> int:
+        if self.config.tickersymbol not in OPTION_GAPS:
+            raise NotImplementedError(
+                'The program has only been implemented for %s as of now.' % ', '.join(OPTION_GAPS.keys())
+            )
+
+        return OPTION_GAPS[self.config.tickersymbol]
+
+    def run(self, router=None):
+        """Runs the strategy over the connection of the router, a connection of its own is opened in-case
+        the router is not provided"""
         # In order to keep the requirements clean for deployments, the underlying twisted module is
-        # considered for development purposes only as of now, hence the following import is localized
-        from src.apps.kite.connectors.websocket import KiteTicker
+        # considered for development purposes only as of now, hence the following imports are localized
+        from src.apps.kite.connectors.router import TickRouter
 
         if not self.config:
             self.config = self.get_config()
 
-        global GLOBAL_CONFIG
-
-        GLOBAL_CONFIG = self.config
-
         # Following code has hard-coded values as of now
         # TODO (overall):
         #       - (Done) Add auto-login for TOTP
@@ -295,33 +438,45 @@ class Strangler:
         #       - Last price API works
         #       - Connection termination in-between doesn't break the execution
         #       - The end of the day execution happens for closure
-        nifty_option_gap = 50
+        option_gap = self._get_option_gap()
         now = datetime.now()
 
-        if self.config.tickersymbol != 'NIFTY':
-            raise NotImplementedError('The program has only bee implemented for NIFTY as of now.')
-
         if now.weekday() not in [0, 1, 2, 3, 4]:
             LOGGER.info('Found weekend, not trading...')
 
             return
 
         # TODO: Add the ability to resume the operations from already existing positions
-        self._enter_market(option_gap=nifty_option_gap)
+        self._enter_market(option_gap=option_gap)
 
-        kws = KiteTicker(
-            user_id=UsersController.get_current_user().user_id,
-            enctoken=quote_plus(ConfigController.get_config().kite_auth_token)
-        )
+        kws = None
 
-        # Assign the callbacks.
-        kws.on_ticks = on_ticks
-        kws.on_connect = on_connect
-        kws.on_close = on_close
+        if router is None:
+            kws = _get_ticker(is_recording_enabled=self.config.is_recording_enabled)
+            router = TickRouter(ticker=kws, route_ticks=False)
 
-        # Infinite loop on the main thread. Nothing after this will run.
-        # You have to use the pre-defined callbacks to manage subscriptions.
-        kws.connect()
+        # Since only the latest price of the positions is used, ticks are only written to the tick
+        # table by the socket thread and the strategy polls it from its own thread, which also keeps
+        # the socket responsive while the (blocking) position exits are being placed
+        self.tick_table = router.ticker.tick_table
+
+        instrument_tokens = [int(position.instrument_token) for position in self.positions.values()]
+        # Ticks aren't routed, the callback only identifies the subscription of the strategy
+        callback = self._poll_ticks
+
+        router.subscribe(callback=callback, instrument_tokens=instrument_tokens)
+
+        if kws:
+            kws.connect(threaded=True)
+
+        try:
+            self._poll_ticks()
+        finally:
+            # Connection is only closed by its owner, other strategies might still be using it
+            router.unsubscribe(callback=callback, instrument_tokens=instrument_tokens)
+
+            if kws:
+                _close_ticker(kws=kws)
 
     def get_backtest_config(self) -> ConfigV2Model:
         config = {
@@ -335,13 +490,8 @@ class Strangler:
         return from_dict(data_class=ConfigV2Model, data=config)
 
     def backtest(self, from_date: date, to_date: date):
-        global POSITIONS_DICT
-
         self.config = self.get_backtest_config()
-        nifty_option_gap = 50
-
-        if self.config.tickersymbol != 'NIFTY':
-            raise NotImplementedError('The program has only bee implemented for NIFTY as of now.')
+        option_gap = self._get_option_gap()
 
         current_date = from_date
         total_pnl = 0
@@ -356,7 +506,7 @@ class Strangler:
 
                 continue
 
-            traded_options: List[HistoricalOptionModel] = self._enter_market(option_gap=nifty_option_gap, on_date=current_date)
+            traded_options: List[HistoricalOptionModel] = self._enter_market(option_gap=option_gap, on_date=current_date)
 
             pnl = 0
 
@@ -17,6 +17,7 @@ class ConfigV2Model:
     is_mock_run: bool = False
     is_backtest: bool = False
     number_of_lots: int = 1
+    is_recording_enabled: bool = False
 
 
 @dataclass
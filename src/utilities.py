@@ -1,8 +1,12 @@
 import collections
+import csv
+import io
 import math
 import re
 from datetime import date, datetime, timedelta
-from typing import Union
+from typing import Iterator, Union
+
+import requests
 from dateutil.relativedelta import relativedelta, TH
 
 from src.constants import MARKET_HOLIDAYS_ALTERNATES
@@ -18,18 +22,22 @@ def round_nearest(number: float, unit: float, direction: str = 'up'):
 
 
 def csv_text_to_dict(text_data: str):
-    split_data = text_data.split('\n')
-
-    headers = split_data[0].split(',')
-    resp_data = []
-
-    for data in split_data[1:]:
-        if not data:
-            continue
-
-        resp_data.append(dict(zip(headers, data.split(','))))
-
-    return resp_data
+    return list(csv.DictReader(io.StringIO(text_data)))
+
+
+def iter_csv_rows(response: requests.Response, encoding: str = 'utf-8') -> Iterator[tuple]:
+    """Parses the CSV of a streamed response (i.e. requested with `stream=True`) incrementally and
+    yields the rows as tuples, first row being the header. Only a chunk of the response is held in
+    memory at a time."""
+    # Following reads the raw stream through a text wrapper (instead of splitting the chunks into
+    # lines) so that the quoted fields having newlines are parsed by the CSV reader as a whole. Raw
+    # stream is kept open at its end as the text wrapper reads it once more to find the end
+    response.raw.decode_content = True
+    response.raw.auto_close = False
+
+    for row in csv.reader(io.TextIOWrapper(response.raw, encoding=encoding, newline='')):
+        if row:
+            yield tuple(row)
 
 
 def flatten_dict(data: dict, parent_key: str = '', sep: str = '__') -> dict:
@@ -0,0 +1,48 @@
+import unittest
+from dataclasses import replace
+
+from benchmarks.bluechip_backtest import get_panel, get_positions, get_random_config, simulate_loop
+from src.strategies.bluechip_options_selling.engine import simulate
+from src.strategies.bluechip_options_selling.models import BackTestConfigModel
+
+NUMBER_OF_CONFIGS = 50
+
+
+class SimulateTest(unittest.TestCase):
+    def setUp(self):
+        self.panel = get_panel(number_of_days=20, number_of_stocks=12)
+
+    def test_positions_match_the_day_by_day_backtest(self):
+        for seed in range(NUMBER_OF_CONFIGS):
+            config = get_random_config(seed=seed)
+
+            with self.subTest(config=config):
+                self.assertEqual(get_positions(panel=self.panel, config=config), simulate_loop(panel=self.panel, config=config))
+
+    def test_no_positions_below_the_minimum_margin(self):
+        config = replace(BackTestConfigModel(), available_margin=60000)
+
+        self.assertEqual(len(simulate(panel=self.panel, config=config)), 0)
+        self.assertEqual(simulate_loop(panel=self.panel, config=config), [])
+
+    def test_trade_days_of_interest(self):
+        config = BackTestConfigModel()
+        trade_days = [2, 5, 11]
+
+        positions = simulate(panel=self.panel, config=config, trade_days_of_interest=trade_days)
+        expected_positions = [
+            position for position in simulate_loop(panel=self.panel, config=config) if position[0] in trade_days
+        ]
+
+        self.assertEqual(positions['trade_day'].tolist(), [position[0] for position in expected_positions])
+        self.assertEqual(positions['pnl'].tolist(), [position[4] for position in expected_positions])
+
+    def test_panel_columns_as_arrays(self):
+        config = BackTestConfigModel()
+        panel = dict((column, self.panel[column].to_numpy()) for column in self.panel.columns)
+
+        self.assertTrue(simulate(panel=panel, config=config).equals(simulate(panel=self.panel, config=config)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from dataclasses import dataclass
+from datetime import date
+from unittest import mock
+
+import src.cache as cache
+from src.cache import Cache, DiskStore, MemoryStore
+
+
+@dataclass
+class QuoteModel:
+    tickersymbol: str
+    last_price: float
+
+
+class DiskStoreTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+
+        self.addCleanup(folder.cleanup)
+
+        patcher = mock.patch.object(cache, 'CACHE_FOLDER', folder.name)
+        patcher.start()
+
+        self.addCleanup(patcher.stop)
+
+    def test_entries_are_read_back_through_the_index(self):
+        store = DiskStore(name='get_quote')
+
+        store.append(key='a', written_at=1.0, serialized_value=json.dumps([1, 2]))
+        store.append(key='b', written_at=2.0, serialized_value=json.dumps({ 'x': 1 }))
+        store.append(key='a', written_at=3.0, serialized_value=json.dumps([3]))
+
+        store = DiskStore(name='get_quote')
+
+        self.assertIn('a', store)
+        self.assertNotIn('c', store)
+        self.assertEqual(store.get(key='a'), (3.0, [3], 3))
+        self.assertEqual(store.get(key='b'), (2.0, { 'x': 1 }, 8))
+
+    def test_missing_and_partial_index_is_rebuilt_from_the_log(self):
+        store = DiskStore(name='get_quote')
+
+        store.append(key='a', written_at=1.0, serialized_value='1')
+        store.append(key='b', written_at=2.0, serialized_value='2')
+
+        os.remove(store._index_location)
+
+        # Following is an entry of a process killed mid-write
+        with open(store._location, 'ab') as fileop:
+            fileop.write(b'c\t3.0\t[1,')
+
+        store = DiskStore(name='get_quote')
+
+        self.assertEqual(store.get(key='b'), (2.0, 2, 1))
+        self.assertNotIn('c', store)
+        self.assertEqual(sorted(DiskStore(name='get_quote')._get_index().keys()), ['a', 'b'])
+
+    def test_unparseable_lines_are_skipped(self):
+        store = DiskStore(name='get_quote')
+
+        store.append(key='a', written_at=1.0, serialized_value='1')
+
+        with open(store._location, 'ab') as fileop:
+            fileop.write(b'unparseable\n')
+
+        with open(store._index_location, 'ab') as fileop:
+            fileop.write(b'unparseable\n')
+
+        store.append(key='b', written_at=2.0, serialized_value='2')
+
+        store = DiskStore(name='get_quote')
+
+        self.assertEqual((store.get(key='a'), store.get(key='b')), ((1.0, 1, 1), (2.0, 2, 1)))
+
+    def test_legacy_log_is_migrated(self):
+        with open(f'{cache.CACHE_FOLDER}/get_quote.log', 'w') as fileop:
+            fileop.write(json.dumps(['a', [1, 2]]) + '\n')
+            fileop.write('unparseable\n')
+            fileop.write(json.dumps(['a', [3]]) + '\n')
+
+        store = DiskStore(name='get_quote')
+
+        self.assertEqual(store.get(key='a')[1:], ([3], 3))
+        self.assertTrue(os.path.exists(store._location))
+
+
+class MemoryStoreTest(unittest.TestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        memory = MemoryStore(budget=10)
+
+        self.assertEqual(memory.put(key='a', entry=(0, 'a', 4)), [])
+        self.assertEqual(memory.put(key='b', entry=(0, 'b', 4)), [])
+
+        memory.get(key='a')
+
+        self.assertEqual(memory.put(key='c', entry=(0, 'c', 4)), ['b'])
+        self.assertEqual(memory.size, 8)
+
+    def test_most_recent_entry_is_kept_beyond_the_budget(self):
+        memory = MemoryStore(budget=10)
+
+        memory.put(key='a', entry=(0, 'a', 4))
+
+        self.assertEqual(memory.put(key='b', entry=(0, 'b', 20)), ['a'])
+        self.assertEqual(memory.get(key='b'), (0, 'b', 20))
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+
+        self.addCleanup(folder.cleanup)
+
+        for patcher in [
+            mock.patch.object(cache, 'CACHE_FOLDER', folder.name),
+            mock.patch.object(cache, 'MEMORY', MemoryStore(budget=1024)),
+            mock.patch.dict(cache.FUNCTION_MODAL_MAP, { 'get_quote': QuoteModel }),
+            mock.patch.dict(cache.FUNCTION_TTL_MAP, { 'get_quote': 60 }),
+            mock.patch.dict(Cache.INSTANCES)
+        ]:
+            patcher.start()
+
+            self.addCleanup(patcher.stop)
+
+        self.calls = []
+
+        def get_quote(tickersymbol: str, on_date: date = None, exchange: str = 'NSE') -> QuoteModel:
+            self.calls.append((tickersymbol, on_date, exchange))
+
+            return QuoteModel(tickersymbol=tickersymbol, last_price=100.0)
+
+        self.get_quote = Cache(staticmethod(get_quote))
+
+    def test_positional_and_keyword_arguments_share_the_key(self):
+        on_date = date(2021, 10, 14)
+
+        self.assertEqual(self.get_quote.get_key('TCS', on_date), self.get_quote.get_key(tickersymbol='TCS', on_date=on_date, exchange='NSE'))
+        self.assertNotEqual(self.get_quote.get_key('TCS', on_date), self.get_quote.get_key('INFY', on_date))
+
+        self.get_quote('TCS', on_date)
+
+        self.assertEqual(self.get_quote(tickersymbol='TCS', on_date=on_date), QuoteModel(tickersymbol='TCS', last_price=100.0))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.get_quote.stats(), { 'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0 })
+
+    def test_entries_are_read_from_the_disk_once_evicted(self):
+        on_date = date(2021, 10, 14)
+
+        self.get_quote('TCS', on_date)
+
+        with mock.patch.object(cache, 'MEMORY', MemoryStore(budget=1024)):
+            self.assertEqual(self.get_quote('TCS', on_date).last_price, 100.0)
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_expired_entries_are_fetched_again(self):
+        on_date = date(2021, 10, 14)
+
+        self.get_quote('TCS', on_date)
+
+        with mock.patch.object(time, 'time', return_value=time.time() + 61):
+            self.get_quote('TCS', on_date)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.get_quote.stats()['expirations'], 1)
+
+    def test_latest_data_is_not_cached(self):
+        self.get_quote('TCS')
+        self.get_quote('TCS')
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.get_quote.stats()['misses'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from src.apps.kite.connectors.candles import CandleAggregator
+
+INSTRUMENT_TOKEN = 256265
+# 2021-10-14T09:15:00+0530
+MARKET_OPEN_TIMESTAMP = 1634183100
+
+
+class CandleAggregatorTest(unittest.TestCase):
+    def test_first_candle_volume_counts_the_first_tick(self):
+        aggregator = CandleAggregator(intervals=['minute'])
+
+        aggregator.add_tick(
+            instrument_token=INSTRUMENT_TOKEN, last_price=100, volume_traded=5000,
+            timestamp=MARKET_OPEN_TIMESTAMP, last_traded_quantity=50
+        )
+        aggregator.add_tick(
+            instrument_token=INSTRUMENT_TOKEN, last_price=101, volume_traded=5075,
+            timestamp=MARKET_OPEN_TIMESTAMP + 10, last_traded_quantity=75
+        )
+        aggregator.add_tick(
+            instrument_token=INSTRUMENT_TOKEN, last_price=99, volume_traded=5100,
+            timestamp=MARKET_OPEN_TIMESTAMP + 60, last_traded_quantity=25
+        )
+
+        candles = aggregator.get_candles(instrument_token=INSTRUMENT_TOKEN)
+
+        self.assertEqual([candle.volume for candle in candles], [125, 25])
+        self.assertEqual((candles[0].open, candles[0].high, candles[0].close), (100, 101, 101))
+
+    def test_first_candle_volume_of_tuple_ticks(self):
+        aggregator = CandleAggregator(intervals=['minute'])
+        tick = [None] * 20
+
+        tick[0], tick[3], tick[4], tick[6], tick[18] = INSTRUMENT_TOKEN, 100.0, 30, 1000, MARKET_OPEN_TIMESTAMP
+
+        aggregator.add_ticks([tuple(tick)])
+
+        self.assertEqual(aggregator.get_candles(instrument_token=INSTRUMENT_TOKEN)[0].volume, 30)
+
+    def test_first_candle_volume_without_last_traded_quantity(self):
+        aggregator = CandleAggregator(intervals=['minute'])
+
+        aggregator.add_tick(instrument_token=INSTRUMENT_TOKEN, last_price=100, volume_traded=5000, timestamp=MARKET_OPEN_TIMESTAMP)
+        aggregator.add_tick(instrument_token=INSTRUMENT_TOKEN, last_price=100, volume_traded=5010, timestamp=MARKET_OPEN_TIMESTAMP + 1)
+
+        self.assertEqual(aggregator.get_candles(instrument_token=INSTRUMENT_TOKEN)[0].volume, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import unittest
+from datetime import date
+from unittest import mock
+
+import src.apps.kite.stores.instruments as instruments
+from src.apps.kite.stores.instruments import InstrumentStore
+
+INSTRUMENTS_DUMP = '\n'.join([
+    'instrument_token,exchange_token,tradingsymbol,name,last_price,expiry,strike,tick_size,lot_size,instrument_type,segment,exchange',
+    '2953217,11536,TCS,"TATA CONSULTANCY SERV LT",0,,0,0.05,1,EQ,NSE,NSE',
+    '13525762,52835,TCS21OCTFUT,TCS,0,2021-10-28,0,0.05,150,FUT,NFO-FUT,NFO',
+    '13530114,52852,TCS21OCT3500PE,TCS,0,2021-10-28,3500,0.05,150,PE,NFO-OPT,NFO',
+    '13530370,52853,TCS21OCT3500CE,TCS,0,2021-10-28,3500,0.05,150,CE,NFO-OPT,NFO',
+    '13530626,52854,TCS21NOV3500PE,TCS,0,2021-11-25,3500,0.05,150,PE,NFO-OPT,NFO',
+    '408065,1594,INFY,"INFOSYS, LTD.",0,,0,0.05,1,EQ,NSE,NSE',
+    '128053508,500209,INFY,"INFOSYS\nLTD.",0,,0,0.05,1,EQ,BSE,BSE',
+    ''
+])
+
+
+class InstrumentStoreTest(unittest.TestCase):
+    def setUp(self):
+        response = mock.Mock(status_code=200, raw=io.BytesIO(INSTRUMENTS_DUMP.encode('utf-8')))
+
+        for patcher in [
+            mock.patch.object(InstrumentStore, '_self', None),
+            mock.patch.object(instruments, 'CACHE_TYPE', 'memory'),
+            mock.patch.object(instruments, 'INSTRUMENTS_CHUNK_SIZE', 3),
+            mock.patch.object(instruments.requests, 'get', return_value=response)
+        ]:
+            patcher.start()
+
+            self.addCleanup(patcher.stop)
+
+        self.store = InstrumentStore().initialize()
+
+    def test_dump_is_fetched_once_a_day(self):
+        InstrumentStore().initialize()
+
+        self.assertEqual(instruments.requests.get.call_count, 1)
+        self.assertEqual(len(self.store.columns['instrument_token']), 7)
+
+    def test_quoted_fields_are_parsed_as_a_whole(self):
+        self.assertEqual(self.store.get_by_token(instrument_token='408065')['name'], 'INFOSYS, LTD.')
+        self.assertEqual(self.store.get_by_token(instrument_token=128053508)['name'], 'INFOSYS\nLTD.')
+
+    def test_tradingsymbol_resolves_to_the_last_instrument(self):
+        self.assertEqual(self.store.get_token(tradingsymbol='INFY'), 128053508)
+        self.assertEqual(self.store.get_token(tradingsymbol='TCS21OCT3500PE'), 13530114)
+        self.assertIsNone(self.store.get_token(tradingsymbol='WIPRO'))
+        self.assertEqual(self.store.get_token_dict()['INFY'], '128053508')
+
+    def test_token_lookup(self):
+        instrument = self.store.get_by_token(instrument_token=13530370)
+
+        self.assertEqual(
+            (instrument['tradingsymbol'], instrument['strike'], instrument['lot_size'], instrument['expiry']),
+            ('TCS21OCT3500CE', 3500.0, 150, '2021-10-28')
+        )
+        self.assertIsNone(self.store.get_by_token(instrument_token=1))
+
+    def test_underlying_lookup_keeps_the_store_order(self):
+        self.assertEqual(
+            [instrument['tradingsymbol'] for instrument in self.store.get_by_underlying(underlying='TCS')],
+            ['TCS21OCTFUT', 'TCS21OCT3500PE', 'TCS21OCT3500CE', 'TCS21NOV3500PE']
+        )
+
+    def test_contract_lookup_only_has_the_derivatives(self):
+        self.assertEqual(
+            [instrument['tradingsymbol'] for instrument in self.store.get_contracts(underlying='TCS', expiry=date(2021, 10, 28), strike=3500)],
+            ['TCS21OCT3500PE', 'TCS21OCT3500CE']
+        )
+        self.assertEqual(
+            [instrument['tradingsymbol'] for instrument in self.store.get_contracts(underlying='TCS', expiry='2021-10-28', strike=0)],
+            ['TCS21OCTFUT']
+        )
+        self.assertEqual(self.store.get_contracts(underlying='TATA CONSULTANCY SERV LT', expiry='', strike=0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import math
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+import src.apps.nse.stores.options as options
+from src.apps.nse.stores.options import OptionsStore
+
+BHAVCOPY_HEADER = 'INSTRUMENT,SYMBOL,EXPIRY_DT,STRIKE_PR,OPTION_TYP,OPEN,HIGH,LOW,CLOSE,SETTLE_PR,CONTRACTS,VAL_INLAKH,OPEN_INT,CHG_IN_OI,TIMESTAMP'
+CONTRACT_EXPORT_HEADER = 'Symbol,Date,Expiry,Option Type,Strike Price,Open,High,Low,Close,LTP,Settle Price,No. of contracts,Open Int'
+EXPIRY = date(2021, 10, 28)
+
+
+def get_bhavcopy(on_date: str, close: float) -> str:
+    return '\n'.join([
+        BHAVCOPY_HEADER,
+        f'FUTSTK,TCS,28-Oct-2021,0,XX,3500,3550,3450,3500,3500,100,1000,5000,10,{on_date}',
+        f'OPTSTK,TCS,28-Oct-2021,3500,PE,40,45,30,{close},{close},50,100,2000,-,{on_date}',
+        f'OPTSTK,TCS,28-Oct-2021,3400,PE,20,25,15,{close / 2},{close / 2},50,100,"1,500",5,{on_date}',
+        f'OPTSTK,TCS,28-Oct-2021,3500,CE,60,65,50,{close + 20},{close + 20},50,100,2500,5,{on_date}',
+        f'OPTSTK,INFY,28-Oct-2021,1700,PE,10,12,8,{close / 4},{close / 4},50,100,800,5,{on_date}',
+        ''
+    ])
+
+
+class OptionsStoreTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+
+        self.addCleanup(folder.cleanup)
+
+        self.folder = os.path.join(folder.name, 'bhavcopies')
+
+        os.makedirs(self.folder)
+
+        for patcher in [
+            mock.patch.object(OptionsStore, '_self', None),
+            mock.patch.object(options, 'OPTIONS_FOLDER', os.path.join(folder.name, 'nse-options')),
+            mock.patch.object(options, 'OPTIONS_META_LOCATION', os.path.join(folder.name, 'nse-options', 'meta.json'))
+        ]:
+            patcher.start()
+
+            self.addCleanup(patcher.stop)
+
+    def _ingest(self, files: dict) -> dict:
+        for name, text in files.items():
+            with open(os.path.join(self.folder, name), 'w') as fileop:
+                fileop.write(text)
+
+        return OptionsStore().ingest(folder=self.folder)
+
+    def test_options_are_merged_per_symbol(self):
+        stats = self._ingest({
+            'fo14OCT2021bhav.csv': get_bhavcopy(on_date='14-OCT-2021', close=40),
+            'fo13OCT2021bhav.csv': get_bhavcopy(on_date='13-OCT-2021', close=42)
+        })
+
+        self.assertEqual(stats, { 'files': 2, 'bhavcopies': 2, 'rows': 8 })
+
+        rows = OptionsStore().get(symbol='TCS', expiry_date=EXPIRY, option_types=['PE', 'CE'])
+
+        self.assertEqual(
+            [(row['option_type'], row['strike_price'], str(row['date'])) for row in rows],
+            [
+                ('PE', 3400.0, '2021-10-13'), ('PE', 3400.0, '2021-10-14'),
+                ('PE', 3500.0, '2021-10-13'), ('PE', 3500.0, '2021-10-14'),
+                ('CE', 3500.0, '2021-10-13'), ('CE', 3500.0, '2021-10-14')
+            ]
+        )
+        self.assertEqual(rows[0]['open_int'], 1500.0)
+        self.assertTrue(math.isnan(rows[2]['change_in_oi']))
+
+        # Following is a fresh store, loaded from the disk
+        with mock.patch.object(OptionsStore, '_self', None):
+            rows = OptionsStore().get(
+                symbol='TCS', expiry_date=EXPIRY, option_types=['PE'], strike_price=3500, from_date=date(2021, 10, 14), to_date=date(2021, 10, 14)
+            )
+
+        self.assertEqual([(row['close'], str(row['date'])) for row in rows], [(40.0, '2021-10-14')])
+
+    def test_reingested_rows_are_updated(self):
+        self._ingest({ 'fo14OCT2021bhav.csv': get_bhavcopy(on_date='14-OCT-2021', close=40) })
+        self._ingest({ 'fo14OCT2021bhav.csv': get_bhavcopy(on_date='14-OCT-2021', close=44) })
+
+        rows = OptionsStore().get(symbol='TCS', expiry_date=EXPIRY, option_types=['PE'], strike_price='3500')
+
+        self.assertEqual([row['close'] for row in rows], [44.0])
+        self.assertEqual(len(OptionsStore().get(symbol='INFY', expiry_date=EXPIRY, option_types=['PE', 'CE'])), 1)
+
+    def test_range_is_covered_by_the_bhavcopies(self):
+        self._ingest({
+            'fo08OCT2021bhav.csv': get_bhavcopy(on_date='08-OCT-2021', close=40),
+            'fo11OCT2021bhav.csv': get_bhavcopy(on_date='11-OCT-2021', close=40),
+            'fo12OCT2021bhav.csv': get_bhavcopy(on_date='12-OCT-2021', close=40),
+            'fo20OCT2021bhav.csv': get_bhavcopy(on_date='20-OCT-2021', close=40)
+        })
+
+        store = OptionsStore()
+
+        self.assertTrue(store.covers(from_date=date(2021, 10, 8), to_date=date(2021, 10, 12)))
+        self.assertTrue(store.covers(from_date=date(2021, 10, 11), to_date=date(2021, 10, 11)))
+        self.assertFalse(store.covers(from_date=date(2021, 10, 7), to_date=date(2021, 10, 12)))
+        self.assertFalse(store.covers(from_date=date(2021, 10, 8), to_date=date(2021, 10, 13)))
+        # Following has a week without any bhavcopy
+        self.assertFalse(store.covers(from_date=date(2021, 10, 12), to_date=date(2021, 10, 20)))
+
+    def test_contract_exports_do_not_cover_the_range(self):
+        stats = self._ingest({
+            'TCS.csv': '\n'.join([
+                CONTRACT_EXPORT_HEADER,
+                'TCS,13-Oct-2021,28-Oct-2021,PE,3500,40,45,30,42,42,42,50,2000',
+                'TCS,14-Oct-2021,28-Oct-2021,PE,3500,40,45,30,40,40,40,50,-'
+            ])
+        })
+
+        self.assertEqual(stats, { 'files': 1, 'bhavcopies': 0, 'rows': 2 })
+        self.assertFalse(OptionsStore().covers(from_date=date(2021, 10, 13), to_date=date(2021, 10, 14)))
+        self.assertEqual(len(OptionsStore().get(symbol='TCS', expiry_date=EXPIRY, option_types=['PE'])), 2)
+
+    def test_unexpected_file_format(self):
+        with self.assertRaises(ValueError):
+            self._ingest({ 'fo14OCT2021bhav.csv': 'SYMBOL,CLOSE\nTCS,40\n' })
+
+
+if __name__ == '__main__':
+    unittest.main()
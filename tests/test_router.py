@@ -0,0 +1,141 @@
+import unittest
+from unittest import mock
+
+import src.apps.kite.connectors.router as router
+from src.apps.kite.connectors.router import TickRouter
+from src.apps.kite.connectors.ticks import MODE_FULL, MODE_LTP, MODE_QUOTE
+
+NIFTY_TOKEN = 256265
+TCS_TOKEN = 2953217
+INFY_TOKEN = 408065
+
+
+class FakeTicker:
+    def __init__(self, is_connected: bool = True):
+        self.connected = is_connected
+        self.calls = []
+        self.on_ticks = None
+        self.on_connect = None
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def subscribe(self, instrument_tokens):
+        self.calls.append(('subscribe', sorted(instrument_tokens)))
+
+    def unsubscribe(self, instrument_tokens):
+        self.calls.append(('unsubscribe', sorted(instrument_tokens)))
+
+    def set_mode(self, mode, instrument_tokens):
+        self.calls.append(('set_mode', mode, sorted(instrument_tokens)))
+
+
+class TickRouterTest(unittest.TestCase):
+    def setUp(self):
+        # Following sends the messages right away instead of in the reactor thread
+        patcher = mock.patch.object(router.reactor, 'callFromThread', side_effect=lambda func, *args: func(*args))
+        patcher.start()
+
+        self.addCleanup(patcher.stop)
+
+        self.ticker = FakeTicker()
+        self.router = TickRouter(ticker=self.ticker)
+
+    def test_tokens_are_reference_counted(self):
+        first_strategy, second_strategy = mock.Mock(), mock.Mock()
+
+        self.router.subscribe(callback=first_strategy, instrument_tokens=[TCS_TOKEN, NIFTY_TOKEN])
+        self.router.subscribe(callback=second_strategy, instrument_tokens=[TCS_TOKEN, INFY_TOKEN])
+        self.router.unsubscribe(callback=first_strategy, instrument_tokens=[TCS_TOKEN, NIFTY_TOKEN])
+
+        self.assertEqual(sorted(self.router.get_tokens()), sorted([TCS_TOKEN, INFY_TOKEN]))
+
+        self.router.unsubscribe(callback=second_strategy, instrument_tokens=[TCS_TOKEN, INFY_TOKEN])
+
+        self.assertEqual(self.router.get_tokens(), [])
+        self.assertEqual([call for call in self.ticker.calls if call[0] != 'set_mode'], [
+            ('subscribe', sorted([TCS_TOKEN, NIFTY_TOKEN])),
+            ('subscribe', [INFY_TOKEN]),
+            ('unsubscribe', [NIFTY_TOKEN]),
+            ('unsubscribe', sorted([TCS_TOKEN, INFY_TOKEN]))
+        ])
+
+    def test_unsubscribing_an_unknown_callback_keeps_the_tokens(self):
+        self.router.subscribe(callback=mock.Mock(), instrument_tokens=[TCS_TOKEN])
+        self.router.unsubscribe(callback=mock.Mock(), instrument_tokens=[TCS_TOKEN, INFY_TOKEN])
+
+        self.assertEqual(self.router.get_tokens(), [TCS_TOKEN])
+        self.assertNotIn('unsubscribe', [call[0] for call in self.ticker.calls])
+
+    def test_token_is_subscribed_in_the_highest_mode(self):
+        ltp_strategy, full_strategy = mock.Mock(), mock.Mock()
+
+        self.router.subscribe(callback=ltp_strategy, instrument_tokens=[TCS_TOKEN], mode=MODE_LTP)
+        self.router.subscribe(callback=full_strategy, instrument_tokens=[TCS_TOKEN], mode=MODE_FULL)
+        self.router.subscribe(callback=mock.Mock(), instrument_tokens=[TCS_TOKEN], mode=MODE_QUOTE)
+        self.router.unsubscribe(callback=full_strategy, instrument_tokens=[TCS_TOKEN])
+
+        self.assertEqual([call for call in self.ticker.calls if call[0] == 'set_mode'], [
+            ('set_mode', MODE_LTP, [TCS_TOKEN]),
+            ('set_mode', MODE_FULL, [TCS_TOKEN]),
+            ('set_mode', MODE_QUOTE, [TCS_TOKEN])
+        ])
+
+    def test_token_limit_of_the_connection(self):
+        self.router = TickRouter(ticker=self.ticker, max_tokens=2)
+
+        self.router.subscribe(callback=mock.Mock(), instrument_tokens=[TCS_TOKEN, INFY_TOKEN])
+
+        with self.assertRaises(ValueError):
+            self.router.subscribe(callback=mock.Mock(), instrument_tokens=[NIFTY_TOKEN])
+
+        self.router.subscribe(callback=mock.Mock(), instrument_tokens=[TCS_TOKEN])
+
+        self.assertEqual(sorted(self.router.get_tokens()), sorted([TCS_TOKEN, INFY_TOKEN]))
+
+    def test_subscriptions_are_sent_on_connect(self):
+        self.ticker.connected = False
+
+        self.router.subscribe(callback=mock.Mock(), instrument_tokens=[TCS_TOKEN, INFY_TOKEN], mode=MODE_QUOTE)
+        self.router.subscribe(callback=mock.Mock(), instrument_tokens=[NIFTY_TOKEN], mode=MODE_LTP)
+
+        self.assertEqual(self.ticker.calls, [])
+
+        self.ticker.on_connect(self.ticker, None)
+
+        self.assertEqual(self.ticker.calls, [
+            ('subscribe', sorted([TCS_TOKEN, INFY_TOKEN])),
+            ('set_mode', MODE_QUOTE, sorted([TCS_TOKEN, INFY_TOKEN])),
+            ('subscribe', [NIFTY_TOKEN]),
+            ('set_mode', MODE_LTP, [NIFTY_TOKEN])
+        ])
+
+    def test_ticks_are_fanned_out_by_token(self):
+        first_strategy, second_strategy = mock.Mock(), mock.Mock(side_effect=ValueError)
+
+        self.router.subscribe(callback=first_strategy, instrument_tokens=[TCS_TOKEN])
+        self.router.subscribe(callback=second_strategy, instrument_tokens=[TCS_TOKEN, INFY_TOKEN])
+
+        ticks = [
+            { 'instrument_token': TCS_TOKEN, 'last_price': 3500.0 },
+            { 'instrument_token': INFY_TOKEN, 'last_price': 1700.0 },
+            { 'instrument_token': NIFTY_TOKEN, 'last_price': 18000.0 }
+        ]
+
+        with mock.patch.object(router.LOGGER, 'exception'):
+            self.ticker.on_ticks(self.ticker, ticks)
+
+        first_strategy.assert_called_once_with(ticks[:1])
+        second_strategy.assert_called_once_with(ticks[:2])
+
+    def test_ticks_are_not_routed_from_the_table(self):
+        ticker = FakeTicker()
+
+        TickRouter(ticker=ticker, route_ticks=False)
+
+        self.assertIsNone(ticker.on_ticks)
+        self.assertIsNotNone(ticker.on_connect)
+
+
+if __name__ == '__main__':
+    unittest.main()
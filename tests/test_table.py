@@ -0,0 +1,75 @@
+import math
+import unittest
+from datetime import datetime
+
+from src.apps.kite.connectors.table import TickTable
+
+NIFTY_TOKEN = 256265
+TCS_TOKEN = 2953217
+INFY_TOKEN = 408065
+
+
+class TickTableTest(unittest.TestCase):
+    def test_changed_instruments_are_polled_once(self):
+        table = TickTable()
+
+        table.update([(TCS_TOKEN, 3500.0, 100, None, None), (NIFTY_TOKEN, 18000.0, None, None, None)])
+        table.update([(TCS_TOKEN, 3501.0, 120, None, None)])
+
+        self.assertEqual(table.poll_changed(), [(TCS_TOKEN, 3501.0), (NIFTY_TOKEN, 18000.0)])
+        self.assertEqual(table.poll_changed(), [])
+
+        table.update([(NIFTY_TOKEN, 18001.0, None, None, None)])
+
+        self.assertEqual(table.poll_changed(), [(NIFTY_TOKEN, 18001.0)])
+        self.assertEqual(table.poll_changed(field='volume_traded'), [])
+
+    def test_missing_values_keep_the_previous_ones(self):
+        table = TickTable()
+
+        table.update([(TCS_TOKEN, 3500.0, 100, 2000, 1634183100)])
+        table.update([(TCS_TOKEN, 3501.0, None, None, None)])
+
+        self.assertEqual(table.get(TCS_TOKEN), {
+            'last_price': 3501.0, 'volume_traded': 100, 'oi': 2000, 'exchange_timestamp': 1634183100
+        })
+        self.assertIsNone(TickTable().get(TCS_TOKEN))
+
+        table.update([(NIFTY_TOKEN, 18000.0, None, None, None)])
+
+        self.assertTrue(math.isnan(table.get(NIFTY_TOKEN)['volume_traded']))
+
+    def test_reading_values_does_not_reset_the_changed_flags(self):
+        table = TickTable()
+
+        table.update([(TCS_TOKEN, 3500.0, None, None, None), (NIFTY_TOKEN, 18000.0, None, None, None)])
+
+        self.assertEqual(table.get_values(instrument_tokens=[NIFTY_TOKEN, INFY_TOKEN]), [(NIFTY_TOKEN, 18000.0)])
+        self.assertEqual(table.poll_changed(), [(TCS_TOKEN, 3500.0), (NIFTY_TOKEN, 18000.0)])
+        self.assertIn(TCS_TOKEN, table)
+        self.assertNotIn(INFY_TOKEN, table)
+
+    def test_dict_and_tuple_ticks(self):
+        table = TickTable()
+        tick = [None] * 20
+
+        tick[0], tick[3], tick[6], tick[15], tick[18] = INFY_TOKEN, 1700.0, 500, 3000, 1634183100
+
+        table.add_ticks([
+            {
+                'instrument_token': TCS_TOKEN, 'last_price': 3500.0, 'volume_traded': 100,
+                'exchange_timestamp': datetime.fromtimestamp(1634183100)
+            },
+            { 'instrument_token': NIFTY_TOKEN, 'last_price': 18000.0 },
+            tuple(tick)
+        ])
+
+        self.assertEqual(table.get(TCS_TOKEN)['exchange_timestamp'], 1634183100)
+        self.assertEqual(table.get(INFY_TOKEN), {
+            'last_price': 1700.0, 'volume_traded': 500, 'oi': 3000, 'exchange_timestamp': 1634183100
+        })
+        self.assertEqual(len(table), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
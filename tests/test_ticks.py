@@ -0,0 +1,199 @@
+import random
+import struct
+import unittest
+from datetime import datetime
+
+from src.apps.kite.connectors.table import TickTable
+from src.apps.kite.connectors.ticks import (
+    FULL_PACKET, INDEX_FULL_PACKET, INDEX_QUOTE_PACKET, LTP_PACKET, QUOTE_PACKET, TICK_FIELDS,
+    TICK_FORMAT_COLUMNAR, TICK_FORMAT_TUPLE, TickDecoder
+)
+
+# Instrument tokens of the NFO, CDS and indices segments i.e. the last byte of the token
+NFO_TOKEN = 13530114
+CDS_TOKEN = 1 << 8 | 3
+INDEX_TOKEN = 256265
+TIMESTAMP = 1634183100
+
+
+def _unpack_int(packet: bytes, start: int, end: int, byte_format: str = 'I') -> int:
+    return struct.unpack('>' + byte_format, packet[start:end])[0]
+
+
+def parse_binary(message: bytes) -> list:
+    """Previous implementation (KiteTickerClientProtocol._parse_binary of pykiteconnect), packets are
+    sliced out of the message and unpacked a value at a time"""
+    if len(message) < 2:
+        return []
+
+    packets = []
+    offset = 2
+
+    for _ in range(_unpack_int(message, 0, 2, byte_format='H')):
+        packet_length = _unpack_int(message, offset, offset + 2, byte_format='H')
+        packets.append(message[offset + 2:offset + 2 + packet_length])
+        offset += 2 + packet_length
+
+    data = []
+
+    for packet in packets:
+        instrument_token = _unpack_int(packet, 0, 4)
+        segment = instrument_token & 0xff
+        divisor = 10000000.0 if segment == 3 else 100.0
+        tradable = segment != 9
+
+        if len(packet) == 8:
+            data.append({
+                'tradable': tradable,
+                'mode': 'ltp',
+                'instrument_token': instrument_token,
+                'last_price': _unpack_int(packet, 4, 8) / divisor
+            })
+        elif len(packet) == 28 or len(packet) == 32:
+            d = {
+                'tradable': tradable,
+                'mode': 'quote' if len(packet) == 28 else 'full',
+                'instrument_token': instrument_token,
+                'last_price': _unpack_int(packet, 4, 8) / divisor,
+                'ohlc': {
+                    'high': _unpack_int(packet, 8, 12) / divisor,
+                    'low': _unpack_int(packet, 12, 16) / divisor,
+                    'open': _unpack_int(packet, 16, 20) / divisor,
+                    'close': _unpack_int(packet, 20, 24) / divisor
+                }
+            }
+
+            d['change'] = 0
+
+            if d['ohlc']['close'] != 0:
+                d['change'] = (d['last_price'] - d['ohlc']['close']) * 100 / d['ohlc']['close']
+
+            if len(packet) == 32:
+                d['exchange_timestamp'] = datetime.fromtimestamp(_unpack_int(packet, 28, 32))
+
+            data.append(d)
+        elif len(packet) == 44 or len(packet) == 184:
+            d = {
+                'tradable': tradable,
+                'mode': 'quote' if len(packet) == 44 else 'full',
+                'instrument_token': instrument_token,
+                'last_price': _unpack_int(packet, 4, 8) / divisor,
+                'last_traded_quantity': _unpack_int(packet, 8, 12),
+                'average_traded_price': _unpack_int(packet, 12, 16) / divisor,
+                'volume_traded': _unpack_int(packet, 16, 20),
+                'total_buy_quantity': _unpack_int(packet, 20, 24),
+                'total_sell_quantity': _unpack_int(packet, 24, 28),
+                'ohlc': {
+                    'open': _unpack_int(packet, 28, 32) / divisor,
+                    'high': _unpack_int(packet, 32, 36) / divisor,
+                    'low': _unpack_int(packet, 36, 40) / divisor,
+                    'close': _unpack_int(packet, 40, 44) / divisor
+                }
+            }
+
+            d['change'] = 0
+
+            if d['ohlc']['close'] != 0:
+                d['change'] = (d['last_price'] - d['ohlc']['close']) * 100 / d['ohlc']['close']
+
+            if len(packet) == 184:
+                d['last_trade_time'] = datetime.fromtimestamp(_unpack_int(packet, 44, 48))
+                d['oi'] = _unpack_int(packet, 48, 52)
+                d['oi_day_high'] = _unpack_int(packet, 52, 56)
+                d['oi_day_low'] = _unpack_int(packet, 56, 60)
+                d['exchange_timestamp'] = datetime.fromtimestamp(_unpack_int(packet, 60, 64))
+                d['depth'] = { 'buy': [], 'sell': [] }
+
+                for i, p in enumerate(range(64, len(packet), 12)):
+                    d['depth']['sell' if i >= 5 else 'buy'].append({
+                        'quantity': _unpack_int(packet, p, p + 4),
+                        'price': _unpack_int(packet, p + 4, p + 8) / divisor,
+                        'orders': _unpack_int(packet, p + 8, p + 10, byte_format='H')
+                    })
+
+            data.append(d)
+
+    return data
+
+
+def get_message(seed: int) -> bytes:
+    """Returns a message with the packets of every mode and segment, in random order"""
+    random_state = random.Random(seed)
+
+    def get_values(count: int) -> list:
+        return [random_state.randrange(0, 1 << 24) for _ in range(count)]
+
+    packets = []
+
+    for token in [NFO_TOKEN, CDS_TOKEN, INDEX_TOKEN]:
+        packets += [
+            LTP_PACKET.pack(token, *get_values(1)),
+            INDEX_QUOTE_PACKET.pack(token, *get_values(6)),
+            INDEX_FULL_PACKET.pack(token, *get_values(6), TIMESTAMP),
+            QUOTE_PACKET.pack(token, *get_values(10)),
+            FULL_PACKET.pack(token, *get_values(10), TIMESTAMP, *get_values(3), TIMESTAMP, *(
+                value for _ in range(10) for value in (*get_values(2), random_state.randrange(0, 1 << 16))
+            ))
+        ]
+
+    # Following is a close of 0 i.e. no change
+    packets.append(QUOTE_PACKET.pack(NFO_TOKEN, *get_values(9), 0))
+
+    random_state.shuffle(packets)
+
+    return struct.pack('>H', len(packets)) + b''.join(struct.pack('>H', len(packet)) + packet for packet in packets)
+
+
+class TickDecoderTest(unittest.TestCase):
+    def test_dict_ticks_match_the_previous_parser(self):
+        decoder = TickDecoder()
+
+        for seed in range(10):
+            message = get_message(seed=seed)
+
+            self.assertEqual(decoder.decode(message), parse_binary(message))
+
+    def test_heartbeat_has_no_ticks(self):
+        self.assertEqual(TickDecoder().decode(b'\x00'), [])
+        self.assertEqual(TickDecoder(tick_format=TICK_FORMAT_COLUMNAR).decode(b''), dict((field, []) for field in TICK_FIELDS))
+
+    def test_tuple_and_columnar_ticks_match_the_dict_ones(self):
+        message = get_message(seed=42)
+        ticks = parse_binary(message)
+        tuple_ticks = TickDecoder(tick_format=TICK_FORMAT_TUPLE).decode(message)
+        columns = TickDecoder(tick_format=TICK_FORMAT_COLUMNAR).decode(message)
+
+        self.assertEqual(len(tuple_ticks), len(ticks))
+        self.assertEqual(columns, dict((field, [tick[index] for tick in tuple_ticks]) for index, field in enumerate(TICK_FIELDS)))
+
+        for tick, tuple_tick in zip(ticks, tuple_ticks):
+            values = dict(zip(TICK_FIELDS, tuple_tick))
+
+            self.assertEqual(
+                (values['instrument_token'], values['mode'], values['tradable'], values['last_price']),
+                (tick['instrument_token'], tick['mode'], tick['tradable'], tick['last_price'])
+            )
+            self.assertEqual(values['volume_traded'], tick.get('volume_traded'))
+            self.assertEqual(values['oi'], tick.get('oi'))
+
+            if 'ohlc' in tick:
+                self.assertEqual((values['open'], values['high'], values['low'], values['close']), (
+                    tick['ohlc']['open'], tick['ohlc']['high'], tick['ohlc']['low'], tick['ohlc']['close']
+                ))
+
+    def test_table_has_the_last_values_of_the_ticks(self):
+        message = get_message(seed=42)
+        table = TickTable()
+        expected_table = TickTable()
+
+        TickDecoder().update_table(message, table)
+        expected_table.add_ticks(parse_binary(message))
+
+        self.assertEqual(len(table), 3)
+
+        for token in [NFO_TOKEN, CDS_TOKEN, INDEX_TOKEN]:
+            self.assertEqual(table.get(token), expected_table.get(token))
+
+
+if __name__ == '__main__':
+    unittest.main()